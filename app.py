@@ -74,12 +74,7 @@ with tabs[0]:
     total_classes = counts.get("classes", 0)
     total_students = counts.get("students", 0)
     total_assignments = counts.get("assignments", 0)
-
-    # Get total grades count separately
-    with db.get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM grades WHERE points IS NOT NULL")
-        total_grades = cursor.fetchone()[0]
+    total_grades = counts.get("grades", 0)
 
     with col1:
         st.markdown(f"""
@@ -148,9 +143,13 @@ with tabs[0]:
     st.markdown("---")
     st.markdown("### 📚 Your Classes")
 
-    classes_list = db.get_all_classes()
+    classes_list = db.get_class_overview()
     if classes_list:
         for class_item in classes_list:
+            class_avg = class_item['average']
+            avg_text = f"Class average: {class_avg:.1f}%" if class_avg is not None else "No grades yet"
+            summary = (f"{class_item['student_count']} students • {class_item['assignment_count']} assignments • "
+                       f"{class_item['completion']:.0%} graded • {avg_text}")
             with st.container():
                 st.markdown(f"""
                 <div style="
@@ -161,6 +160,7 @@ with tabs[0]:
                     margin-bottom: 0.5rem;
                 ">
                     <h4 style="margin: 0; color: #1e3a5f;">{class_item['name']}</h4>
+                    <p style="margin: 0.25rem 0 0 0; color: #718096; font-size: 0.85rem;">{summary}</p>
                 </div>
                 """, unsafe_allow_html=True)
     else:
@@ -0,0 +1,84 @@
+"""
+Grader - headless auto-grading
+Grades a folder of CSV/Excel response files, or a folder or .zip of .docx
+submissions, against an assignment's answer key and saves the scores, without
+starting the web app.
+
+Run with: python autograde_cli.py ASSIGNMENT_ID RESPONSES_DIR_OR_ZIP [--workers N] [--sheet NAME] [--dry-run] [--db PATH]
+Prints a JSON summary (or writes it with --output). Exits with 1 if any file failed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Auto-grade a folder of response files.")
+    parser.add_argument("assignment_id", type=int, help="assignment whose answer key to grade against")
+    parser.add_argument("directory", help="folder of .csv/.xlsx response files, or folder/.zip of .docx submissions")
+    parser.add_argument("--workers", type=int, default=None, help="files graded at once (default: one per CPU)")
+    parser.add_argument("--name-col", default=None, help="student name column (default: detected)")
+    parser.add_argument("--id-col", default=None, help="student ID column (default: detected)")
+    parser.add_argument("--sheet", default=None, help="workbook sheet to read (default: the first)")
+    parser.add_argument("--dry-run", action="store_true", help="grade and summarize without saving")
+    parser.add_argument("--db", default=None, help="database file (default: data/grader.db)")
+    parser.add_argument("--output", default=None, help="write the JSON summary to this file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.db:
+        # modules.database opens and migrates its database on import, so the
+        # path must be set first (worker processes inherit it too)
+        os.environ["GRADER_DB_PATH"] = args.db
+    from modules import database as db
+    from modules.docx_ingest import is_submission_source
+    from modules.grading_service import find_response_files, grade_files, grade_submissions
+
+    if args.db and db.DB_PATH != Path(args.db):
+        # Already imported by the caller; switch it over
+        db.close_all_connections()
+        db.DB_PATH = Path(args.db)
+        db.DB_DIR = db.DB_PATH.parent
+        db.init_db()
+    try:
+        submissions = is_submission_source(args.directory)
+        paths = [] if submissions else find_response_files(args.directory)
+    except OSError as e:
+        print(f"Cannot read {args.directory}: {e}", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    try:
+        if submissions:
+            # Typed .docx submissions: one student per document, answers under "Question N" headings
+            summary = grade_submissions(args.directory, args.assignment_id, workers=args.workers,
+                                        save=not args.dry_run)
+        else:
+            summary = grade_files(paths, args.assignment_id, workers=args.workers,
+                                  name_col=args.name_col, id_col=args.id_col, sheet=args.sheet,
+                                  save=not args.dry_run)
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f"Cannot read {args.directory}: {e}", file=sys.stderr)
+        return 2
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+
+    text = json.dumps(summary, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if summary['totals']['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
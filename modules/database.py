@@ -1,31 +1,444 @@
 import sqlite3
 import os
+import threading
+import time
+import atexit
+import functools
+from collections import OrderedDict
 from pathlib import Path
 from contextlib import contextmanager
 
-# Database path
-DB_DIR = Path(__file__).parent.parent / "data"
-DB_PATH = DB_DIR / "grader.db"
+# Database path; GRADER_DB_PATH points the app (and the CLI's --db) at another file
+DB_PATH = Path(os.environ.get("GRADER_DB_PATH") or Path(__file__).parent.parent / "data" / "grader.db")
+DB_DIR = DB_PATH.parent
+
+# Seconds a pooled connection may sit idle before it is health-checked on reuse
+HEALTH_CHECK_INTERVAL = 30.0
+
+# Storage mode: "default" (rollback journal) or "wal" for servers with many
+# concurrent sessions. Opt in with GRADER_DB_MODE=wal or configure_storage("wal").
+STORAGE_MODE = os.environ.get("GRADER_DB_MODE", "default").strip().lower()
+
+# WAL mode tuning
+BUSY_TIMEOUT_MS = 5000
+MMAP_SIZE = 256 * 1024 * 1024       # bytes of the file mapped into memory
+CACHE_SIZE_KB = 64 * 1024           # page cache per connection
+WRITE_QUEUE_SIZE = 32               # writers allowed to wait for the writer connection
+WRITE_QUEUE_TIMEOUT = 10.0          # seconds a writer waits before giving up
+
+# WAL checkpoint policy: SQLite auto-checkpoints every WAL_AUTOCHECKPOINT pages;
+# on top of that we run a passive checkpoint every CHECKPOINT_EVERY_WRITES write
+# transactions and truncate the WAL whenever it grows past WAL_SIZE_LIMIT.
+WAL_AUTOCHECKPOINT = 1000
+CHECKPOINT_EVERY_WRITES = 200
+WAL_SIZE_LIMIT = 64 * 1024 * 1024
+
+# Compaction: each step frees at most COMPACTION_PAGES_PER_STEP pages and stops
+# after COMPACTION_STEP_SECONDS, so it can run after deletes without stalling the UI.
+COMPACTION_PAGES_PER_STEP = 256
+COMPACTION_STEP_SECONDS = 0.05
+ANALYSIS_LIMIT = 400  # rows sampled per index by ANALYZE
+
+# One long-lived connection per thread (Streamlit runs each session's script in
+# its own thread). The registry lets us close connections of finished threads
+# and everything at interpreter shutdown.
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pool = {}  # thread ident -> (thread, connection)
+_pool_generation = 0  # bumped by close_all_connections() to invalidate every thread
+
+# In-process read cache (see _cached). Entries are keyed by function, arguments
+# and the generation of every table the function reads; write blocks bump the
+# generations of the tables they touch, so a cached read is never stale after
+# a local write.
+CACHE_MAX_ENTRIES = 512
+_cache_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_generations = {}  # table name -> generation
+ALL_TABLES = "*"  # generation shared by every entry, bumped by writes that name no tables
+
+# WAL mode funnels every write through a single writer connection
+_writer_lock = threading.RLock()
+_write_slots = threading.BoundedSemaphore(WRITE_QUEUE_SIZE)
+_writer = {"conn": None, "path": None, "writes": 0}
 
 def ensure_db_dir():
     """Ensure the data directory exists."""
     DB_DIR.mkdir(parents=True, exist_ok=True)
 
-@contextmanager
-def get_connection():
-    """Context manager for database connections."""
+def _open_connection():
+    """Open a new connection to DB_PATH with the standard settings."""
     ensure_db_dir()
-    conn = sqlite3.connect(DB_PATH)
+    # Pooled connections may be closed from another thread on shutdown, but are
+    # otherwise only ever used by the thread that opened them.
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    # Create new databases with incremental vacuuming (see compact_database).
+    # This must come before anything, including the switch to WAL, writes the
+    # file header; on existing databases it has no effect until a VACUUM.
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # Enforce the schema's REFERENCES ... ON DELETE CASCADE clauses
+    conn.execute("PRAGMA foreign_keys = ON")
+    if STORAGE_MODE == "wal":
+        _apply_wal_pragmas(conn)
+    return conn
+
+def _apply_wal_pragmas(conn):
+    """Switch a connection to WAL journaling and apply the WAL tuning pragmas."""
+    conn.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT_MS)}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA mmap_size = {int(MMAP_SIZE)}")
+    conn.execute(f"PRAGMA cache_size = {-int(CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA wal_autocheckpoint = {int(WAL_AUTOCHECKPOINT)}")
+    conn.execute(f"PRAGMA journal_size_limit = {int(WAL_SIZE_LIMIT)}")
+
+def _is_healthy(conn):
+    """Check that a pooled connection is still usable."""
+    try:
+        conn.execute("SELECT 1").fetchone()
+        return True
+    except sqlite3.Error:
+        return False
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+def _prune_dead_threads():
+    """Close connections owned by threads that have exited."""
+    with _pool_lock:
+        dead = [ident for ident, (thread, _) in _pool.items() if not thread.is_alive()]
+        conns = [_pool.pop(ident)[1] for ident in dead]
+    for conn in conns:
+        _close_quietly(conn)
+
+def _checkout():
+    """Return this thread's pooled connection, opening or replacing it as needed."""
+    conn = getattr(_local, 'conn', None)
+    path = str(DB_PATH)
+
+    if conn is not None and (_local.path != path or _local.generation != _pool_generation):
+        # DB_PATH was changed (e.g. tests) or the pool was shut down
+        _release_thread_connection()
+        conn = None
+
+    if conn is not None and time.monotonic() - _local.last_used > HEALTH_CHECK_INTERVAL:
+        if not _is_healthy(conn):
+            _release_thread_connection()
+            conn = None
+
+    if conn is None:
+        _prune_dead_threads()
+        conn = _open_connection()
+        _local.conn = conn
+        _local.path = path
+        _local.generation = _pool_generation
+        _local.depth = 0
+        with _pool_lock:
+            _pool[threading.get_ident()] = (threading.current_thread(), conn)
+
+    _local.last_used = time.monotonic()
+    return conn
+
+def _release_thread_connection():
+    """Close and forget the current thread's pooled connection."""
+    conn = getattr(_local, 'conn', None)
+    _local.conn = None
+    _local.depth = 0
+    with _pool_lock:
+        _pool.pop(threading.get_ident(), None)
+    if conn is not None:
+        _close_quietly(conn)
+
+def close_all_connections():
+    """Close every pooled connection. Registered to run at interpreter exit."""
+    global _pool_generation
+    with _pool_lock:
+        _pool_generation += 1
+        conns = [conn for _, conn in _pool.values()]
+        _pool.clear()
+    for conn in conns:
+        _close_quietly(conn)
+    _local.conn = None
+    _local.depth = 0
+    clear_cache()
+    with _writer_lock:
+        if _writer["conn"] is not None:
+            _close_quietly(_writer["conn"])
+        _writer.update(conn=None, path=None, writes=0)
+
+atexit.register(close_all_connections)
+
+def configure_storage(mode):
+    """Select the storage mode ("default" or "wal") and reopen connections with it."""
+    global STORAGE_MODE
+    mode = mode.strip().lower()
+    if mode not in ("default", "wal"):
+        raise ValueError(f"Unknown storage mode: {mode}")
+    STORAGE_MODE = mode
+    close_all_connections()
+    if mode == "default" and DB_PATH.exists():
+        # WAL is recorded in the database file itself; switch it back to a
+        # rollback journal now that no connection is open
+        with _writer_lock:
+            conn = _open_connection()
+            try:
+                conn.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                _close_quietly(conn)
+
+def get_storage_info():
+    """Get the active storage mode, journal mode and WAL file size."""
+    with get_connection() as conn:
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    wal_path = Path(f"{DB_PATH}-wal")
+    return {
+        "mode": STORAGE_MODE,
+        "journal_mode": journal_mode,
+        "wal_bytes": wal_path.stat().st_size if wal_path.exists() else 0,
+    }
+
+def checkpoint(mode="PASSIVE"):
+    """Checkpoint the WAL into the main database file. No-op outside WAL mode."""
+    if STORAGE_MODE != "wal":
+        return None
+    mode = mode.upper()
+    if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+        raise ValueError(f"Unknown checkpoint mode: {mode}")
+    with _writer_lock:
+        conn = _writer_connection()
+        busy, log_pages, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        _writer["writes"] = 0
+        return {"busy": bool(busy), "log_pages": log_pages, "checkpointed": checkpointed}
+
+def _maybe_checkpoint():
+    """Apply the checkpoint policy after a write transaction (writer lock held)."""
+    _writer["writes"] += 1
+    wal_path = Path(f"{DB_PATH}-wal")
+    if wal_path.exists() and wal_path.stat().st_size > WAL_SIZE_LIMIT:
+        checkpoint("TRUNCATE")
+    elif _writer["writes"] >= CHECKPOINT_EVERY_WRITES:
+        checkpoint("PASSIVE")
+
+def _writer_connection():
+    """Return the shared writer connection (writer lock must be held)."""
+    conn = _writer["conn"]
+    if conn is not None and (_writer["path"] != str(DB_PATH) or not _is_healthy(conn)):
+        _close_quietly(conn)
+        conn = None
+    if conn is None:
+        conn = _open_connection()
+        # Transactions are managed explicitly with BEGIN IMMEDIATE
+        conn.isolation_level = None
+        _writer.update(conn=conn, path=str(DB_PATH), writes=0)
+    return conn
+
+def get_pool_stats():
+    """Get the number of open pooled connections (for diagnostics)."""
+    _prune_dead_threads()
+    with _pool_lock:
+        return {"connections": len(_pool)}
+
+@contextmanager
+def get_connection():
+    """Context manager for database connections.
+
+    Yields this thread's pooled connection. The outermost block commits on
+    success and rolls back on error; nested blocks join the outer transaction.
+    Inside a WAL write block this yields the writer connection instead, so
+    reads see the block's own uncommitted writes.
+    """
+    if getattr(_local, 'write_depth', 0) > 0:
+        # The enclosing get_write_connection() block commits or rolls back
+        yield _writer["conn"]
+        return
+    conn = _checkout()
+    _local.depth += 1
     try:
         yield conn
-        conn.commit()
+        if _local.depth == 1:
+            conn.commit()
+    except BaseException:
+        if _local.depth == 1:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                # The connection is broken; replace it on next checkout
+                _local.depth = 0
+                _release_thread_connection()
+                raise
+        raise
     finally:
-        conn.close()
+        if _local.conn is conn:
+            _local.depth -= 1
+        if not getattr(_local, 'depth', 0):
+            _flush_invalidations()
+
+@contextmanager
+def get_write_connection(*tables):
+    """Context manager for connections that modify the database.
+
+    tables names every table the block writes (including cascades); their
+    cached reads are invalidated once the transaction ends. With no tables,
+    the whole read cache is invalidated.
+
+    In the default storage mode this is get_connection(). In WAL mode every
+    write goes through one shared writer connection in a BEGIN IMMEDIATE
+    transaction, so writers queue up here (at most WRITE_QUEUE_SIZE of them)
+    instead of failing with "database is locked", and readers never wait.
+    Nested blocks join the outer transaction.
+    """
+    if not hasattr(_local, 'dirty'):
+        _local.dirty = set()
+    _local.dirty.update(tables or (ALL_TABLES,))
+
+    if STORAGE_MODE != "wal":
+        with get_connection() as conn:
+            yield conn
+        return
+
+    if getattr(_local, 'write_depth', 0) > 0:
+        # Already inside a write transaction on this thread
+        _local.write_depth += 1
+        try:
+            yield _writer["conn"]
+        finally:
+            _local.write_depth -= 1
+        return
+
+    if not _write_slots.acquire(timeout=WRITE_QUEUE_TIMEOUT):
+        raise sqlite3.OperationalError("database write queue is full")
+    try:
+        if not _writer_lock.acquire(timeout=WRITE_QUEUE_TIMEOUT):
+            raise sqlite3.OperationalError("timed out waiting for the database writer")
+        try:
+            conn = _writer_connection()
+            conn.execute("BEGIN IMMEDIATE")
+            _local.write_depth = 1
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                _local.write_depth = 0
+                _flush_invalidations()
+            _maybe_checkpoint()
+        finally:
+            _writer_lock.release()
+    finally:
+        _write_slots.release()
+
+# ==================== READ CACHE ====================
+
+def _flush_invalidations():
+    """Bump the generation of every table written by this thread's finished transaction."""
+    dirty = getattr(_local, 'dirty', None)
+    if not dirty:
+        return
+    with _cache_lock:
+        for table in dirty:
+            _generations[table] = _generations.get(table, 0) + 1
+    dirty.clear()
+
+def _copy_result(value):
+    """Copy a cached result, nested lists and dicts included, so callers can't modify the cached one."""
+    if isinstance(value, list):
+        return [_copy_result(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _copy_result(item) for key, item in value.items()}
+    return value
+
+def _cached(*tables):
+    """Cache a read helper's result until one of the tables it reads is written."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            dirty = getattr(_local, 'dirty', None)
+            if dirty and (ALL_TABLES in dirty or not dirty.isdisjoint(tables)):
+                # This thread's open transaction has written these tables; the
+                # cache can't see that yet, so read them directly
+                return func(*args, **kwargs)
+            with _cache_lock:
+                # Capture generations before reading so a concurrent write can
+                # only ever make this entry unreachable, never stale.
+                generations = tuple(_generations.get(t, 0) for t in tables + (ALL_TABLES,))
+                key = (func.__name__, args, tuple(sorted(kwargs.items())), str(DB_PATH), generations)
+                try:
+                    hash(key)
+                except TypeError:
+                    key = None  # Unhashable arguments: read straight through
+                if key is not None and key in _cache:
+                    _cache.move_to_end(key)
+                    _cache_stats["hits"] += 1
+                    return _copy_result(_cache[key])
+                _cache_stats["misses"] += 1
+
+            result = func(*args, **kwargs)
+            if key is None:
+                return result
+
+            with _cache_lock:
+                _cache[key] = result
+                _cache.move_to_end(key)
+                while len(_cache) > CACHE_MAX_ENTRIES:
+                    _cache.popitem(last=False)
+                    _cache_stats["evictions"] += 1
+            return _copy_result(result)
+        return wrapper
+    return decorator
+
+def get_cache_stats():
+    """Get read cache hit/miss/eviction counters and current size."""
+    with _cache_lock:
+        return {**_cache_stats, "entries": len(_cache), "max_entries": CACHE_MAX_ENTRIES}
+
+def clear_cache():
+    """Drop every cached read and reset the counters."""
+    with _cache_lock:
+        _cache.clear()
+        for name in _cache_stats:
+            _cache_stats[name] = 0
+
+@contextmanager
+def _schema_connection():
+    """Dedicated connection for creating and migrating the schema.
+
+    Foreign keys are switched off (table rebuilds would otherwise cascade
+    deletes), which SQLite only allows outside a transaction, so this cannot
+    use the pooled connections. Holds the writer lock so it never races the
+    WAL writer.
+    """
+    with _writer_lock:
+        conn = _open_connection()
+        conn.isolation_level = None
+        try:
+            conn.execute("PRAGMA foreign_keys = OFF")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+    clear_cache()
 
 def init_db():
     """Initialize database with required tables."""
     with get_connection() as conn:
+        # Already created and fully migrated: nothing to do on reruns
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+
+    with _schema_connection() as conn:
         cursor = conn.cursor()
 
         # Classes table
@@ -90,6 +503,7 @@ def init_db():
                 correct_answer TEXT NOT NULL,
                 points REAL NOT NULL DEFAULT 1.0,
                 question_type TEXT DEFAULT 'multiple_choice',
+                matcher_config TEXT,
                 FOREIGN KEY (assignment_id) REFERENCES assignments(id) ON DELETE CASCADE,
                 UNIQUE(assignment_id, question_num)
             )
@@ -103,14 +517,12 @@ def init_db():
             )
         """)
 
-        conn.commit()
-
         # Run migrations for existing databases
         migrate_database(conn)
 
 
-def migrate_database(conn):
-    """Migrate existing databases to add new fields."""
+def _migrate_student_id_column(conn):
+    """Add the student_id column to students tables that predate it."""
     cursor = conn.cursor()
 
     # Check if student_id column exists
@@ -120,18 +532,401 @@ def migrate_database(conn):
     if 'student_id' not in columns:
         # Add student_id column to existing students table
         cursor.execute("ALTER TABLE students ADD COLUMN student_id TEXT")
+        print("Database migrated: Added student_id column to students table")
 
-        # Create index for better performance
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_student_id ON students(student_id)")
 
-        # Note: We can't add the UNIQUE constraint to existing tables via ALTER TABLE
-        # but new databases will have it from the CREATE TABLE statement
-        conn.commit()
-        print("Database migrated: Added student_id column to students table")
+def _has_unique_index(conn, table, columns):
+    """Check whether table has a UNIQUE index on exactly these columns."""
+    for index in conn.execute(f"PRAGMA index_list({table})").fetchall():
+        if index['unique']:
+            indexed = [col['name'] for col in conn.execute(f"PRAGMA index_info('{index['name']}')").fetchall()]
+            if indexed == list(columns):
+                return True
+    return False
+
+
+def _migrate_students_unique_constraint(conn):
+    """Rebuild legacy students tables so they get UNIQUE(class_id, student_id)."""
+    if _has_unique_index(conn, 'students', ('class_id', 'student_id')):
+        return
+
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS students_rebuild")
+    cursor.execute("""
+        CREATE TABLE students_rebuild (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            student_id TEXT,
+            class_id INTEGER NOT NULL,
+            email TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (class_id) REFERENCES classes(id) ON DELETE CASCADE,
+            UNIQUE(class_id, student_id)
+        )
+    """)
+    # Keep every student (and so their grades); if a student ID is duplicated
+    # within a class, only the oldest row keeps it.
+    cursor.execute("""
+        INSERT INTO students_rebuild (id, name, student_id, class_id, email, created_at)
+        SELECT s.id, s.name,
+               CASE WHEN s.student_id IS NULL OR s.id = (
+                   SELECT MIN(d.id) FROM students d
+                   WHERE d.class_id = s.class_id AND d.student_id = s.student_id
+               ) THEN s.student_id END,
+               s.class_id, s.email, s.created_at
+        FROM students s
+    """)
+    cleared = cursor.execute("""
+        SELECT COUNT(*) FROM students s JOIN students_rebuild r ON r.id = s.id
+        WHERE s.student_id IS NOT NULL AND r.student_id IS NULL
+    """).fetchone()[0]
+    cursor.execute("DROP TABLE students")
+    cursor.execute("ALTER TABLE students_rebuild RENAME TO students")
+    print("Database migrated: Rebuilt students table with UNIQUE(class_id, student_id)")
+    if cleared:
+        print(f"Database migrated: Cleared {cleared} duplicate student IDs")
+
+
+def _migrate_hot_path_indexes(conn):
+    """Add indexes for the class and assignment lookups every page makes."""
+    cursor = conn.cursor()
+    # get_students_by_class: WHERE class_id = ? ORDER BY name
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_students_class ON students(class_id, name)")
+    # get_assignments_by_class: WHERE class_id = ? ORDER BY due_date, name
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_assignments_class ON assignments(class_id, due_date, name)")
+    # get_grades_by_assignment: WHERE assignment_id = ?, joined to students
+    # (lookups by student use the UNIQUE(student_id, assignment_id) index)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_grades_assignment ON grades(assignment_id, student_id)")
+    # Superseded by UNIQUE(class_id, student_id)
+    cursor.execute("DROP INDEX IF EXISTS idx_student_id")
+
+
+# Recomputes student_course_stats for the students selected by {where}; used by
+# the triggers below and by rebuild_student_stats(). Only graded cells of the
+# student's own class count, matching the gradebook's weighted average. (An
+# upsert rather than INSERT OR REPLACE: an outer statement's conflict clause
+# would override the latter inside a trigger.)
+_STUDENT_STATS_SQL = """
+    INSERT INTO student_course_stats
+        (student_id, class_id, weighted_sum, weight_total, graded_count, updated_at)
+    SELECT s.id, s.class_id,
+           COALESCE(SUM(g.points * 100.0 / a.max_points * a.weight), 0),
+           COALESCE(SUM(a.weight), 0),
+           COUNT(a.id),
+           CURRENT_TIMESTAMP
+    FROM students s
+    LEFT JOIN grades g ON g.student_id = s.id AND g.points IS NOT NULL
+    LEFT JOIN assignments a ON a.id = g.assignment_id AND a.class_id = s.class_id AND a.max_points > 0
+    WHERE {where}
+    GROUP BY s.id
+    ON CONFLICT(student_id) DO UPDATE SET
+        class_id = excluded.class_id,
+        weighted_sum = excluded.weighted_sum,
+        weight_total = excluded.weight_total,
+        graded_count = excluded.graded_count,
+        updated_at = excluded.updated_at
+"""
+
+_STUDENT_STATS_TRIGGERS = {
+    "trg_stats_grade_insert": (
+        "AFTER INSERT ON grades",
+        _STUDENT_STATS_SQL.format(where="s.id = NEW.student_id")),
+    "trg_stats_grade_update": (
+        "AFTER UPDATE OF student_id, assignment_id, points ON grades",
+        _STUDENT_STATS_SQL.format(where="s.id IN (OLD.student_id, NEW.student_id)")),
+    "trg_stats_grade_delete": (
+        "AFTER DELETE ON grades",
+        _STUDENT_STATS_SQL.format(where="s.id = OLD.student_id")),
+    "trg_stats_assignment_update": (
+        "AFTER UPDATE OF class_id, max_points, weight ON assignments",
+        _STUDENT_STATS_SQL.format(where="s.class_id IN (OLD.class_id, NEW.class_id)")),
+    "trg_stats_assignment_delete": (
+        "AFTER DELETE ON assignments",
+        _STUDENT_STATS_SQL.format(where="s.class_id = OLD.class_id")),
+    "trg_stats_student_insert": (
+        "AFTER INSERT ON students",
+        _STUDENT_STATS_SQL.format(where="s.id = NEW.id")),
+    "trg_stats_student_update": (
+        "AFTER UPDATE OF class_id ON students",
+        _STUDENT_STATS_SQL.format(where="s.id = NEW.id")),
+    "trg_stats_student_delete": (
+        "AFTER DELETE ON students",
+        "DELETE FROM student_course_stats WHERE student_id = OLD.id"),
+}
+
+
+def _migrate_student_course_stats(conn):
+    """Add the trigger-maintained student_course_stats table and fill it."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS student_course_stats (
+            student_id INTEGER PRIMARY KEY,
+            class_id INTEGER NOT NULL,
+            weighted_sum REAL NOT NULL DEFAULT 0,
+            weight_total REAL NOT NULL DEFAULT 0,
+            graded_count INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_student_stats_class ON student_course_stats(class_id)")
+    for name, (event, body) in _STUDENT_STATS_TRIGGERS.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"CREATE TRIGGER {name} {event} FOR EACH ROW BEGIN {body}; END")
+    _rebuild_student_stats(conn)
+
+
+def _rebuild_student_stats(conn):
+    conn.execute("DELETE FROM student_course_stats")
+    conn.execute(_STUDENT_STATS_SQL.format(where="1"))
+
+
+def _migrate_sweep_orphans(conn):
+    """Delete rows left behind by deletes made before foreign keys were enforced."""
+    cursor = conn.cursor()
+    removed = 0
+    for statement in (
+        "DELETE FROM students WHERE class_id NOT IN (SELECT id FROM classes)",
+        "DELETE FROM assignments WHERE class_id NOT IN (SELECT id FROM classes)",
+        """DELETE FROM grades WHERE student_id NOT IN (SELECT id FROM students)
+                                 OR assignment_id NOT IN (SELECT id FROM assignments)""",
+        "DELETE FROM answer_keys WHERE assignment_id NOT IN (SELECT id FROM assignments)",
+        "DELETE FROM student_course_stats WHERE student_id NOT IN (SELECT id FROM students)",
+    ):
+        removed += cursor.execute(statement).rowcount
+    if removed:
+        print(f"Database migrated: Removed {removed} orphaned rows")
+
+
+# Dashboard counters: name -> (table, condition counted rows must meet)
+_COUNTERS = {
+    "classes": ("classes", None),
+    "students": ("students", None),
+    "assignments": ("assignments", None),
+    "grades": ("grades", "points IS NOT NULL"),
+}
+
+
+def _migrate_counters(conn):
+    """Add the trigger-maintained counters table behind the dashboard totals."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    for name, (table, condition) in _COUNTERS.items():
+        update = f"UPDATE counters SET value = value + {{delta}} WHERE name = '{name}'"
+        if condition is None:
+            triggers = {
+                "insert": ("AFTER INSERT", update.format(delta=1)),
+                "delete": ("AFTER DELETE", update.format(delta=-1)),
+            }
+        else:
+            new_cond = condition.replace("points", "NEW.points")
+            old_cond = condition.replace("points", "OLD.points")
+            triggers = {
+                "insert": ("AFTER INSERT", update.format(delta=f"({new_cond})")),
+                "delete": ("AFTER DELETE", update.format(delta=f"-({old_cond})")),
+                "update": ("AFTER UPDATE OF points", update.format(delta=f"({new_cond}) - ({old_cond})")),
+            }
+        for event_name, (event, body) in triggers.items():
+            trigger = f"trg_count_{name}_{event_name}"
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            cursor.execute(f"CREATE TRIGGER {trigger} {event} ON {table} FOR EACH ROW BEGIN {body}; END")
+    _rebuild_counters(conn)
+
+
+def _rebuild_counters(conn):
+    for name, (table, condition) in _COUNTERS.items():
+        # WHERE is required so the parser doesn't read ON CONFLICT as a join clause
+        conn.execute(f"""
+            INSERT INTO counters (name, value) SELECT ?, COUNT(*) FROM {table} WHERE {condition or 'true'}
+            ON CONFLICT(name) DO UPDATE SET value = excluded.value
+        """, (name,))
+
+
+def _migrate_responses(conn):
+    """Add the responses table: each student's normalized answers per auto-graded assignment."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS responses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            assignment_id INTEGER NOT NULL,
+            answers TEXT NOT NULL,
+            raw_score REAL NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+            FOREIGN KEY (assignment_id) REFERENCES assignments(id) ON DELETE CASCADE,
+            UNIQUE(student_id, assignment_id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_assignment ON responses(assignment_id)")
+
+
+def _migrate_matcher_config(conn):
+    """Add answer_keys.matcher_config: optional JSON options for the question's matcher."""
+    columns = [col[1] for col in conn.execute("PRAGMA table_info(answer_keys)").fetchall()]
+    if 'matcher_config' not in columns:
+        conn.execute("ALTER TABLE answer_keys ADD COLUMN matcher_config TEXT")
+
+
+def _migrate_answer_key_versions(conn):
+    """Add answer key versions: a change log per assignment, answer_keys.version and responses.key_version."""
+    import json
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS answer_key_versions (
+            assignment_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            changes TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (assignment_id, version),
+            FOREIGN KEY (assignment_id) REFERENCES assignments(id) ON DELETE CASCADE
+        )
+    """)
+    key_columns = [col[1] for col in conn.execute("PRAGMA table_info(answer_keys)").fetchall()]
+    if 'version' not in key_columns:
+        conn.execute("ALTER TABLE answer_keys ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    response_columns = [col[1] for col in conn.execute("PRAGMA table_info(responses)").fetchall()]
+    if 'key_version' not in response_columns:
+        conn.execute("ALTER TABLE responses ADD COLUMN key_version INTEGER")
+
+    # Existing keys become version 1, and the responses stored against them were graded with it
+    existing = conn.execute("""
+        SELECT assignment_id, GROUP_CONCAT(question_num) FROM answer_keys
+        WHERE assignment_id NOT IN (SELECT assignment_id FROM answer_key_versions)
+        GROUP BY assignment_id
+    """).fetchall()
+    conn.executemany(
+        "INSERT INTO answer_key_versions (assignment_id, version, changes) VALUES (?, 1, ?)",
+        [(assignment_id, json.dumps({"added": sorted(int(q) for q in nums.split(",")), "changed": [], "removed": []},
+                                    separators=(",", ":")))
+         for assignment_id, nums in existing]
+    )
+    conn.execute("""
+        UPDATE responses SET key_version = 1
+        WHERE key_version IS NULL AND assignment_id IN (SELECT assignment_id FROM answer_key_versions)
+    """)
+
+
+# Schema migrations in the order they must be applied. PRAGMA user_version
+# records the last one applied; every step must be safe to re-run.
+MIGRATIONS = [
+    (1, _migrate_student_id_column),
+    (2, _migrate_students_unique_constraint),
+    (3, _migrate_hot_path_indexes),
+    (4, _migrate_student_course_stats),
+    (5, _migrate_sweep_orphans),
+    (6, _migrate_counters),
+    (7, _migrate_responses),
+    (8, _migrate_matcher_config),
+    (9, _migrate_answer_key_versions),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate_database(conn):
+    """Migrate existing databases by running any pending schema migrations."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, migration in MIGRATIONS:
+        if version > current:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+
+
+# ==================== BULK WRITE HELPERS ====================
+
+def _new_report():
+    """Report returned by bulk writes: row indexes inserted/updated, rejected rows with reasons."""
+    return {"inserted": [], "updated": [], "rejected": []}
+
+def _reject(report, row, reason):
+    report["rejected"].append({"row": row, "reason": reason})
+
+def _clean_text(value):
+    """Normalize an imported cell to stripped text, or None if it is blank/NaN."""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        # Numeric IDs come back from pandas as floats (12345678.0)
+        value = int(value)
+    text = str(value).strip()
+    return text or None
+
+def _clean_number(value):
+    """Normalize an imported cell to a float, or None if it is blank/NaN."""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    number = float(value)
+    return None if number != number else number
+
+# ==================== MAINTENANCE ====================
+
+@contextmanager
+def _maintenance_connection():
+    """Connection for maintenance pragmas, outside any transaction."""
+    if STORAGE_MODE == "wal":
+        with _writer_lock:
+            yield _writer_connection()
+    else:
+        with get_connection() as conn:
+            yield conn
+
+def compact_database(max_seconds=COMPACTION_STEP_SECONDS, analyze=True):
+    """Reclaim free pages in small incremental_vacuum steps, then refresh statistics.
+
+    Stops once max_seconds have passed, so repeated calls finish the job
+    without ever holding the database for long. Returns a progress dict.
+    """
+    deadline = time.monotonic() + max_seconds
+    with _maintenance_connection() as conn:
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        free_pages = free_before
+        # incremental_vacuum only works once auto_vacuum is INCREMENTAL (2)
+        while auto_vacuum == 2 and free_pages > 0 and time.monotonic() < deadline:
+            conn.execute(f"PRAGMA incremental_vacuum({int(COMPACTION_PAGES_PER_STEP)})").fetchall()
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+        analyzed = False
+        if analyze and free_pages == 0 and time.monotonic() < deadline:
+            conn.execute(f"PRAGMA analysis_limit = {int(ANALYSIS_LIMIT)}")
+            conn.execute("ANALYZE")
+            analyzed = True
 
+    return {
+        "incremental": auto_vacuum == 2,
+        "freed_pages": free_before - free_pages,
+        "free_pages": free_pages,
+        "analyzed": analyzed,
+    }
+
+def enable_incremental_compaction():
+    """Switch an existing database to auto_vacuum=INCREMENTAL.
+
+    Needs one full VACUUM, which rewrites the whole file; run it from
+    Settings, not on a hot path. New databases are created incremental.
+    """
+    with _maintenance_connection() as conn:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+def _compact_after_delete():
+    """Reclaim the pages a delete just freed, within one short time box."""
+    if getattr(_local, 'depth', 0) or getattr(_local, 'write_depth', 0):
+        # Part of a larger transaction; leave compaction to a later call
+        return
+    try:
+        compact_database(analyze=False)
+    except sqlite3.Error:
+        # Compaction is opportunistic; a busy database just skips it
+        pass
 
 # ==================== CLASS OPERATIONS ====================
 
+@_cached("classes")
 def get_all_classes():
     """Get all classes."""
     with get_connection() as conn:
@@ -139,6 +934,7 @@ def get_all_classes():
         cursor.execute("SELECT * FROM classes ORDER BY name")
         return [dict(row) for row in cursor.fetchall()]
 
+@_cached("classes")
 def get_class_by_id(class_id):
     """Get a class by ID."""
     with get_connection() as conn:
@@ -149,27 +945,68 @@ def get_class_by_id(class_id):
 
 def add_class(name):
     """Add a new class."""
-    with get_connection() as conn:
+    with get_write_connection("classes") as conn:
         cursor = conn.cursor()
         cursor.execute("INSERT INTO classes (name) VALUES (?)", (name,))
         return cursor.lastrowid
 
 def update_class(class_id, name):
     """Update a class name."""
-    with get_connection() as conn:
+    with get_write_connection("classes") as conn:
         cursor = conn.cursor()
         cursor.execute("UPDATE classes SET name = ? WHERE id = ?", (name, class_id))
         return cursor.rowcount > 0
 
 def delete_class(class_id):
     """Delete a class and all associated students."""
-    with get_connection() as conn:
+    with get_write_connection("classes", "students", "assignments", "grades", "answer_keys", "responses") as conn:
         cursor = conn.cursor()
         cursor.execute("DELETE FROM classes WHERE id = ?", (class_id,))
-        return cursor.rowcount > 0
+        deleted = cursor.rowcount > 0
+    _compact_after_delete()
+    return deleted
+
+@_cached("classes", "students", "assignments", "grades")
+def get_class_overview():
+    """Get every class with its counts and grading progress in one query.
+
+    Each row has the class columns plus student_count, assignment_count,
+    graded_count (graded cells), completion (graded / students x assignments)
+    and average (mean of the students' weighted averages, None if ungraded).
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT c.*,
+                   COALESCE(st.student_count, 0) AS student_count,
+                   COALESCE(a.assignment_count, 0) AS assignment_count,
+                   COALESCE(st.graded_count, 0) AS graded_count,
+                   st.average
+            FROM classes c
+            LEFT JOIN (
+                SELECT class_id, COUNT(*) AS student_count, SUM(graded_count) AS graded_count,
+                       AVG(CASE WHEN weight_total > 0 THEN weighted_sum / weight_total END) AS average
+                FROM student_course_stats
+                GROUP BY class_id
+            ) st ON st.class_id = c.id
+            LEFT JOIN (
+                SELECT class_id, COUNT(*) AS assignment_count
+                FROM assignments
+                GROUP BY class_id
+            ) a ON a.class_id = c.id
+            ORDER BY c.name
+        """)
+        overview = []
+        for row in cursor.fetchall():
+            item = dict(row)
+            cells = item['student_count'] * item['assignment_count']
+            item['completion'] = item['graded_count'] / cells if cells else 0.0
+            overview.append(item)
+        return overview
 
 # ==================== STUDENT OPERATIONS ====================
 
+@_cached("students")
 def get_students_by_class(class_id):
     """Get all students in a class."""
     with get_connection() as conn:
@@ -202,7 +1039,7 @@ def get_student_by_id(student_id):
 
 def add_student(name, class_id, student_id=None, email=None):
     """Add a new student."""
-    with get_connection() as conn:
+    with get_write_connection("students") as conn:
         cursor = conn.cursor()
         cursor.execute(
             "INSERT INTO students (name, student_id, class_id, email) VALUES (?, ?, ?, ?)",
@@ -212,7 +1049,7 @@ def add_student(name, class_id, student_id=None, email=None):
 
 def update_student(student_id, name, student_uid=None, class_id=None, email=None):
     """Update a student."""
-    with get_connection() as conn:
+    with get_write_connection("students") as conn:
         cursor = conn.cursor()
         if class_id is not None:
             cursor.execute(
@@ -228,27 +1065,50 @@ def update_student(student_id, name, student_uid=None, class_id=None, email=None
 
 def delete_student(student_id):
     """Delete a student."""
-    with get_connection() as conn:
+    with get_write_connection("students", "grades", "responses") as conn:
         cursor = conn.cursor()
         cursor.execute("DELETE FROM students WHERE id = ?", (student_id,))
-        return cursor.rowcount > 0
+        deleted = cursor.rowcount > 0
+    _compact_after_delete()
+    return deleted
 
 def bulk_add_students(students, class_id):
-    """Bulk add students to a class. students is a list of dicts with 'name', optional 'student_id' and 'email'."""
-    with get_connection() as conn:
+    """Bulk add students to a class. students is a list of dicts with 'name', optional 'student_id' and 'email'.
+
+    Returns a report dict: 'inserted' row indexes and 'rejected' rows with reasons.
+    """
+    report = _new_report()
+    with get_write_connection("students") as conn:
         cursor = conn.cursor()
-        added = 0
-        for student in students:
-            try:
-                cursor.execute(
-                    "INSERT INTO students (name, student_id, class_id, email) VALUES (?, ?, ?, ?)",
-                    (student.get('name'), student.get('student_id'), class_id, student.get('email'))
-                )
-                added += 1
-            except sqlite3.IntegrityError:
-                continue
-        return added
+        cursor.execute(
+            "SELECT student_id FROM students WHERE class_id = ? AND student_id IS NOT NULL",
+            (class_id,)
+        )
+        existing_ids = {row[0] for row in cursor.fetchall()}
+        seen_ids = {}
+        rows = []
+        for i, student in enumerate(students):
+            name = _clean_text(student.get('name'))
+            student_uid = _clean_text(student.get('student_id'))
+            if not name:
+                _reject(report, i, "missing name")
+            elif student_uid in existing_ids:
+                _reject(report, i, f"student ID {student_uid} already exists in this class")
+            elif student_uid in seen_ids:
+                _reject(report, i, f"duplicate student ID {student_uid} (same as row {seen_ids[student_uid]})")
+            else:
+                if student_uid:
+                    seen_ids[student_uid] = i
+                rows.append((name, student_uid, class_id, _clean_text(student.get('email'))))
+                report["inserted"].append(i)
+
+        cursor.executemany(
+            "INSERT INTO students (name, student_id, class_id, email) VALUES (?, ?, ?, ?)",
+            rows
+        )
+    return report
 
+@_cached("students")
 def get_student_count_by_class(class_id):
     """Get the number of students in a class."""
     with get_connection() as conn:
@@ -256,20 +1116,23 @@ def get_student_count_by_class(class_id):
         cursor.execute("SELECT COUNT(*) FROM students WHERE class_id = ?", (class_id,))
         return cursor.fetchone()[0]
 
+@_cached("classes", "students", "assignments", "grades")
 def get_total_counts():
-    """Get total counts for dashboard."""
+    """Get total counts for dashboard.
+
+    Reads the trigger-maintained counters table, so the cost doesn't grow with
+    the data. 'grades' counts grades that have points.
+    """
     with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM classes")
-        class_count = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM students")
-        student_count = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM assignments")
-        assignment_count = cursor.fetchone()[0]
-        return {"classes": class_count, "students": student_count, "assignments": assignment_count}
+        cursor.execute("SELECT name, value FROM counters")
+        counts = {"classes": 0, "students": 0, "assignments": 0, "grades": 0}
+        counts.update({row['name']: row['value'] for row in cursor.fetchall()})
+        return counts
 
 # ==================== ASSIGNMENT OPERATIONS ====================
 
+@_cached("assignments")
 def get_assignments_by_class(class_id):
     """Get all assignments for a class."""
     with get_connection() as conn:
@@ -292,6 +1155,7 @@ def get_all_assignments():
         """)
         return [dict(row) for row in cursor.fetchall()]
 
+@_cached("assignments")
 def get_assignment_by_id(assignment_id):
     """Get an assignment by ID."""
     with get_connection() as conn:
@@ -302,7 +1166,7 @@ def get_assignment_by_id(assignment_id):
 
 def add_assignment(name, class_id, max_points=100, weight=1.0, due_date=None):
     """Add a new assignment."""
-    with get_connection() as conn:
+    with get_write_connection("assignments") as conn:
         cursor = conn.cursor()
         cursor.execute(
             "INSERT INTO assignments (name, class_id, max_points, weight, due_date) VALUES (?, ?, ?, ?, ?)",
@@ -312,7 +1176,7 @@ def add_assignment(name, class_id, max_points=100, weight=1.0, due_date=None):
 
 def update_assignment(assignment_id, name, max_points=None, weight=None, due_date=None):
     """Update an assignment."""
-    with get_connection() as conn:
+    with get_write_connection("assignments") as conn:
         cursor = conn.cursor()
         cursor.execute(
             "UPDATE assignments SET name = ?, max_points = ?, weight = ?, due_date = ? WHERE id = ?",
@@ -322,10 +1186,12 @@ def update_assignment(assignment_id, name, max_points=None, weight=None, due_dat
 
 def delete_assignment(assignment_id):
     """Delete an assignment."""
-    with get_connection() as conn:
+    with get_write_connection("assignments", "grades", "answer_keys", "responses") as conn:
         cursor = conn.cursor()
         cursor.execute("DELETE FROM assignments WHERE id = ?", (assignment_id,))
-        return cursor.rowcount > 0
+        deleted = cursor.rowcount > 0
+    _compact_after_delete()
+    return deleted
 
 # ==================== GRADE OPERATIONS ====================
 
@@ -366,9 +1232,48 @@ def get_grades_by_student(student_id):
         """, (student_id,))
         return [dict(row) for row in cursor.fetchall()]
 
+def get_gradebook_matrix(class_id):
+    """Get every student, assignment and grade for a class in one round trip.
+
+    Returns a dict with 'students' and 'assignments' (same rows and order as
+    get_students_by_class / get_assignments_by_class) and 'grades', a dense dict
+    keyed by (student id, assignment id) whose value is the grade row or None.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM students WHERE class_id = ? ORDER BY name",
+            (class_id,)
+        )
+        students = [dict(row) for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT * FROM assignments WHERE class_id = ? ORDER BY due_date, name",
+            (class_id,)
+        )
+        assignments = [dict(row) for row in cursor.fetchall()]
+        cursor.execute("""
+            SELECT s.id AS cell_student_id, a.id AS cell_assignment_id,
+                   g.id, g.student_id, g.assignment_id, g.points, g.comments,
+                   g.created_at, g.updated_at
+            FROM students s
+            JOIN assignments a ON a.class_id = s.class_id
+            LEFT JOIN grades g ON g.student_id = s.id AND g.assignment_id = a.id
+            WHERE s.class_id = ?
+        """, (class_id,))
+        grades = {}
+        for row in cursor.fetchall():
+            key = (row['cell_student_id'], row['cell_assignment_id'])
+            if row['id'] is None:
+                grades[key] = None
+            else:
+                grade = dict(row)
+                del grade['cell_student_id'], grade['cell_assignment_id']
+                grades[key] = grade
+        return {"students": students, "assignments": assignments, "grades": grades}
+
 def set_grade(student_id, assignment_id, points, comments=None):
     """Set or update a grade."""
-    with get_connection() as conn:
+    with get_write_connection("grades") as conn:
         cursor = conn.cursor()
         cursor.execute("""
             INSERT INTO grades (student_id, assignment_id, points, comments)
@@ -379,23 +1284,115 @@ def set_grade(student_id, assignment_id, points, comments=None):
         return cursor.lastrowid
 
 def bulk_set_grades(grades):
-    """Bulk set grades. grades is a list of dicts with student_id, assignment_id, points, comments."""
+    """Bulk set grades. grades is a list of dicts with student_id, assignment_id, points, comments.
+
+    Rows are staged in a temp table, validated and upserted with one statement.
+    Returns a report dict: 'inserted' and 'updated' row indexes and 'rejected'
+    rows with reasons. If a grade appears twice, the last row wins.
+    """
+    report = _new_report()
+    staged = {}
+    for i, grade in enumerate(grades):
+        try:
+            key = (int(grade['student_id']), int(grade['assignment_id']))
+            points = _clean_number(grade.get('points'))
+        except (KeyError, TypeError, ValueError):
+            _reject(report, i, "invalid student, assignment or points")
+            continue
+        if key in staged:
+            _reject(report, staged[key][0], f"superseded by row {i}")
+        staged[key] = (i, key[0], key[1], points, _clean_text(grade.get('comments')))
+
+    with get_write_connection("grades") as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS staged_grades (
+                row_num INTEGER PRIMARY KEY,
+                student_id INTEGER NOT NULL,
+                assignment_id INTEGER NOT NULL,
+                points REAL,
+                comments TEXT
+            )
+        """)
+        cursor.execute("DELETE FROM staged_grades")
+        cursor.executemany(
+            "INSERT INTO staged_grades (row_num, student_id, assignment_id, points, comments) VALUES (?, ?, ?, ?, ?)",
+            staged.values()
+        )
+
+        # Classify every staged row before writing
+        cursor.execute("""
+            SELECT sg.row_num, s.class_id AS student_class, a.class_id AS assignment_class,
+                   g.id IS NOT NULL AS has_grade
+            FROM staged_grades sg
+            LEFT JOIN students s ON s.id = sg.student_id
+            LEFT JOIN assignments a ON a.id = sg.assignment_id
+            LEFT JOIN grades g ON g.student_id = sg.student_id AND g.assignment_id = sg.assignment_id
+            ORDER BY sg.row_num
+        """)
+        invalid = []
+        for row in cursor.fetchall():
+            if row['student_class'] is None:
+                reason = "student not found"
+            elif row['assignment_class'] is None:
+                reason = "assignment not found"
+            elif row['student_class'] != row['assignment_class']:
+                reason = "student is not in the assignment's class"
+            else:
+                report["updated" if row['has_grade'] else "inserted"].append(row['row_num'])
+                continue
+            _reject(report, row['row_num'], reason)
+            invalid.append((row['row_num'],))
+
+        cursor.executemany("DELETE FROM staged_grades WHERE row_num = ?", invalid)
+        # "WHERE true" is required by SQLite's upsert-from-SELECT grammar
+        cursor.execute("""
+            INSERT INTO grades (student_id, assignment_id, points, comments)
+            SELECT student_id, assignment_id, points, comments FROM staged_grades WHERE true
+            ON CONFLICT(student_id, assignment_id)
+            DO UPDATE SET points = excluded.points, comments = excluded.comments,
+                          updated_at = CURRENT_TIMESTAMP
+        """)
+        cursor.execute("DELETE FROM staged_grades")
+
+    report["rejected"].sort(key=lambda r: r["row"])
+    return report
+
+# ==================== STUDENT STATISTICS ====================
+
+def _stats_row(row):
+    stats = dict(row)
+    stats['average'] = row['weighted_sum'] / row['weight_total'] if row['weight_total'] > 0 else None
+    return stats
+
+@_cached("students", "assignments", "grades")
+def get_student_stats_by_class(class_id):
+    """Get precomputed weighted averages for a class, keyed by student id.
+
+    'average' is the weighted percentage (None if nothing is graded yet).
+    """
     with get_connection() as conn:
         cursor = conn.cursor()
-        for grade in grades:
-            cursor.execute("""
-                INSERT INTO grades (student_id, assignment_id, points, comments)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(student_id, assignment_id)
-                DO UPDATE SET points = ?, comments = ?, updated_at = CURRENT_TIMESTAMP
-            """, (
-                grade['student_id'], grade['assignment_id'], grade['points'], grade.get('comments'),
-                grade['points'], grade.get('comments')
-            ))
-        return len(grades)
+        cursor.execute(
+            "SELECT * FROM student_course_stats WHERE class_id = ?",
+            (class_id,)
+        )
+        return {row['student_id']: _stats_row(row) for row in cursor.fetchall()}
+
+def rebuild_student_stats():
+    """Recompute student_course_stats and the dashboard counters from scratch.
+
+    Recovery in case the trigger-maintained tables ever drift. Returns the
+    number of students rebuilt.
+    """
+    with get_write_connection() as conn:
+        _rebuild_student_stats(conn)
+        _rebuild_counters(conn)
+        return conn.execute("SELECT COUNT(*) FROM student_course_stats").fetchone()[0]
 
 # ==================== ANSWER KEY OPERATIONS ====================
 
+@_cached("answer_keys")
 def get_answer_key(assignment_id):
     """Get answer key for an assignment."""
     with get_connection() as conn:
@@ -406,35 +1403,223 @@ def get_answer_key(assignment_id):
         )
         return [dict(row) for row in cursor.fetchall()]
 
-def set_answer_key(assignment_id, questions):
-    """Set answer key for an assignment. questions is a list of dicts with question_num, correct_answer, points, question_type."""
+def _clean_matcher_config(value):
+    """Matcher configuration as canonical JSON text, or None if empty. Raises ValueError if it isn't a JSON object."""
+    import json
+    if value is None or (isinstance(value, float) and value != value) or value == "" or value == {}:
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not isinstance(value, dict):
+        raise ValueError("matcher configuration must be a JSON object")
+    return json.dumps(value, sort_keys=True, separators=(",", ":")) if value else None
+
+@_cached("answer_keys")
+def get_answer_key_version(assignment_id):
+    """Current answer key version of an assignment (0 if it never had a key)."""
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT MAX(version) FROM answer_key_versions WHERE assignment_id = ?", (assignment_id,)
+        ).fetchone()
+        return row[0] or 0
+
+@_cached("answer_keys")
+def get_answer_key_history(assignment_id):
+    """Every saved version of an assignment's answer key, oldest first: version, created_at and the
+    'added', 'changed' and 'removed' question numbers."""
+    import json
     with get_connection() as conn:
         cursor = conn.cursor()
-        # Delete existing answer key
-        cursor.execute("DELETE FROM answer_keys WHERE assignment_id = ?", (assignment_id,))
-        # Insert new answers
-        for q in questions:
-            cursor.execute("""
-                INSERT INTO answer_keys (assignment_id, question_num, correct_answer, points, question_type)
-                VALUES (?, ?, ?, ?, ?)
-            """, (
-                assignment_id,
-                q['question_num'],
-                q['correct_answer'],
-                q.get('points', 1.0),
-                q.get('question_type', 'multiple_choice')
-            ))
-        return len(questions)
+        cursor.execute(
+            "SELECT version, changes, created_at FROM answer_key_versions WHERE assignment_id = ? ORDER BY version",
+            (assignment_id,)
+        )
+        return [dict(json.loads(row['changes']), version=row['version'], created_at=row['created_at'])
+                for row in cursor.fetchall()]
+
+def _record_key_version(conn, assignment_id, diff):
+    """Add the next version to an assignment's answer key log; returns the new version number."""
+    import json
+    current = conn.execute(
+        "SELECT COALESCE(MAX(version), 0) FROM answer_key_versions WHERE assignment_id = ?", (assignment_id,)
+    ).fetchone()[0]
+    conn.execute(
+        "INSERT INTO answer_key_versions (assignment_id, version, changes) VALUES (?, ?, ?)",
+        (assignment_id, current + 1, json.dumps(diff, separators=(",", ":")))
+    )
+    return current + 1
+
+_KEY_COLUMNS = ("correct_answer", "points", "question_type", "matcher_config")
+
+def set_answer_key(assignment_id, questions):
+    """Set answer key for an assignment. questions is a list of dicts with question_num, correct_answer, points,
+    question_type and optionally matcher_config (a dict or JSON object text of matcher options).
+
+    Only questions that differ from the stored key are written. Any change
+    starts a new key version. Returns a report dict: 'inserted' (added
+    questions) and 'updated' (changed questions) row indexes, 'rejected'
+    rows with reasons, the 'version' now current and the 'diff': 'added',
+    'changed' and 'removed' question numbers (all empty if the key was
+    unchanged).
+    """
+    report = _new_report()
+    rows = {}
+    for i, q in enumerate(questions):
+        correct_answer = _clean_text(q.get('correct_answer'))
+        try:
+            question_num = int(q['question_num'])
+            points = _clean_number(q.get('points', 1.0))
+        except (KeyError, TypeError, ValueError):
+            _reject(report, i, "invalid question number or points")
+            continue
+        if correct_answer is None:
+            _reject(report, i, "missing correct answer")
+            continue
+        try:
+            matcher_config = _clean_matcher_config(q.get('matcher_config'))
+        except (TypeError, ValueError):
+            _reject(report, i, "invalid matcher configuration")
+            continue
+        if question_num in rows:
+            _reject(report, rows[question_num][0], f"superseded by row {i}")
+        rows[question_num] = (i, correct_answer, 1.0 if points is None else points,
+                              q.get('question_type') or 'multiple_choice', matcher_config)
+
+    with get_write_connection("answer_keys") as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT question_num, {', '.join(_KEY_COLUMNS)} FROM answer_keys WHERE assignment_id = ?",
+            (assignment_id,)
+        )
+        stored = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+        diff = {
+            "added": sorted(q for q in rows if q not in stored),
+            "changed": sorted(q for q in rows if q in stored and stored[q] != rows[q][1:]),
+            "removed": sorted(q for q in stored if q not in rows),
+        }
+        if any(diff.values()):
+            version = _record_key_version(conn, assignment_id, diff)
+            cursor.executemany(
+                "DELETE FROM answer_keys WHERE assignment_id = ? AND question_num = ?",
+                [(assignment_id, q) for q in diff["removed"]]
+            )
+            cursor.executemany("""
+                INSERT INTO answer_keys (assignment_id, question_num, correct_answer, points, question_type,
+                                         matcher_config, version)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(assignment_id, question_num)
+                DO UPDATE SET correct_answer = excluded.correct_answer, points = excluded.points,
+                              question_type = excluded.question_type, matcher_config = excluded.matcher_config,
+                              version = excluded.version
+            """, [(assignment_id, q, *rows[q][1:], version) for q in diff["added"] + diff["changed"]])
+        else:
+            version = cursor.execute(
+                "SELECT COALESCE(MAX(version), 0) FROM answer_key_versions WHERE assignment_id = ?", (assignment_id,)
+            ).fetchone()[0]
+
+    report["inserted"] = sorted(rows[q][0] for q in diff["added"])
+    report["updated"] = sorted(rows[q][0] for q in diff["changed"])
+    report["rejected"].sort(key=lambda r: r["row"])
+    report["version"] = version
+    report["diff"] = diff
+    return report
 
 def delete_answer_key(assignment_id):
-    """Delete answer key for an assignment."""
-    with get_connection() as conn:
+    """Delete answer key for an assignment. The removal is logged as a new key version.
+
+    Grades and stored responses are kept; the responses now date from an
+    older key version, so the next key re-grades them in full.
+    """
+    with get_write_connection("answer_keys") as conn:
         cursor = conn.cursor()
+        cursor.execute("SELECT question_num FROM answer_keys WHERE assignment_id = ? ORDER BY question_num",
+                       (assignment_id,))
+        removed = [row[0] for row in cursor.fetchall()]
+        if removed:
+            _record_key_version(conn, assignment_id, {"added": [], "changed": [], "removed": removed})
         cursor.execute("DELETE FROM answer_keys WHERE assignment_id = ?", (assignment_id,))
         return cursor.rowcount
 
+# ==================== RESPONSE OPERATIONS ====================
+
+def bulk_save_responses(assignment_id, responses, key_version=None):
+    """Store graded answers. responses is a list of (student_id, answers, raw_score) where
+    answers maps question number to the normalized answer (blanks left out). key_version is the
+    answer key version they were graded against (default: the current one).
+    """
+    import json
+    with get_write_connection("responses") as conn:
+        if key_version is None:
+            key_version = conn.execute(
+                "SELECT COALESCE(MAX(version), 0) FROM answer_key_versions WHERE assignment_id = ?", (assignment_id,)
+            ).fetchone()[0]
+        conn.executemany("""
+            INSERT INTO responses (student_id, assignment_id, answers, raw_score, key_version)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(student_id, assignment_id)
+            DO UPDATE SET answers = excluded.answers, raw_score = excluded.raw_score,
+                          key_version = excluded.key_version, updated_at = CURRENT_TIMESTAMP
+        """, [(student_id, assignment_id, json.dumps(answers, separators=(",", ":")), raw_score, key_version)
+              for student_id, answers, raw_score in responses])
+
+def get_responses(assignment_id):
+    """Get stored answers for an assignment: student_id, answers {question_num: answer}, raw_score and
+    the key_version they were last graded against."""
+    import json
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT student_id, answers, raw_score, key_version FROM responses WHERE assignment_id = ? ORDER BY student_id",
+            (assignment_id,)
+        )
+        return [
+            {
+                'student_id': row['student_id'],
+                'answers': {int(q): answer for q, answer in json.loads(row['answers']).items()},
+                'raw_score': row['raw_score'],
+                'key_version': row['key_version'],
+            }
+            for row in cursor.fetchall()
+        ]
+
+def apply_regrade(assignment_id, adjusted, rescored=(), key_version=None, unchanged_from=None):
+    """Apply re-graded scores in one batch.
+
+    adjusted is a list of (student_id, raw_score, points_change): the grade
+    moves by points_change, so manual adjustments are kept. rescored is a
+    list of (student_id, raw_score, points) whose grade is replaced. Grade
+    comments are kept. With key_version, the re-graded responses are marked
+    as graded against that answer key version, as are the responses last
+    graded against version unchanged_from (ones the key edit didn't change).
+    """
+    updates = list(adjusted) + list(rescored)
+    with get_write_connection("responses", "grades") as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "UPDATE responses SET raw_score = ?, updated_at = CURRENT_TIMESTAMP WHERE student_id = ? AND assignment_id = ?",
+            [(raw_score, student_id, assignment_id) for student_id, raw_score, _ in updates]
+        )
+        cursor.executemany(
+            "UPDATE grades SET points = points + ?, updated_at = CURRENT_TIMESTAMP WHERE student_id = ? AND assignment_id = ?",
+            [(change, student_id, assignment_id) for student_id, _, change in adjusted if change]
+        )
+        cursor.executemany("""
+            INSERT INTO grades (student_id, assignment_id, points) VALUES (?, ?, ?)
+            ON CONFLICT(student_id, assignment_id)
+            DO UPDATE SET points = excluded.points, updated_at = CURRENT_TIMESTAMP
+        """, [(student_id, assignment_id, points) for student_id, _, points in rescored])
+        if key_version is not None:
+            cursor.executemany(
+                "UPDATE responses SET key_version = ? WHERE student_id = ? AND assignment_id = ?",
+                [(key_version, student_id, assignment_id) for student_id, _, _ in updates]
+            )
+            if unchanged_from is not None:
+                cursor.execute("UPDATE responses SET key_version = ? WHERE assignment_id = ? AND key_version = ?",
+                               (key_version, assignment_id, unchanged_from))
+
 # ==================== SETTINGS OPERATIONS ====================
 
+@_cached("settings")
 def get_setting(key, default=None):
     """Get a setting value."""
     with get_connection() as conn:
@@ -445,7 +1630,7 @@ def get_setting(key, default=None):
 
 def set_setting(key, value):
     """Set a setting value."""
-    with get_connection() as conn:
+    with get_write_connection("settings") as conn:
         cursor = conn.cursor()
         cursor.execute("""
             INSERT INTO settings (key, value) VALUES (?, ?)
@@ -453,6 +1638,7 @@ def set_setting(key, value):
         """, (key, value, value))
         return True
 
+@_cached("settings")
 def get_grade_scale():
     """Get the grade scale settings."""
     import json
@@ -0,0 +1,180 @@
+"""
+Typed submission ingestion.
+Pulls answers out of students' .docx files by streaming word/document.xml
+with the standard library's zip and XML parsers, and builds the response
+table grade_responses() consumes.
+"""
+import io
+import math
+import os
+import re
+import zipfile
+from pathlib import Path
+from xml.parsers import expat
+
+import pandas as pd
+
+from modules.parallel import iter_pooled
+
+WORD_NAMESPACE = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+# document.xml is read in blocks of this size, so only one block is in memory at a time
+READ_BLOCK = 64 * 1024
+
+# A paragraph that opens an answer: "Question 3", "Problem 3:", "Q3) B" (the text after the separator is answer text)
+SECTION_HEADING = re.compile(r"^(?:question|problem|q)\s*#?\s*(\d+)\s*(?:[:.)\-–—]\s*(.*))?$", re.IGNORECASE | re.DOTALL)
+
+# A paragraph that closes the last answer, e.g. the code listing most reports end with
+SECTION_END = re.compile(r"^(?:appendix|references|bibliography|works cited)\b.{0,40}$", re.IGNORECASE)
+
+
+class _ParagraphReader:
+    """expat handlers collecting paragraph text from document.xml.
+
+    Namespace processing is left off (it doubles parsing time); the prefix
+    bound to the WordprocessingML namespace is read from the root element.
+    """
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.paragraphs = []
+        self.parts = []
+        parser.StartElementHandler = self.start_root
+
+    def start_root(self, name, attrs):
+        prefix = next((key[6:] for key, value in attrs.items() if key.startswith("xmlns:") and value == WORD_NAMESPACE),
+                      "w")
+        self.text, self.tab, self.paragraph = f"{prefix}:t", f"{prefix}:tab", f"{prefix}:p"
+        self.breaks = (f"{prefix}:br", f"{prefix}:cr")
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+
+    def start(self, name, attrs):
+        if name == self.text:
+            self.parser.CharacterDataHandler = self.parts.append
+        elif name == self.tab:
+            self.parts.append("\t")
+        elif name in self.breaks:
+            self.parts.append("\n")
+
+    def end(self, name):
+        if name == self.text:
+            self.parser.CharacterDataHandler = None
+        elif name == self.paragraph:
+            self.paragraphs.append("".join(self.parts))
+            self.parts.clear()
+
+
+def iter_paragraphs(source):
+    """Yield the text of each paragraph in a .docx, in document order.
+
+    source is a path, bytes or a binary file. Only word/document.xml is read,
+    streamed through expat; tabs and line breaks inside a paragraph are kept.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    with zipfile.ZipFile(source) as archive, archive.open("word/document.xml") as document:
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        reader = _ParagraphReader(parser)
+        for block in iter(lambda: document.read(READ_BLOCK), b""):
+            parser.Parse(block, False)
+            yield from reader.paragraphs
+            reader.paragraphs.clear()
+        parser.Parse(b"", True)
+        yield from reader.paragraphs
+
+
+def extract_answers(source):
+    """Map question number to answer text for one submission.
+
+    Answers are the paragraphs after a "Question N" / "Problem N" heading, up
+    to the next heading or an "Appendix"-style closing section. Text before
+    the first heading is ignored; a question answered twice keeps both parts.
+    """
+    answers = {}
+    current = None
+    for paragraph in iter_paragraphs(source):
+        text = paragraph.strip()
+        heading = SECTION_HEADING.match(text)
+        if heading:
+            current = int(heading.group(1))
+            text = (heading.group(2) or "").strip()
+        elif SECTION_END.match(text):
+            current = None
+        if current is None or not text:
+            continue
+        answers.setdefault(current, []).append(text)
+    return {q: "\n".join(parts) for q, parts in answers.items()}
+
+
+def find_submissions(source):
+    """(file name, path or bytes) for each .docx in a folder or .zip archive, sorted by name.
+
+    Word's '~$' lock files and macOS '__MACOSX' entries are skipped.
+    """
+    source = Path(source)
+    if source.is_dir():
+        return [(path.name, str(path)) for path in sorted(source.iterdir())
+                if path.is_file() and path.suffix.lower() == ".docx" and not path.name.startswith("~$")]
+    with zipfile.ZipFile(source) as archive:
+        members = [info for info in archive.infolist()
+                   if not info.is_dir() and info.filename.lower().endswith(".docx")
+                   and not info.filename.startswith("__MACOSX/") and not Path(info.filename).name.startswith("~$")]
+        return sorted((Path(info.filename).name, archive.read(info)) for info in members)
+
+
+def is_submission_source(source):
+    """True for a .zip archive or a folder holding .docx submissions."""
+    source = Path(source)
+    if source.is_dir():
+        return any(path.suffix.lower() == ".docx" for path in source.iterdir())
+    return source.suffix.lower() == ".zip"
+
+
+def _extract_task(item):
+    """extract_answers() for a process pool worker: failures come back as an 'error'."""
+    name, source = item
+    try:
+        return {'file': name, 'answers': extract_answers(source)}
+    except (zipfile.BadZipFile, KeyError, expat.ExpatError, OSError) as e:
+        return {'file': name, 'answers': None, 'error': str(e) or type(e).__name__}
+
+
+def _extract_batch(items):
+    """_extract_task() over a batch of submissions (one process-pool task)."""
+    return [_extract_task(item) for item in items]
+
+
+def extract_submissions(source, workers=None, questions=()):
+    """Build a response table from a folder or .zip of .docx submissions.
+
+    Each file is one student, named after the file (without .docx), and
+    documents are read in a process pool (workers defaults to one per CPU).
+    Returns (responses, errors): a DataFrame with 'student_name', 'file' and
+    q1..qN columns, N covering every answered question and every question
+    number in questions (blank where a student has no answer), and a list of
+    {'file', 'error'} for documents that couldn't be read.
+    """
+    items = find_submissions(source)
+    workers = workers or os.cpu_count() or 1
+    rows = []
+    errors = []
+    # Documents parse in milliseconds, so hand them out in batches
+    size = max(1, math.ceil(len(items) / (workers * 4)))
+    batches = [items[i:i + size] for i in range(0, len(items), size)]
+    outcomes = (outcome for batch in iter_pooled(_extract_batch, batches, min(workers, len(batches)))
+                for outcome in batch)
+    for outcome in outcomes:
+        if outcome['answers'] is None:
+            errors.append({'file': outcome['file'], 'error': outcome['error']})
+        else:
+            rows.append(outcome)
+
+    last = max([*questions, *(q for row in rows for q in row['answers'])], default=0)
+    columns = ['student_name', 'file'] + [f"q{q}" for q in range(1, last + 1)]
+    responses = pd.DataFrame(
+        [[Path(row['file']).stem, row['file']] + [row['answers'].get(q) for q in range(1, last + 1)] for row in rows],
+        columns=columns
+    )
+    return responses, errors
@@ -0,0 +1,501 @@
+"""
+Auto-grading engine.
+Grades a whole block of student responses against an answer key with
+vectorized pandas/NumPy operations.
+"""
+import functools
+import hashlib
+import itertools
+import os
+from collections import deque
+from collections.abc import Sequence
+
+import numpy as np
+import pandas as pd
+
+# MATCHERS and NUMERIC_TOLERANCE are re-exported for code that used them from here
+from modules.matchers import MATCHERS, NUMERIC_TOLERANCE, AnswerLookup, compile_matcher  # noqa: F401
+from modules.parallel import iter_pooled
+
+# Files with fewer rows are graded in-process: below this the process pool's
+# startup and transfer costs outweigh the gain. Larger files are sent to the
+# pool in chunks of PARALLEL_CHUNK_ROWS (streamed uploads in their own chunks).
+PARALLEL_MIN_ROWS = 50000
+PARALLEL_CHUNK_ROWS = 20000
+
+
+# Header spellings tried for question n, in order
+QUESTION_COLUMN_NAMES = ("q{}", "Q{}", "question{}", "Question {}")
+
+
+def find_question_column(columns, q_num):
+    """Return the position of question q_num's column, or None if it can't be found.
+
+    Tries q1 / Q1 / question1 / Question 1, then falls back to the column at
+    position q_num (the identifier usually sits in column 0).
+    """
+    columns = list(columns)
+    for pattern in QUESTION_COLUMN_NAMES:
+        name = pattern.format(q_num)
+        if name in columns:
+            return columns.index(name)
+    if 0 <= q_num < len(columns):
+        return q_num
+    return None
+
+
+def _code_dtype(size):
+    """Smallest signed integer type that can index a lookup of this size (and hold -1)."""
+    return np.min_scalar_type(-max(size, 1))
+
+
+def factorize_answers(block):
+    """Factorize a 2-D block of raw answers into integer codes and the raw unique answers.
+
+    The codes use the smallest integer type that fits (usually int8);
+    missing values get code -1.
+    """
+    values = np.asarray(block, dtype=object)
+    codes, uniques = pd.factorize(values.ravel(), use_na_sentinel=True)
+    return codes.astype(_code_dtype(len(uniques) + 1)).reshape(values.shape), uniques
+
+
+def normalize_uniques(uniques):
+    """Lookup of normalized answers (str, strip, upper) for factorized uniques, plus a trailing '' for code -1."""
+    normalized = pd.Series(uniques, dtype=object).astype(str).str.strip().str.upper()
+    return np.append(normalized.to_numpy(dtype=object), "")
+
+
+def encode_answers(block):
+    """Factorize a 2-D block of raw answers into integer codes and normalized unique answers.
+
+    Answer sheets repeat a handful of distinct values, so only the uniques are
+    normalized. lookup[codes] gives the normalized matrix; missing values get
+    code -1, which picks the trailing ''.
+    """
+    codes, uniques = factorize_answers(block)
+    return codes, normalize_uniques(uniques)
+
+
+def normalize_answers(block):
+    """Normalize a 2-D block of raw answers: str, strip, upper; missing values become ''."""
+    codes, lookup = encode_answers(block)
+    return lookup[codes]
+
+
+def normalize_identifiers(values):
+    """Strip identifier cells; missing or blank cells become None."""
+    series = pd.Series(values, dtype=object)
+    cleaned = series.astype(str).str.strip()
+    cleaned = cleaned.where(series.notna() & (cleaned != ""), None)
+    return cleaned.tolist()
+
+
+class CompiledAnswerKey:
+    """An answer key resolved against one upload's header.
+
+    Column lookup, answer normalization and matcher setup happen once here, so
+    grading is a vectorized pass over fixed columns. Build it with
+    compile_answer_key() to reuse it across reruns.
+    """
+
+    def __init__(self, answer_key, columns):
+        columns = list(columns)
+        self.columns = columns
+        self.q_nums = [q['question_num'] for q in answer_key]
+        self.correct_answers = [str(q['correct_answer']).upper() for q in answer_key]
+        self.question_types = [q['question_type'] for q in answer_key]
+        self.matcher_configs = [q.get('matcher_config') for q in answer_key]
+        self.points = np.array([q['points'] for q in answer_key], dtype=float)
+        self.max_points = float(self.points.sum())
+        self.fingerprint = key_fingerprint(answer_key)
+
+        self.positions = [find_question_column(columns, q_num) for q_num in self.q_nums]
+        # Questions with no column at all are graded as blank answers; positional
+        # matches are worth surfacing because they depend on column order
+        self.unmapped = [q for q, pos in zip(self.q_nums, self.positions) if pos is None]
+        self.positional = [
+            q for q, pos in zip(self.q_nums, self.positions)
+            if pos is not None and columns[pos] not in [p.format(q) for p in QUESTION_COLUMN_NAMES]
+        ]
+        self.mapped_columns = {q: columns[pos] for q, pos in zip(self.q_nums, self.positions) if pos is not None}
+
+        # One predicate per distinct (type, answer, config); questions that share
+        # one share its results. Rows the matchers reject are never correct.
+        self.specs = [(q['question_type'], str(q['correct_answer']), q.get('matcher_config') or None)
+                      for q in answer_key]
+        self.predicates = {}
+        errors = {}
+        for spec in dict.fromkeys(self.specs):
+            try:
+                self.predicates[spec] = compile_matcher(*spec)
+            except ValueError as e:
+                self.predicates[spec] = None
+                errors[spec] = str(e)
+        self.invalid = {q: errors[spec] for q, spec in zip(self.q_nums, self.specs) if spec in errors}
+
+    def read_columns(self, *identifier_columns):
+        """The columns grading needs: the given identifier columns plus every mapped question column."""
+        wanted = [col for col in identifier_columns if col is not None]
+        wanted += self.mapped_columns.values()
+        return list(dict.fromkeys(wanted))
+
+    def raw_answers(self, responses_df, rows=None):
+        """Raw students x questions answer block (object array) for the given row positions (default all)."""
+        rows = np.arange(len(responses_df)) if rows is None else rows
+        positions = self.positions
+        if list(responses_df.columns) != self.columns:
+            # A frame holding only some of the header's columns (e.g. a streamed
+            # workbook); find the mapped columns by name instead
+            positions = [None if pos is None else responses_df.columns.get_loc(self.columns[pos])
+                         for pos in self.positions]
+        found = [j for j, pos in enumerate(positions) if pos is not None]
+        if len(found) == len(positions):
+            return responses_df.iloc[rows, positions].to_numpy(dtype=object)
+        raw = np.full((len(rows), len(self.q_nums)), None, dtype=object)
+        if found:
+            raw[:, found] = responses_df.iloc[rows, [positions[j] for j in found]].to_numpy(dtype=object)
+        return raw
+
+    def encode(self, responses_df, rows=None):
+        """Encoded answers (codes, lookup) for the given row positions (default all); see encode_answers()."""
+        return encode_answers(self.raw_answers(responses_df, rows))
+
+    def extract(self, responses_df, rows=None):
+        """Normalized students x questions answer matrix for the given row positions (default all)."""
+        codes, lookup = self.encode(responses_df, rows)
+        return lookup[codes]
+
+    def score_codes(self, codes, lookup):
+        """Boolean students x questions matrix of correct answers for encoded answers.
+
+        Each predicate is evaluated once over the unique answers; students'
+        results are then gathered by code. Blank answers are never correct.
+        """
+        view = AnswerLookup(lookup)
+        hits = {}
+        correct = np.zeros(codes.shape, dtype=bool)
+        for j, spec in enumerate(self.specs):
+            predicate = self.predicates[spec]
+            if predicate is None:
+                continue
+            if spec not in hits:
+                hits[spec] = np.asarray(predicate(view), dtype=bool) & ~view.blank
+            correct[:, j] = hits[spec][codes[:, j]]
+        return correct
+
+    def score(self, answers):
+        """Boolean students x questions matrix of correct answers for a normalized answer matrix."""
+        return self.score_codes(*encode_answers(answers))
+
+
+_KEY_FIELDS = ('question_num', 'correct_answer', 'points', 'question_type', 'matcher_config')
+
+
+def _key_items(answer_key):
+    return tuple(tuple(q.get(field) for field in _KEY_FIELDS) for q in answer_key)
+
+
+def key_fingerprint(answer_key):
+    """SHA-256 of the answer key fields that affect grading; equal keys grade identically."""
+    return hashlib.sha256(repr(_key_items(answer_key)).encode()).hexdigest()
+
+
+@functools.lru_cache(maxsize=32)
+def _compile_cached(key_items, columns):
+    answer_key = [dict(zip(_KEY_FIELDS, item)) for item in key_items]
+    return CompiledAnswerKey(answer_key, columns)
+
+
+def compile_answer_key(answer_key, columns):
+    """Compile answer_key against an upload's columns, reusing the result for the same key and header."""
+    try:
+        return _compile_cached(_key_items(answer_key), tuple(columns))
+    except TypeError:
+        # Unhashable header labels; compile without caching
+        return CompiledAnswerKey(answer_key, columns)
+
+
+def _grade_block(compiled, block):
+    """Normalize and score one factorized (codes, uniques) block (process-pool worker): (codes, lookup, correct)."""
+    codes, uniques = block
+    lookup = normalize_uniques(uniques)
+    return codes, lookup, compiled.score_codes(codes, lookup)
+
+
+def _iter_pooled(compiled, chunks, workers):
+    """Yield (chunk, graded block) in order, grading the blocks in a process pool (see iter_pooled())."""
+    submitted = deque()
+
+    def blocks():
+        for chunk in chunks:
+            submitted.append(chunk)
+            yield chunk.codes, chunk.uniques
+
+    for graded in iter_pooled(functools.partial(_grade_block, compiled), blocks(), workers):
+        yield submitted.popleft(), graded
+
+
+class _Chunk:
+    """One chunk of responses reduced to what grading needs: identifiers and factorized answers.
+
+    The answers are small integer codes plus the chunk's few distinct raw
+    answers, so sending a chunk to a pool worker costs little.
+    """
+
+    def __init__(self, responses_df, name_col, id_col, compiled):
+        row_count = len(responses_df)
+        names = normalize_identifiers(responses_df[name_col]) if name_col in responses_df.columns else None
+        ids = normalize_identifiers(responses_df[id_col]) if id_col in responses_df.columns else None
+        names = names or [None] * row_count
+        ids = ids or [None] * row_count
+        keep = [i for i in range(row_count) if names[i] or ids[i]]
+        self.rows = row_count
+        self.names = [names[i] for i in keep]
+        self.ids = [ids[i] for i in keep]
+        # Chunks read from a file keep the file's running row numbers in their index
+        index = responses_df.index
+        self.source_rows = index[keep] if pd.api.types.is_integer_dtype(index) else keep
+        self.codes, self.uniques = factorize_answers(compiled.raw_answers(responses_df, keep))
+
+
+def grade_chunks(chunks, name_col, id_col, answer_key, assignment, workers=None):
+    """Grade response chunks in order, yielding (rows read, GradingResult) for each.
+
+    answer_key is a list of answer key rows or a CompiledAnswerKey. Chunks
+    are read ahead until PARALLEL_MIN_ROWS rows: a stream that ends sooner is
+    graded in-process, a longer one has every chunk normalized and scored in
+    a process pool (workers caps it; default one per CPU, 1 grades
+    in-process) while this process only reads chunks, pulls out their
+    identifiers and factorizes their answer columns into compact codes.
+    Results are identical either way.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return
+    compiled = answer_key
+    if not isinstance(compiled, CompiledAnswerKey):
+        compiled = compile_answer_key(answer_key, first.columns)
+    prepared = (_Chunk(chunk, name_col, id_col, compiled) for chunk in itertools.chain([first], chunks))
+
+    buffered = []
+    buffered_rows = 0
+    if workers > 1:
+        for chunk in prepared:
+            buffered.append(chunk)
+            buffered_rows += chunk.rows
+            if buffered_rows >= PARALLEL_MIN_ROWS:
+                break
+    if buffered_rows < PARALLEL_MIN_ROWS:
+        graded = ((chunk, _grade_block(compiled, (chunk.codes, chunk.uniques)))
+                  for chunk in itertools.chain(buffered, prepared))
+    else:
+        graded = _iter_pooled(compiled, itertools.chain(buffered, prepared), workers)
+    for chunk, (codes, lookup, correct) in graded:
+        yield chunk.rows, GradingResult(compiled, assignment['max_points'], chunk.names, chunk.ids,
+                                        correct, codes, lookup, chunk.source_rows)
+
+
+class QuestionDetails(Sequence):
+    """One student's per-question breakdown, built from a GradingResult on first access.
+
+    Behaves like the list of detail dicts the pages used to get, without
+    building them for students nobody looks at.
+    """
+
+    def __init__(self, result, row):
+        self._result = result
+        self._row = row
+        self._rows = None
+
+    def __getitem__(self, index):
+        if self._rows is None:
+            self._rows = self._result.details(self._row)
+        return self._rows[index]
+
+    def __len__(self):
+        return len(self._result.q_nums)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class GradingResult(Sequence):
+    """Columnar auto-grading results for one upload.
+
+    Holds an int8 students x questions correctness matrix, the answers as
+    compact codes into one shared array of unique answers, float32 per-student
+    points earned and the identifiers. Summaries are computed from the columns;
+    per-question dicts are only built for the student whose detail is asked for.
+
+    Indexing or iterating yields the per-student dicts grade_responses() has
+    always returned, with a lazy 'details' sequence.
+    """
+
+    def __init__(self, compiled, assignment_max_points, student_names, student_ids,
+                 correct, answer_codes, answer_values, source_rows=None):
+        self.q_nums = list(compiled.q_nums)
+        self.correct_answers = list(compiled.correct_answers)
+        self.points = compiled.points.astype(np.float32)
+        self.max_raw = compiled.max_points
+        self.assignment_max_points = assignment_max_points
+        self.student_names = list(student_names)
+        self.student_ids = list(student_ids)
+        # 0-based data row in the uploaded file, for pointing users at a line
+        self.source_rows = np.arange(len(self.student_names)) if source_rows is None else np.asarray(source_rows)
+        self.correct = np.asarray(correct, dtype=bool).view(np.int8)
+        self.answer_codes = answer_codes
+        self.answer_values = answer_values
+        self.raw_scores = (self.correct @ compiled.points).astype(np.float32)
+        self.correct_counts = self.correct.sum(axis=1, dtype=np.int32)
+
+    @classmethod
+    def concat(cls, parts):
+        """Join results graded chunk by chunk (same key and header) into one result, in order."""
+        first = parts[0]
+        # Each chunk has its own unique-answer array; re-code against a merged one
+        codes, values = pd.factorize(np.concatenate([p.answer_values for p in parts]))
+        remapped = []
+        offset = 0
+        for part in parts:
+            mapping = codes[offset:offset + len(part.answer_values)]
+            offset += len(part.answer_values)
+            remapped.append(mapping[part.answer_codes].astype(_code_dtype(len(values))))
+        merged = cls.__new__(cls)
+        merged.__dict__.update(first.__dict__)
+        merged.student_names = [name for p in parts for name in p.student_names]
+        merged.student_ids = [sid for p in parts for sid in p.student_ids]
+        merged.source_rows = np.concatenate([p.source_rows for p in parts])
+        merged.correct = np.concatenate([p.correct for p in parts])
+        merged.answer_codes = np.concatenate(remapped)
+        merged.answer_values = values
+        merged.raw_scores = np.concatenate([p.raw_scores for p in parts])
+        merged.correct_counts = np.concatenate([p.correct_counts for p in parts])
+        return merged
+
+    def __len__(self):
+        return len(self.student_names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.student(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.student(index)
+
+    @property
+    def display_names(self):
+        """Student name, or 'ID: ...' when the row only had an ID."""
+        return [name if name else f"ID: {sid}" for name, sid in zip(self.student_names, self.student_ids)]
+
+    def _scale(self, raw_scores, total, places):
+        """Raw scores (an array or one float) scaled to total, rounded to places."""
+        if self.max_raw <= 0:
+            return raw_scores * 0.0
+        return np.round(raw_scores / self.max_raw * total, places)
+
+    @property
+    def scaled_scores(self):
+        """Scores scaled to the assignment's max points, rounded to 2 places."""
+        return self._scale(self.raw_scores.astype(float), self.assignment_max_points, 2)
+
+    @property
+    def percentages(self):
+        """Percent of the key's points earned, rounded to 1 place."""
+        return self._scale(self.raw_scores.astype(float), 100, 1)
+
+    def student(self, row):
+        """The per-student dict for one row."""
+        name = self.student_names[row]
+        student_id = self.student_ids[row]
+        # Scale just this row; the scaled_scores/percentages arrays cost O(n) each
+        raw_score = float(self.raw_scores[row])
+        return {
+            'student_name': name,
+            'student_id': student_id,
+            'display_name': name if name else f"ID: {student_id}",
+            'raw_score': raw_score,
+            'max_raw': self.max_raw,
+            'scaled_score': float(self._scale(raw_score, self.assignment_max_points, 2)),
+            'percentage': float(self._scale(raw_score, 100, 1)),
+            'correct_count': int(self.correct_counts[row]),
+            'details': QuestionDetails(self, row),
+        }
+
+    def details(self, row):
+        """Per-question breakdown for one student, as a list of dicts."""
+        points = self.points.tolist()
+        correct = self.correct[row].astype(bool).tolist()
+        return [
+            {
+                'question': q_num,
+                'student_answer': answer,
+                'correct_answer': key,
+                'is_correct': is_correct,
+                'points_earned': possible if is_correct else 0.0,
+                'points_possible': possible,
+            }
+            for q_num, answer, key, is_correct, possible in zip(
+                self.q_nums, self.answer_values[self.answer_codes[row]].tolist(),
+                self.correct_answers, correct, points)
+        ]
+
+    def answer_map(self, row):
+        """One student's normalized answers as {question_num: answer}, leaving out blanks."""
+        answers = self.answer_values[self.answer_codes[row]].tolist()
+        return {q_num: answer for q_num, answer in zip(self.q_nums, answers) if answer}
+
+    def details_frame(self, row):
+        """Per-question breakdown for one student, as a DataFrame."""
+        return pd.DataFrame(self.details(row))
+
+    def summary_frame(self):
+        """One row per student: display name, scaled score, percentage and questions correct."""
+        questions = len(self.q_nums)
+        return pd.DataFrame({
+            "Student": self.display_names,
+            "Score": self.scaled_scores,
+            "Percentage": [f"{p}%" for p in self.percentages.tolist()],
+            "Correct": [f"{c}/{questions}" for c in self.correct_counts.tolist()],
+        })
+
+    def summary_stats(self, passing_percentage=60):
+        """Average, highest and lowest scaled score and the number passing."""
+        scores = self.scaled_scores
+        if not len(scores):
+            return {'count': 0, 'average': 0.0, 'highest': 0.0, 'lowest': 0.0, 'passing': 0}
+        return {
+            'count': len(scores),
+            'average': float(scores.mean()),
+            'highest': float(scores.max()),
+            'lowest': float(scores.min()),
+            'passing': int((self.percentages >= passing_percentage).sum()),
+        }
+
+
+def grade_responses(responses_df, name_col, id_col, answer_key, assignment, workers=None):
+    """Grade student responses against the answer key.
+
+    answer_key is a list of answer key rows or a CompiledAnswerKey for this
+    upload. Files with at least PARALLEL_MIN_ROWS rows are graded in
+    PARALLEL_CHUNK_ROWS chunks in a process pool; workers caps it (default:
+    one per CPU; 1 grades in-process). Returns a GradingResult with one
+    entry per identified student; rows without a name or ID are skipped.
+    """
+    if not isinstance(answer_key, CompiledAnswerKey):
+        answer_key = compile_answer_key(answer_key, responses_df.columns)
+    if not pd.api.types.is_integer_dtype(responses_df.index):
+        # Row numbers are positions, which chunking must not restart
+        responses_df = responses_df.reset_index(drop=True)
+    rows = len(responses_df)
+    chunks = [responses_df.iloc[start:start + PARALLEL_CHUNK_ROWS] for start in range(0, rows, PARALLEL_CHUNK_ROWS)]
+    parts = [result for _, result in grade_chunks(chunks or [responses_df], name_col, id_col, answer_key,
+                                                  assignment, workers)]
+    return parts[0] if len(parts) == 1 else GradingResult.concat(parts)
@@ -0,0 +1,399 @@
+"""
+Auto-grade workflows.
+Ties the grading engine, roster matching and the database together so the
+pages and scripts share one implementation.
+"""
+import functools
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from modules import database as db
+from modules.docx_ingest import extract_submissions
+from modules.grading import GradingResult, compile_answer_key, grade_chunks
+from modules.ingest import detect_identifier_columns, iter_response_chunks, read_preview
+from modules.parallel import iter_pooled
+from modules.roster import RosterIndex
+from modules.upload_cache import file_digest, result_cache
+
+UNMATCHED_REASON = "no matching student in this class"
+AMBIGUOUS_REASON = "ambiguous name: several students in this class match"
+
+# Rejected rows an instructor can still pair with a student by hand
+REVIEW_REASONS = (UNMATCHED_REASON, AMBIGUOUS_REASON)
+
+# Response files picked up when grading a folder
+RESPONSE_FILE_SUFFIXES = ('.csv', '.xlsx', '.xlsm', '.xls')
+
+
+@functools.lru_cache(maxsize=8)
+def _roster_index(students):
+    return RosterIndex([{'id': id_, 'name': name, 'student_id': student_id} for id_, name, student_id in students])
+
+
+def get_class_roster(class_id):
+    """The RosterIndex for a class, rebuilt only when its students change."""
+    students = db.get_students_by_class(class_id)
+    return _roster_index(tuple((s['id'], s['name'], s['student_id']) for s in students))
+
+
+def save_results(result, roster, assignment_id, key_version=None):
+    """Match a GradingResult against the roster and upsert every matched score in one transaction.
+
+    key_version is the answer key version the result was graded with
+    (default: the current one). Returns a report like the database bulk
+    writes: 'inserted' and 'updated' result rows and 'rejected' rows with
+    reasons. If anything fails, nothing is saved.
+    """
+    matches = []
+    unmatched = []
+    for row, (name, student_id) in enumerate(zip(result.student_names, result.student_ids)):
+        matched = roster.match(name, student_id)
+        if matched is None:
+            reason = AMBIGUOUS_REASON if roster.ambiguous(name) else UNMATCHED_REASON
+            unmatched.append({"row": row, "reason": reason})
+        else:
+            matches.append((row, matched))
+    report = save_matches(result, matches, assignment_id, key_version)
+    report["rejected"] = sorted(report["rejected"] + unmatched, key=lambda r: r["row"])
+    return report
+
+
+def save_matches(result, matches, assignment_id, key_version=None):
+    """Upsert the scores of result rows already paired with students, in one transaction.
+
+    matches is a list of (result row, student database id). If a student is
+    paired with several rows, the last one wins and the others are rejected.
+    The stored answers record key_version (default: the current key version).
+    Returns the same report as save_results().
+    """
+    report = {"inserted": [], "updated": [], "rejected": []}
+    scores = result.scaled_scores.tolist()
+    grades = []
+    grade_rows = []
+    matched_rows = {}
+    for row, matched in matches:
+        if matched in matched_rows:
+            # The same student answered twice; the later row wins, as in bulk_set_grades
+            earlier = matched_rows[matched]
+            report["rejected"].append({"row": grade_rows[earlier], "reason": "student appears again later in the file"})
+            grades[earlier] = None
+        matched_rows[matched] = len(grades)
+        grades.append({'student_id': matched, 'assignment_id': assignment_id, 'points': scores[row]})
+        grade_rows.append(row)
+
+    kept = [(grade, row) for grade, row in zip(grades, grade_rows) if grade is not None]
+    if kept:
+        with db.get_write_connection("grades", "responses"):
+            saved = db.bulk_set_grades([grade for grade, _ in kept])
+            for status in ("inserted", "updated"):
+                report[status] = [kept[i][1] for i in saved[status]]
+            report["rejected"].extend({"row": kept[r["row"]][1], "reason": r["reason"]} for r in saved["rejected"])
+            # Keep the answers so a later key fix can re-grade without the file
+            db.bulk_save_responses(assignment_id, [
+                (kept[i][0]['student_id'], result.answer_map(kept[i][1]), round(float(result.raw_scores[kept[i][1]]), 6))
+                for i in saved["inserted"] + saved["updated"]
+            ], key_version)
+    report["rejected"].sort(key=lambda r: r["row"])
+    return report
+
+
+def unmatched_rows(report):
+    """Result rows a save report rejected because no single student matched them."""
+    return [r["row"] for r in report["rejected"] if r["reason"] in REVIEW_REASONS]
+
+
+def suggest_matches(result, roster, rows):
+    """Ranked roster candidates for the given result rows, as {row: [candidate, ...]}."""
+    return dict(zip(rows, roster.suggest([result.student_names[row] for row in rows])))
+
+
+def _key_entry(question):
+    """The parts of an answer key row that affect scoring."""
+    if question is None:
+        return None
+    answer = str(question['correct_answer'])
+    # Case only matters to regular expressions (\d vs \D)
+    if question['question_type'] != 'regex':
+        answer = answer.upper()
+    return (answer, float(question['points']), question['question_type'], question.get('matcher_config') or None)
+
+
+def _earned(responses, questions):
+    """Points each stored response earns on the given answer key rows."""
+    if not questions:
+        return np.zeros(len(responses))
+    columns = [f"q{q['question_num']}" for q in questions]
+    answers = pd.DataFrame([[r['answers'].get(q['question_num']) for q in questions] for r in responses],
+                           columns=columns)
+    compiled = compile_answer_key(questions, columns)
+    return compiled.score(compiled.extract(answers)) @ compiled.points
+
+
+def _scaled(raw_score, max_raw, max_points):
+    """A raw score scaled to the assignment's max points, as save_results() stores it."""
+    return round(raw_score / max_raw * max_points, 2) if max_raw > 0 else 0
+
+
+def regrade_responses(assignment, old_key, new_key, changed, key_version=None, graded_version=None):
+    """Re-grade stored responses for an answer key edit and apply the score changes.
+
+    old_key and new_key map question number to answer key row. Responses
+    last graded against graded_version (the version old_key was saved as)
+    have their stored raw score adjusted by the difference in points on the
+    changed questions only, and their grade moves by the change in scaled
+    score, so manual adjustments to the grade are kept; students whose score
+    doesn't change are left alone. Any other response was graded against an
+    older key whose scaled score can't be recovered, so it is scored again
+    from scratch on new_key and its grade replaced. Responses considered are
+    marked with key_version if given. Returns the number of students updated.
+    """
+    responses = db.get_responses(assignment['id'])
+    stale = [r for r in responses if graded_version is not None and r['key_version'] != graded_version]
+    current = [r for r in responses if changed and (graded_version is None or r['key_version'] == graded_version)]
+    old_max = sum(float(q['points']) for q in old_key.values())
+    new_max = sum(float(q['points']) for q in new_key.values())
+    max_points = assignment['max_points']
+
+    adjusted = []
+    if current:
+        old_earned = _earned(current, [old_key[q] for q in changed if q in old_key])
+        new_earned = _earned(current, [new_key[q] for q in changed if q in new_key])
+        for response, before, after in zip(current, old_earned.tolist(), new_earned.tolist()):
+            raw_score = round(response['raw_score'] - before + after, 6)
+            change = round(_scaled(raw_score, new_max, max_points)
+                           - _scaled(response['raw_score'], old_max, max_points), 2)
+            if change or raw_score != response['raw_score']:
+                adjusted.append((response['student_id'], raw_score, change))
+    rescored = []
+    if stale:
+        for response, raw_score in zip(stale, _earned(stale, list(new_key.values())).tolist()):
+            raw_score = round(raw_score, 6)
+            rescored.append((response['student_id'], raw_score, _scaled(raw_score, new_max, max_points)))
+    db.apply_regrade(assignment['id'], adjusted, rescored, key_version, unchanged_from=graded_version)
+    return len(adjusted) + len(rescored)
+
+
+def update_answer_key(assignment_id, questions):
+    """Save a new answer key and re-grade stored responses for the questions that changed.
+
+    Everything happens in one transaction. Only the questions in the saved
+    key version's diff are compared, and of those only the ones whose scoring
+    changed are re-graded; responses graded against an older key version are
+    scored again in full. Returns the set_answer_key report (with the new
+    'version' and its 'diff') and a dict with the re-graded question numbers
+    and the students re-graded.
+    """
+    assignment = db.get_assignment_by_id(assignment_id)
+    with db.get_write_connection("answer_keys", "responses", "grades"):
+        old_version = db.get_answer_key_version(assignment_id)
+        old_key = {q['question_num']: q for q in db.get_answer_key(assignment_id)}
+        report = db.set_answer_key(assignment_id, questions)
+        new_key = {q['question_num']: q for q in db.get_answer_key(assignment_id)}
+        touched = [q for nums in report['diff'].values() for q in nums]
+        changed = sorted(q for q in touched if _key_entry(old_key.get(q)) != _key_entry(new_key.get(q)))
+        regraded = 0
+        if touched:
+            regraded = regrade_responses(assignment, old_key, new_key, changed, report['version'], old_version or 0)
+    return report, {'changed': changed, 'regraded': regraded}
+
+
+def grade_stream(chunks, name_col, id_col, compiled_key, assignment, roster=None, on_chunk=None, key_version=None,
+                 workers=None):
+    """Grade response chunks one at a time, then save the scores.
+
+    Long streams are graded in a process pool (see grade_chunks(); workers
+    caps it). If roster is given, every score is saved once all chunks are
+    graded, in one short transaction, so reading and grading never hold up
+    other writers and an error part-way through saves nothing. Saved answers
+    record key_version, the answer key version compiled_key was built from
+    (default: the current one).
+    on_chunk(rows_done) is called after every chunk. Returns a dict with the
+    combined GradingResult (None if there were no chunks), rows read and the
+    save report (None when not saving), whose rows index the combined result.
+    """
+    outcome = {'results': None, 'rows': 0, 'report': None}
+    parts = []
+    for rows, result in grade_chunks(chunks, name_col, id_col, compiled_key, assignment, workers):
+        parts.append(result)
+        outcome['rows'] += rows
+        if on_chunk:
+            on_chunk(outcome['rows'])
+    if parts:
+        outcome['results'] = parts[0] if len(parts) == 1 else GradingResult.concat(parts)
+    if roster is not None:
+        outcome['report'] = {"inserted": [], "updated": [], "rejected": []}
+        if outcome['results'] is not None:
+            outcome['report'] = save_results(outcome['results'], roster, assignment['id'], key_version)
+    return outcome
+
+
+def grade_upload(file, filename, name_col, id_col, compiled_key, assignment, sheet=None, roster=None,
+                 on_chunk=None, digest=None, key_version=None):
+    """grade_stream() over an upload, reusing the result of an earlier run on the same content.
+
+    Results are cached by the file's SHA-256 (pass digest if already known),
+    sheet, identifier columns, answer key fingerprint and assignment points,
+    so grading an unchanged file again only saves the cached scores (when
+    roster is given). The returned dict has 'cached' set on a hit.
+    """
+    key = ('graded', digest or file_digest(file), sheet, name_col, id_col,
+           compiled_key.fingerprint, assignment.get('max_points'))
+    hit = result_cache.get(key)
+    if hit is not None:
+        rows, results = hit
+        report = save_results(results, roster, assignment['id'], key_version) if roster is not None else None
+        if on_chunk:
+            on_chunk(rows)
+        return {'results': results, 'rows': rows, 'report': report, 'cached': True}
+
+    chunks = iter_response_chunks(file, filename, sheet=sheet, usecols=compiled_key.read_columns(name_col, id_col))
+    outcome = grade_stream(chunks, name_col, id_col, compiled_key, assignment, roster=roster, on_chunk=on_chunk,
+                           key_version=key_version)
+    if outcome['results'] is not None:
+        result_cache.put(key, (outcome['rows'], outcome['results']))
+    outcome['cached'] = False
+    return outcome
+
+
+def grade_file(path, answer_key, assignment, name_col=None, id_col=None, sheet=None, workers=1):
+    """Grade one response file from disk chunk by chunk, without saving.
+
+    The student name and ID columns are detected from the header unless
+    given; only those and the answer key's question columns are read. sheet
+    picks a workbook sheet (default: the first). workers caps the process
+    pool for a large file (default: grade in-process). Returns a dict with
+    the file name, rows read and the GradingResult (None if no row had a
+    student identifier).
+    """
+    path = Path(path)
+    with open(path, 'rb') as file:
+        columns = read_preview(file, path.name, rows=1, sheet=sheet).columns
+        detected_name, detected_id = detect_identifier_columns(columns)
+        name_col = name_col or detected_name
+        id_col = id_col or detected_id
+        if name_col is None and id_col is None:
+            raise ValueError("no student name or ID column found")
+        compiled_key = compile_answer_key(answer_key, columns)
+        chunks = iter_response_chunks(file, path.name, sheet=sheet, usecols=compiled_key.read_columns(name_col, id_col))
+        outcome = grade_stream(chunks, name_col, id_col, compiled_key, assignment, workers=workers)
+    return {'file': path.name, 'rows': outcome['rows'], 'results': outcome['results']}
+
+
+def _grade_file_task(args):
+    """grade_file() for a process pool worker: failures come back as an 'error'."""
+    path, answer_key, assignment, name_col, id_col, sheet, workers = args
+    try:
+        return grade_file(path, answer_key, assignment, name_col, id_col, sheet, workers)
+    except Exception as e:
+        return {'file': Path(path).name, 'rows': 0, 'results': None, 'error': str(e)}
+
+
+def find_response_files(directory):
+    """CSV and Excel files directly inside a folder, sorted by name."""
+    return sorted(p for p in Path(directory).iterdir()
+                  if p.is_file() and p.suffix.lower() in RESPONSE_FILE_SUFFIXES and not p.name.startswith('~$'))
+
+
+def _file_summary(graded, report, roster):
+    """JSON-ready summary of one graded (and possibly saved) file."""
+    summary = {'file': graded['file'], 'rows': graded['rows'], 'graded': 0, 'average_percentage': None,
+               'inserted': 0, 'updated': 0, 'rejected': [], 'error': graded.get('error')}
+    result = graded['results']
+    if result is None:
+        return summary
+    summary['graded'] = len(result)
+    summary['average_percentage'] = round(float(result.percentages.mean()), 1)
+    if report is None:
+        return summary
+    summary['inserted'] = len(report['inserted'])
+    summary['updated'] = len(report['updated'])
+    display_names = result.display_names
+    suggestions = suggest_matches(result, roster, unmatched_rows(report))
+    for r in report['rejected']:
+        entry = {'line': int(result.source_rows[r['row']]) + 2, 'student': display_names[r['row']], 'reason': r['reason']}
+        if suggestions.get(r['row']):
+            entry['suggestion'] = suggestions[r['row']][0]
+        summary['rejected'].append(entry)
+    return summary
+
+
+def _assignment_key(assignment_id):
+    """(assignment, answer key, key version) for batch grading; raises ValueError if either is missing."""
+    assignment = db.get_assignment_by_id(assignment_id)
+    if assignment is None:
+        raise ValueError(f"assignment {assignment_id} does not exist")
+    answer_key = db.get_answer_key(assignment_id)
+    if not answer_key:
+        raise ValueError(f"assignment {assignment_id} has no answer key")
+    return assignment, answer_key, db.get_answer_key_version(assignment_id)
+
+
+def _batch_summary(assignment, key_version, saved, files):
+    """JSON-ready summary of a batch of graded files, with totals."""
+    totals = {'files': len(files), 'failed': sum(1 for f in files if f['error'])}
+    for field in ('rows', 'graded', 'inserted', 'updated'):
+        totals[field] = sum(f[field] for f in files)
+    totals['rejected'] = sum(len(f['rejected']) for f in files)
+    return {'assignment_id': assignment['id'], 'assignment': assignment['name'], 'key_version': key_version,
+            'saved': saved, 'totals': totals, 'files': files}
+
+
+def grade_files(paths, assignment_id, workers=None, name_col=None, id_col=None, sheet=None, save=True):
+    """Grade many response files against an assignment's answer key and save the scores.
+
+    Files are graded in parallel (workers defaults to one per CPU) and saved
+    one file per transaction, in the order given, so a student found in
+    several files keeps the score from the last. Returns a JSON-ready summary
+    with the answer key version used, per-file reports and totals. A file
+    that cannot be read is reported with an 'error' and does not stop the
+    others.
+    """
+    assignment, answer_key, key_version = _assignment_key(assignment_id)
+    roster = get_class_roster(assignment['class_id']) if save else None
+    workers = workers or os.cpu_count() or 1
+
+    # Several files are graded side by side; a lone file gets the workers for its own chunks
+    file_workers = workers if len(paths) == 1 else 1
+    tasks = [(str(path), answer_key, assignment, name_col, id_col, sheet, file_workers) for path in paths]
+    files = []
+    # Results come back in file order as each file finishes
+    for graded in iter_pooled(_grade_file_task, tasks, min(workers, len(tasks))):
+        report = None
+        if save and graded['results'] is not None:
+            try:
+                report = save_results(graded['results'], roster, assignment_id, key_version)
+            except Exception as e:
+                graded['error'] = f"nothing saved: {e}"
+        files.append(_file_summary(graded, report, roster))
+
+    return _batch_summary(assignment, key_version, save, files)
+
+
+def grade_submissions(source, assignment_id, workers=None, save=True):
+    """Grade a folder or .zip of .docx submissions against an assignment's answer key.
+
+    The documents are read in parallel into one response table (one row per
+    file, named after the file), which is graded and saved in one
+    transaction. Returns the same summary as grade_files(), with the batch as
+    one file entry and each unreadable document as a failed entry.
+    """
+    assignment, answer_key, key_version = _assignment_key(assignment_id)
+    roster = get_class_roster(assignment['class_id']) if save else None
+
+    responses, errors = extract_submissions(source, workers, questions=[q['question_num'] for q in answer_key])
+    if responses.empty and not errors:
+        raise ValueError(f"no .docx submissions found in {Path(source).name}")
+    files = []
+    if not responses.empty:
+        compiled_key = compile_answer_key(answer_key, responses.columns)
+        outcome = grade_stream([responses], 'student_name', None, compiled_key, assignment,
+                               roster=roster, key_version=key_version)
+        outcome['file'] = Path(source).name
+        files.append(_file_summary(outcome, outcome['report'], roster))
+    files += [_file_summary({'file': e['file'], 'rows': 0, 'results': None, 'error': e['error']}, None, roster)
+              for e in errors]
+
+    return _batch_summary(assignment, key_version, save, files)
@@ -0,0 +1,189 @@
+"""
+Response file ingestion.
+Reads uploaded response sheets in bounded-size chunks so a large file never
+has to sit in memory whole.
+"""
+import itertools
+
+import pandas as pd
+
+# Rows per chunk when streaming uploads; peak memory scales with this, not the file
+RESPONSE_CHUNK_ROWS = 20000
+
+PREVIEW_ROWS = 5
+
+# Workbooks openpyxl can stream; older .xls files go through pandas
+STREAMED_EXCEL_SUFFIXES = ('.xlsx', '.xlsm')
+
+
+def is_csv(filename):
+    """True if the upload should be read as CSV."""
+    return filename.lower().endswith('.csv')
+
+
+def is_streamed_excel(filename):
+    """True if the upload is a workbook that can be read row by row."""
+    return filename.lower().endswith(STREAMED_EXCEL_SUFFIXES)
+
+
+def _rewind(file):
+    if hasattr(file, 'seek'):
+        file.seek(0)
+
+
+def _open_workbook(file):
+    """Open a workbook in openpyxl's read-only mode, which parses rows as they are iterated."""
+    from openpyxl import load_workbook
+    _rewind(file)
+    return load_workbook(file, read_only=True, data_only=True)
+
+
+def _worksheet(workbook, sheet):
+    worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+    # Exporters often write a wrong sheet size; read until the rows run out instead
+    worksheet.reset_dimensions()
+    return worksheet
+
+
+def _header_names(cells):
+    """Column names for a header row, named and de-duplicated the way pandas does."""
+    names = []
+    seen = {}
+    for i, cell in enumerate(cells):
+        name = f"Unnamed: {i}" if cell is None or str(cell).strip() == "" else str(cell).strip()
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    while names and names[-1].startswith("Unnamed: "):
+        names.pop()
+    return names
+
+
+def list_sheets(file, filename):
+    """Sheet names of a workbook upload, in workbook order (empty for CSV)."""
+    if is_csv(filename):
+        return []
+    if not is_streamed_excel(filename):
+        _rewind(file)
+        return list(pd.ExcelFile(file).sheet_names)
+    workbook = _open_workbook(file)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def read_preview(file, filename, rows=PREVIEW_ROWS, sheet=None):
+    """Read the first rows of an upload, for the preview table and column detection."""
+    _rewind(file)
+    if is_csv(filename):
+        # Cells are read as text so chunks can't disagree on a column's type
+        return pd.read_csv(file, nrows=rows, dtype=str)
+    if not is_streamed_excel(filename):
+        return pd.read_excel(file, nrows=rows, sheet_name=sheet or 0)
+    return next(iter_response_chunks(file, filename, chunk_rows=max(rows, 1), sheet=sheet, max_rows=rows))
+
+
+def count_data_rows(file, filename="upload.csv", sheet=None):
+    """Count an upload's data rows cheaply, or None if that isn't possible.
+
+    CSV files are scanned in 1 MB blocks (quoted newlines count too);
+    workbooks report the sheet size they were saved with.
+    """
+    if is_streamed_excel(filename):
+        workbook = _open_workbook(file)
+        try:
+            worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+            return max(worksheet.max_row - 1, 0) if worksheet.max_row else None
+        finally:
+            workbook.close()
+    if not is_csv(filename):
+        return None
+    _rewind(file)
+    lines = 0
+    last = b""
+    for block in iter(lambda: file.read(1 << 20), b""):
+        lines += block.count(b"\n")
+        last = block
+    if last and not last.endswith(b"\n"):
+        lines += 1
+    _rewind(file)
+    return max(lines - 1, 0)
+
+
+def _iter_workbook_chunks(file, chunk_rows, sheet, usecols, max_rows):
+    """Stream a worksheet as DataFrames, keeping only the usecols columns (default all)."""
+    workbook = _open_workbook(file)
+    try:
+        rows = _worksheet(workbook, sheet).iter_rows(values_only=True)
+        header = _header_names(next(rows, ()))
+        wanted = [i for i, name in enumerate(header) if usecols is None or name in usecols]
+        names = [header[i] for i in wanted]
+        # openpyxl still parses every cell of each row; only the wanted
+        # columns are copied into the chunk
+        width = wanted[-1] + 1 if wanted else 0
+        if max_rows is not None:
+            rows = itertools.islice(rows, max_rows)
+
+        position = 0
+        emitted = False
+        while True:
+            batch = []
+            index = []
+            for row in rows:
+                row = row[:width]
+                values = [row[i] if i < len(row) else None for i in wanted]
+                # Formatted but empty rows are common at the end of exported sheets
+                if any(value is not None for value in values):
+                    batch.append(values)
+                    index.append(position)
+                position += 1
+                if len(batch) == chunk_rows:
+                    break
+            if not batch:
+                if not emitted:
+                    yield pd.DataFrame(columns=names)
+                return
+            emitted = True
+            yield pd.DataFrame(batch, columns=names, index=index)
+    finally:
+        workbook.close()
+
+
+def iter_response_chunks(file, filename, chunk_rows=RESPONSE_CHUNK_ROWS, sheet=None, usecols=None, max_rows=None):
+    """Yield an upload as DataFrames of at most chunk_rows rows, all with the file's header.
+
+    usecols limits the columns read (by header name); sheet picks a workbook
+    sheet by name (default: the first). Each chunk's index continues the
+    file's data row numbers (blank workbook rows are skipped). .xlsx
+    workbooks are streamed row by row, so only one chunk of the wanted
+    columns is ever in memory.
+    """
+    _rewind(file)
+    if is_csv(filename):
+        columns = None if usecols is None else lambda name: name in usecols
+        yield from pd.read_csv(file, chunksize=chunk_rows, dtype=str, usecols=columns, nrows=max_rows)
+    elif is_streamed_excel(filename):
+        yield from _iter_workbook_chunks(file, chunk_rows, sheet, usecols, max_rows)
+    else:
+        # Legacy .xls has no streaming reader; the sheet is read whole
+        yield pd.read_excel(file, sheet_name=sheet or 0, usecols=usecols, nrows=max_rows)
+
+
+def detect_identifier_columns(columns):
+    """Guess the student name and ID columns from a header.
+
+    Returns (name_col, id_col); either may be None.
+    """
+    name_col = None
+    id_col = None
+    for col in columns:
+        col_lower = str(col).lower()
+        if 'student_id' in col_lower or 'studentid' in col_lower or col_lower == 'id':
+            id_col = col
+        elif 'name' in col_lower or 'student' in col_lower:
+            name_col = col
+    return name_col, id_col
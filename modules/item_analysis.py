@@ -0,0 +1,123 @@
+"""
+Classical item analysis.
+Computes per-question statistics for an auto-graded exam straight from a
+GradingResult's correctness matrix and answer codes, in a few vectorized
+passes.
+"""
+import numpy as np
+import pandas as pd
+
+# Most frequent answers listed per question in the distractor table
+DISTRACTOR_LIMIT = 10
+
+
+def answer_counts(result):
+    """Distinct answers, and questions x answers matrices of how many students gave each and how many were marked correct.
+
+    Several codes can normalize to the same answer ('a' and 'A', missing and
+    blank), so codes are folded onto the distinct values first.
+    """
+    codes = result.answer_codes
+    values, inverse = np.unique(result.answer_values.astype(str), return_inverse=True)
+    m = len(result.answer_values)
+    counts = np.zeros((codes.shape[1], len(values)), dtype=np.int64)
+    correct_counts = np.zeros_like(counts)
+    for j in range(codes.shape[1]):
+        # Missing answers use code -1, i.e. the last lookup entry
+        answers = inverse[codes[:, j].astype(np.int64) % m]
+        counts[j] = np.bincount(answers, minlength=len(values))
+        correct_counts[j] = np.bincount(answers, weights=result.correct[:, j], minlength=len(values))
+    return values, counts, correct_counts
+
+
+def item_statistics(result, counts=None):
+    """Per-question difficulty and discrimination.
+
+    Returns a DataFrame with one row per question: the p-value (share answering
+    correctly), the corrected point-biserial (correlation between getting the
+    question right and the points earned on the rest of the exam) and the
+    number answering.
+    """
+    n, k = result.correct.shape
+    if n == 0:
+        empty = np.full(k, np.nan)
+        return _items_frame(result, empty, empty, np.zeros(k, dtype=int))
+
+    points = result.points.astype(np.float64)
+    totals = result.raw_scores.astype(np.float64)
+    p = result.correct.mean(axis=0, dtype=np.float64)
+    item_var = p * (1 - p)
+    total_mean = totals.mean()
+    total_var = totals.var()
+    # cov(item, total) from one matrix-vector product; the rest score is total - points * item
+    cov_total = (result.correct.astype(np.float32).T @ result.raw_scores).astype(np.float64) / n - p * total_mean
+    cov_rest = cov_total - points * item_var
+    rest_var = total_var - 2 * points * cov_total + points ** 2 * item_var
+    with np.errstate(invalid='ignore', divide='ignore'):
+        point_biserial = cov_rest / np.sqrt(item_var * rest_var)
+    point_biserial[(item_var <= 0) | (rest_var <= 1e-9)] = np.nan
+
+    values, counts, _ = answer_counts(result) if counts is None else counts
+    blanks = counts[:, values == ""].sum(axis=1)
+    return _items_frame(result, p, point_biserial, n - blanks)
+
+
+def _items_frame(result, p, point_biserial, answered):
+    return pd.DataFrame({
+        "Question": result.q_nums,
+        "Key": result.correct_answers,
+        "Points": result.points.astype(float),
+        "Difficulty (p)": np.round(p, 3),
+        "Point-Biserial": np.round(point_biserial, 3),
+        "Answered": np.asarray(answered, dtype=int),
+    })
+
+
+def kr20(result):
+    """Kuder-Richardson 20 reliability of the exam's right/wrong scores, or None if undefined."""
+    correct = result.correct
+    n, k = correct.shape
+    if n < 2 or k < 2:
+        return None
+    p = correct.mean(axis=0, dtype=np.float64)
+    score_var = correct.sum(axis=1, dtype=np.int64).var()
+    if score_var <= 0:
+        return None
+    return float(k / (k - 1) * (1 - (p * (1 - p)).sum() / score_var))
+
+
+def distractor_frequencies(result, limit=DISTRACTOR_LIMIT, counts=None):
+    """How often each answer was given, per question.
+
+    Returns a long DataFrame (Question, Answer, Count, Share, Key) holding the
+    `limit` most frequent answers per question; blanks show as '(blank)' and
+    Key flags answers the matcher accepted.
+    """
+    n, k = result.answer_codes.shape
+    columns = ["Question", "Answer", "Count", "Share", "Key"]
+    if n == 0 or k == 0:
+        return pd.DataFrame(columns=columns)
+
+    values, counts, correct_counts = answer_counts(result) if counts is None else counts
+    order = np.argsort(-counts, axis=1, kind='stable')[:, :limit]
+    top = np.take_along_axis(counts, order, axis=1)
+    question_idx, rank = np.nonzero(top)
+    answers = values[order[question_idx, rank]]
+    return pd.DataFrame({
+        "Question": np.asarray(result.q_nums)[question_idx],
+        "Answer": np.where(answers == "", "(blank)", answers),
+        "Count": top[question_idx, rank],
+        "Share": np.round(top[question_idx, rank] / n, 3),
+        # Marked correct, so accepted alternatives and numeric ranges count too
+        "Key": correct_counts[question_idx, order[question_idx, rank]] > 0,
+    }, columns=columns)
+
+
+def analyze_items(result):
+    """Item statistics, distractor frequencies and KR-20 for one GradingResult."""
+    counts = answer_counts(result)
+    return {
+        'items': item_statistics(result, counts),
+        'distractors': distractor_frequencies(result, counts=counts),
+        'kr20': kr20(result),
+    }
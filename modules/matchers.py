@@ -0,0 +1,302 @@
+"""
+Answer matchers for auto-grading.
+Each question type compiles its correct answer and optional configuration
+once into a predicate over an upload's unique normalized answers, so every
+distinct answer is checked once per question however many students gave it.
+"""
+import functools
+import json
+import re
+from fractions import Fraction
+
+import numpy as np
+import pandas as pd
+
+# Numeric answers within this distance of the key are correct, unless the key says otherwise
+NUMERIC_TOLERANCE = 0.01
+
+# question_type -> compile(correct_answer, config) -> predicate(AnswerLookup) -> bool array
+MATCHERS = {}
+
+_SPACES = re.compile(r"\s+")
+_ALTERNATIVES = re.compile(r"\s*\|\s*|\s+OR\s+", re.IGNORECASE)
+_CHOICE_SEPARATORS = re.compile(r"[\s,;/&+]+|\bAND\b", re.IGNORECASE)
+_TIMES_TEN = re.compile(r"\s*(?:[X×*·]|\\TIMES)\s*10\s*\^\s*", re.IGNORECASE)
+_THOUSANDS = re.compile(r"^[+-]?\d{1,3}(,\d{3})+(\.\d*)?$")
+_RANGE = re.compile(r"^(.+?)\s*(?:\.\.|\bTO\b)\s*(.+)$", re.IGNORECASE)
+
+
+def register_matcher(question_type):
+    """Decorator registering compile(correct_answer, config) for a question type.
+
+    compile receives the correct answer as typed and the question's parsed
+    configuration dict, and returns a predicate taking an AnswerLookup and
+    returning one bool per unique answer. It raises ValueError for a correct
+    answer or configuration it can't use. Predicates are sent to grading
+    worker processes, so they must be picklable (e.g. functools.partial of a
+    module-level function).
+    """
+    def decorator(compile_fn):
+        MATCHERS[question_type] = compile_fn
+        return compile_fn
+    return decorator
+
+
+def parse_config(config):
+    """Matcher configuration as a dict, from the stored JSON text, a dict or None."""
+    if config is None or config == "":
+        return {}
+    if isinstance(config, dict):
+        return config
+    try:
+        parsed = json.loads(config)
+    except (TypeError, ValueError):
+        raise ValueError("matcher configuration is not valid JSON")
+    if not isinstance(parsed, dict):
+        raise ValueError("matcher configuration must be a JSON object")
+    return parsed
+
+
+def parse_options(text):
+    """Matcher configuration from the answer key editor's Options cell.
+
+    Accepts a JSON object, or 'name=value' pairs separated by commas, e.g.
+    'tolerance=0.5, relative=2%' or 'accept=B;D'. Numbers (and percentages)
+    become numbers and 'accept' becomes a list. Returns None for an empty cell.
+    """
+    text = "" if text is None or (isinstance(text, float) and text != text) else str(text).strip()
+    if not text:
+        return None
+    if text.startswith("{"):
+        return parse_config(text)
+    config = {}
+    for pair in text.split(","):
+        name, sep, value = pair.partition("=")
+        name, value = name.strip().lower(), value.strip()
+        if not sep or not name:
+            raise ValueError(f"option {pair.strip()!r} should look like name=value")
+        if name == 'accept':
+            config[name] = [v.strip() for v in re.split(r"[;|]", value) if v.strip()]
+        elif value.endswith("%") and not np.isnan(parse_number(value[:-1])):
+            config[name] = parse_number(value[:-1]) / 100
+        else:
+            number = parse_number(value)
+            config[name] = value if np.isnan(number) else number
+    return config
+
+
+def format_options(config):
+    """The editor's Options text for a stored configuration (inverse of parse_options)."""
+    parts = []
+    for name, value in parse_config(config).items():
+        if isinstance(value, list):
+            value = ";".join(map(str, value))
+        elif isinstance(value, float):
+            value = f"{value:g}"
+        parts.append(f"{name}={value}")
+    return ", ".join(parts)
+
+
+def compile_matcher(question_type, correct_answer, config=None):
+    """Predicate for one answer key row. Raises ValueError if the type, answer or configuration is unusable."""
+    if question_type not in MATCHERS:
+        raise ValueError(f"unknown question type {question_type!r}")
+    return MATCHERS[question_type](str(correct_answer), parse_config(config))
+
+
+def parse_number(text):
+    """Read an answer as a number: plain, scientific (6.02e23, 6.02 x 10^23), fraction (3/4, 1 1/2) or 1,000.
+
+    Returns NaN if it isn't one.
+    """
+    text = str(text).strip()
+    if not text:
+        return np.nan
+    if _THOUSANDS.match(text):
+        text = text.replace(",", "")
+    text = _TIMES_TEN.sub("E", text)
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    parts = text.split()
+    try:
+        if len(parts) == 1 and "/" in text:
+            return float(Fraction(text))
+        if len(parts) == 2 and "/" in parts[1]:
+            whole = int(parts[0])
+            fraction = Fraction(parts[1])
+            return float(whole - fraction if text.startswith("-") else whole + fraction)
+    except (ValueError, ZeroDivisionError):
+        pass
+    return np.nan
+
+
+def _collapse(text):
+    """Case-folded text with runs of whitespace collapsed."""
+    return _SPACES.sub(" ", str(text).strip()).casefold()
+
+
+def _choice_set(text, letters=False):
+    """The options picked in a multi-select answer: 'A, C' and 'C;A' are both {A, C}.
+
+    With letters=True a run of letters is read as one option per letter, so 'AC' is {A, C} too.
+    """
+    text = str(text).strip().upper()
+    parts = [part for part in _CHOICE_SEPARATORS.split(text) if part]
+    if letters and len(parts) == 1 and parts[0].isalpha():
+        parts = list(parts[0])
+    return frozenset(parts)
+
+
+class AnswerLookup:
+    """An upload's unique normalized answers, with derived forms computed once and shared by every question."""
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=object)
+
+    def __len__(self):
+        return len(self.values)
+
+    def _map(self, func):
+        return pd.Series(self.values, dtype=object).map(func).to_numpy()
+
+    @functools.cached_property
+    def blank(self):
+        return self.values == ""
+
+    @functools.cached_property
+    def collapsed(self):
+        return self._map(_collapse)
+
+    @functools.cached_property
+    def numbers(self):
+        return self._map(parse_number).astype(float)
+
+    @functools.cached_property
+    def choice_sets(self):
+        return self._map(_choice_set)
+
+    @functools.cached_property
+    def letter_sets(self):
+        return self._map(functools.partial(_choice_set, letters=True))
+
+
+# ==================== PREDICATES ====================
+
+def _equals_any(accepted, view):
+    if len(accepted) == 1:
+        return view.values == next(iter(accepted))
+    return pd.Series(view.values, dtype=object).isin(accepted).to_numpy()
+
+
+def _text_equals_any(accepted, view):
+    if len(accepted) == 1:
+        return view.collapsed == next(iter(accepted))
+    return pd.Series(view.collapsed, dtype=object).isin(accepted).to_numpy()
+
+
+def _in_range(low, high, slack, view):
+    # Strictly closer than slack, as the original abs(answer - key) < 0.01 check was
+    with np.errstate(invalid='ignore'):
+        distance = np.maximum(np.maximum(low - view.numbers, view.numbers - high), 0)
+        return (distance < slack) | (distance == 0)
+
+
+def _regex_match(pattern, view):
+    return np.array([pattern.fullmatch(value) is not None for value in view.values], dtype=bool)
+
+
+def _same_choices(expected, view):
+    # Options that are single letters may also be written run together ('AC')
+    picked = view.letter_sets if all(len(option) == 1 for option in expected) else view.choice_sets
+    return np.array([choices == expected for choices in picked], dtype=bool)
+
+
+# ==================== BUILT-IN MATCHERS ====================
+
+def _accepted(answers, config, normalize):
+    """The normalized correct answers plus any alternatives listed in config['accept']."""
+    extra = config.get('accept', [])
+    if isinstance(extra, str):
+        extra = [extra]
+    accepted = frozenset(normalize(answer) for answer in [*answers, *extra] if str(answer).strip())
+    if not accepted:
+        raise ValueError("no correct answer")
+    return accepted
+
+
+def _number(value, what):
+    number = parse_number(value)
+    if np.isnan(number):
+        raise ValueError(f"{what} {value!r} is not a number")
+    return number
+
+
+@register_matcher('multiple_choice')
+def compile_multiple_choice(correct_answer, config):
+    """Exact match on the upper-cased answer; config 'accept' lists other accepted answers."""
+    return functools.partial(_equals_any, _accepted([correct_answer], config, lambda a: str(a).strip().upper()))
+
+
+@register_matcher('short_text')
+def compile_short_text(correct_answer, config):
+    """Case- and spacing-insensitive text match; config 'accept' lists other accepted answers."""
+    return functools.partial(_text_equals_any, _accepted([correct_answer], config, _collapse))
+
+
+@register_matcher('any_of')
+def compile_any_of(correct_answer, config):
+    """Any one of several answers, written 'A | C' or 'A or C', compared like short text."""
+    return functools.partial(_text_equals_any, _accepted(_ALTERNATIVES.split(correct_answer), config, _collapse))
+
+
+@register_matcher('numeric')
+def compile_numeric(correct_answer, config):
+    """A number within a tolerance, or a range written 'low..high' / 'low to high'.
+
+    Config: 'tolerance' (absolute, default NUMERIC_TOLERANCE for single
+    values, 0 for ranges) and 'relative' (a fraction of the correct value;
+    the looser of the two applies). An answer must be strictly closer than
+    the tolerance. Answers may use scientific notation or fractions.
+    """
+    text = correct_answer.strip()
+    bounds = _RANGE.match(text)
+    is_range = bounds is not None and not np.isnan(parse_number(bounds.group(1)))
+    try:
+        tolerance = float(config.get('tolerance', 0 if is_range else NUMERIC_TOLERANCE))
+        relative = float(config.get('relative', 0))
+    except (TypeError, ValueError):
+        raise ValueError("tolerance and relative must be numbers")
+    if tolerance < 0 or relative < 0:
+        raise ValueError("tolerance and relative can't be negative")
+
+    if is_range:
+        low = _number(bounds.group(1), "range start")
+        high = _number(bounds.group(2), "range end")
+        if low > high:
+            raise ValueError("range start is above range end")
+        slack = tolerance
+    else:
+        low = high = _number(text, "correct answer")
+        slack = max(tolerance, relative * abs(low))
+    return functools.partial(_in_range, low, high, slack)
+
+
+@register_matcher('regex')
+def compile_regex(correct_answer, config):
+    """The whole answer matches a regular expression, ignoring case."""
+    try:
+        pattern = re.compile(correct_answer.strip(), re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"invalid regular expression: {e}")
+    return functools.partial(_regex_match, pattern)
+
+
+@register_matcher('multi_select')
+def compile_multi_select(correct_answer, config):
+    """Exactly the listed options in any order: 'A, C' accepts 'C;A' and 'AC'."""
+    expected = _choice_set(correct_answer)
+    if not expected:
+        raise ValueError("no correct answer")
+    return functools.partial(_same_choices, expected)
@@ -1,6 +1,21 @@
 import streamlit as st
 import pandas as pd
 from modules import database as db
+from modules.grading import compile_answer_key
+from modules.matchers import MATCHERS, compile_matcher, format_options, parse_options
+from modules.grading_service import (
+    get_class_roster, grade_upload, save_matches, save_results, suggest_matches, unmatched_rows,
+    update_answer_key, REVIEW_REASONS
+)
+from modules.item_analysis import analyze_items
+from modules.ingest import (
+    count_data_rows, detect_identifier_columns, list_sheets, read_preview
+)
+from modules.upload_cache import file_digest, upload_cache
+
+# Suggested matches at least this similar are ticked for saving by default
+AUTO_CONFIRM_SCORE = 0.8
+
 
 def render():
     # Page header
@@ -75,6 +90,7 @@ def render_answer_key_tab():
 
     # Load existing answer key
     existing_key = db.get_answer_key(selected_assignment_id)
+    key_version = db.get_answer_key_version(selected_assignment_id)
 
     # Status indicator
     if existing_key:
@@ -86,7 +102,7 @@ def render_answer_key_tab():
             border: 1px solid #38a169;
             margin: 1rem 0;
         ">
-            <span style="color: #38a169; font-weight: 500;">Answer key exists with {len(existing_key)} questions</span>
+            <span style="color: #38a169; font-weight: 500;">Answer key exists with {len(existing_key)} questions (version {key_version})</span>
         </div>
         """, unsafe_allow_html=True)
     else:
@@ -120,14 +136,26 @@ def render_answer_key_tab():
                 "Q#": i,
                 "Answer": existing['correct_answer'] if existing else "",
                 "Points": existing['points'] if existing else 1.0,
-                "Type": existing['question_type'] if existing else "multiple_choice"
+                "Type": existing['question_type'] if existing else "multiple_choice",
+                "Options": format_options(existing.get('matcher_config')) if existing else ""
             })
     else:
-        key_data = [{"Q#": i, "Answer": "", "Points": 1.0, "Type": "multiple_choice"} for i in range(1, num_questions + 1)]
+        key_data = [{"Q#": i, "Answer": "", "Points": 1.0, "Type": "multiple_choice", "Options": ""}
+                    for i in range(1, num_questions + 1)]
 
     df = pd.DataFrame(key_data)
 
     st.caption("Enter the correct answer for each question. For multiple choice, use A, B, C, D, etc.")
+    with st.expander("Question types and options"):
+        st.markdown("""
+        - **multiple_choice**: exact letter, e.g. `B`. Options: `accept=D` to also accept D.
+        - **short_text**: text ignoring case and spacing. Options: `accept=colour;color`.
+        - **any_of**: any listed answer, e.g. `A or C` or `Paris | París`.
+        - **numeric**: a number within 0.01, e.g. `9.81`, `6.02e23` or `3/4`; or a range such as `2.5..3.5`.
+          Options: `tolerance=0.5` (absolute) and/or `relative=2%`.
+        - **regex**: the whole answer matches a regular expression (case-insensitive), e.g. `(mitochondri(a|on))`.
+        - **multi_select**: exactly these options in any order, e.g. `A, C` (also accepts `CA`).
+        """)
 
     edited_df = st.data_editor(
         df,
@@ -140,9 +168,10 @@ def render_answer_key_tab():
             "Points": st.column_config.NumberColumn("Points", min_value=0.0, max_value=100.0, step=0.5, width="small"),
             "Type": st.column_config.SelectboxColumn(
                 "Type",
-                options=["multiple_choice", "short_text", "numeric"],
+                options=list(MATCHERS),
                 width="medium"
-            )
+            ),
+            "Options": st.column_config.TextColumn("Options", width="medium")
         },
         key="answer_key_editor"
     )
@@ -151,18 +180,42 @@ def render_answer_key_tab():
     with col1:
         if st.button("Save Answer Key", type="primary", use_container_width=True):
             questions = []
+            problems = []
             for idx, row in edited_df.iterrows():
                 if row['Answer'].strip():
+                    answer = row['Answer'].strip().upper() if row['Type'] == 'multiple_choice' else row['Answer'].strip()
+                    # Check the answer and options compile before anything is saved
+                    try:
+                        config = parse_options(row['Options'])
+                        compile_matcher(row['Type'], answer, config)
+                    except ValueError as e:
+                        problems.append(f"Q{row['Q#']}: {e}")
+                        continue
                     questions.append({
                         'question_num': row['Q#'],
-                        'correct_answer': row['Answer'].strip().upper() if row['Type'] == 'multiple_choice' else row['Answer'].strip(),
+                        'correct_answer': answer,
                         'points': row['Points'],
-                        'question_type': row['Type']
+                        'question_type': row['Type'],
+                        'matcher_config': config
                     })
 
-            if questions:
-                db.set_answer_key(selected_assignment_id, questions)
-                st.success(f"Saved answer key with {len(questions)} questions!")
+            if problems:
+                st.error("Answer key not saved. Fix these questions first:\n\n" + "\n".join(f"- {p}" for p in problems))
+            elif questions:
+                report, regrade = update_answer_key(selected_assignment_id, questions)
+                diff = report['diff']
+                if any(diff.values()):
+                    summary = ", ".join(
+                        f"{label} {', '.join(f'Q{q}' for q in diff[field])}"
+                        for field, label in (('added', "added"), ('changed', "changed"), ('removed', "removed"))
+                        if diff[field]
+                    )
+                    st.success(f"Saved answer key version {report['version']} ({summary}).")
+                else:
+                    st.info("No changes to save; the answer key is unchanged.")
+                if regrade['regraded']:
+                    changed = ", ".join(f"Q{q}" for q in regrade['changed'])
+                    st.info(f"Re-graded {regrade['regraded']} saved submissions for {changed}.")
             else:
                 st.warning("No answers to save. Please fill in at least one answer.")
 
@@ -223,6 +276,7 @@ def render_grading_tab():
 
     # Check for answer key
     answer_key = db.get_answer_key(selected_assignment_id)
+    key_version = db.get_answer_key_version(selected_assignment_id)
     if not answer_key:
         st.markdown("""
         <div style="
@@ -273,10 +327,21 @@ def render_grading_tab():
 
     if uploaded_file is not None:
         try:
-            if uploaded_file.name.endswith('.csv'):
-                responses_df = pd.read_csv(uploaded_file)
-            else:
-                responses_df = pd.read_excel(uploaded_file)
+            # Reruns on the same upload reuse its sheet list and preview instead of re-reading it
+            digest = file_digest(uploaded_file)
+            sheet = None
+            sheets = upload_cache.get_or_compute(
+                ('sheets', digest, uploaded_file.name),
+                lambda: list_sheets(uploaded_file, uploaded_file.name)
+            )
+            if len(sheets) > 1:
+                sheet = st.selectbox("Sheet", sheets, key="grading_sheet")
+
+            # Only the first rows are read here; the file is streamed when grading
+            preview_df = upload_cache.get_or_compute(
+                ('preview', digest, uploaded_file.name, sheet),
+                lambda: read_preview(uploaded_file, uploaded_file.name, sheet=sheet)
+            )
 
             st.markdown("""
             <div style="
@@ -289,35 +354,67 @@ def render_grading_tab():
                 <span style="color: #3182ce; font-weight: 600;">Preview of uploaded data</span>
             </div>
             """, unsafe_allow_html=True)
-            st.dataframe(responses_df.head(), use_container_width=True)
+            st.dataframe(preview_df, use_container_width=True)
 
             # Find student name or ID column
-            name_col = None
-            id_col = None
-            for col in responses_df.columns:
-                col_lower = col.lower()
-                if 'student_id' in col_lower or 'studentid' in col_lower or col_lower == 'id':
-                    id_col = col
-                elif 'name' in col_lower or 'student' in col_lower:
-                    name_col = col
+            name_col, id_col = detect_identifier_columns(preview_df.columns)
 
             # If neither is found, use first column as name column
             if not name_col and not id_col:
-                name_col = responses_df.columns[0]
+                name_col = preview_df.columns[0]
                 st.info(f"Using '{name_col}' as student identifier column.")
             elif id_col:
                 st.info(f"Found student ID column: '{id_col}'")
             elif name_col:
                 st.info(f"Found student name column: '{name_col}'")
 
-            # Grade the responses
+            # Resolve question columns once and report problems before grading
+            compiled_key = compile_answer_key(answer_key, preview_df.columns)
+            if compiled_key.unmapped:
+                missing = ", ".join(f"Q{q}" for q in compiled_key.unmapped)
+                st.warning(f"No column found for {missing}. These questions will be graded as unanswered.")
+            if compiled_key.invalid:
+                invalid = "; ".join(f"Q{q}: {message}" for q, message in compiled_key.invalid.items())
+                st.warning(f"These answer key questions can't be graded and will score zero: {invalid}")
+            if compiled_key.positional:
+                positional = ", ".join(f"Q{q} → '{compiled_key.mapped_columns[q]}'" for q in compiled_key.positional)
+                st.info(f"Matched by column position (check these are right): {positional}")
+
+            save_scores = st.checkbox(
+                "Save scores to the gradebook",
+                value=True,
+                key="grading_save_scores",
+                help="Scores are saved together once the whole file is graded; if grading fails, nothing is saved"
+            )
+
+            # Grade the responses chunk by chunk
             if st.button("Grade Responses", type="primary", use_container_width=True):
-                results = grade_responses(responses_df, name_col, id_col, answer_key, selected_assignment)
+                total_rows = count_data_rows(uploaded_file, uploaded_file.name, sheet=sheet)
+                progress = st.progress(0.0, text="Grading responses...")
+
+                def on_chunk(rows_done):
+                    fraction = min(rows_done / total_rows, 1.0) if total_rows else 1.0
+                    progress.progress(fraction, text=f"Graded {rows_done} responses")
+
+                roster = get_class_roster(selected_class_id) if save_scores else None
+                # Only the identifier and question columns are read; an unchanged
+                # file graded against the same key comes from the result cache
+                outcome = grade_upload(
+                    uploaded_file, uploaded_file.name, name_col, id_col, compiled_key, selected_assignment,
+                    sheet=sheet, roster=roster, on_chunk=on_chunk, digest=digest, key_version=key_version
+                )
+
+                if not outcome['results']:
+                    st.warning("No student responses found. Check the student name/ID column.")
+                    return
 
                 # Store results in session state
-                st.session_state['grading_results'] = results
+                st.session_state['grading_results'] = outcome['results']
                 st.session_state['grading_assignment_id'] = selected_assignment_id
                 st.session_state['grading_class_id'] = selected_class_id
+                st.session_state['grading_key_version'] = key_version
+                st.session_state['grading_saved'] = outcome['report']
+                st.session_state['grading_unmatched'] = unmatched_rows(outcome['report']) if outcome['report'] else []
                 st.rerun()
 
         except Exception as e:
@@ -328,91 +425,6 @@ def render_grading_tab():
         display_grading_results()
 
 
-def grade_responses(responses_df, name_col, id_col, answer_key, assignment):
-    """Grade student responses against the answer key."""
-    results = []
-
-    # Create answer key lookup
-    key_lookup = {q['question_num']: q for q in answer_key}
-
-    for idx, row in responses_df.iterrows():
-        # Get student identifier (name and/or ID)
-        student_name = str(row[name_col]).strip() if name_col and name_col in row.index else None
-        student_id = str(row[id_col]).strip() if id_col and id_col in row.index else None
-
-        # Use whichever identifier we have
-        if not student_name and not student_id:
-            continue  # Skip this row if no identifier found
-
-        display_name = student_name if student_name else f"ID: {student_id}"
-        total_points = 0
-        max_points = 0
-        details = []
-
-        for q_num, q_data in key_lookup.items():
-            col_name = f"q{q_num}"
-            # Try different column naming conventions
-            student_answer = None
-            for possible_col in [col_name, f"Q{q_num}", f"question{q_num}", f"Question {q_num}"]:
-                if possible_col in row.index:
-                    student_answer = str(row[possible_col]).strip().upper() if pd.notna(row[possible_col]) else ""
-                    break
-
-            if student_answer is None:
-                # Try numeric column index
-                try:
-                    student_answer = str(row.iloc[q_num]).strip().upper() if pd.notna(row.iloc[q_num]) else ""
-                except:
-                    student_answer = ""
-
-            correct_answer = q_data['correct_answer'].upper()
-            points = q_data['points']
-            max_points += points
-
-            # Check answer based on type
-            is_correct = False
-            if q_data['question_type'] == 'multiple_choice':
-                is_correct = student_answer == correct_answer
-            elif q_data['question_type'] == 'short_text':
-                is_correct = student_answer.lower() == correct_answer.lower()
-            elif q_data['question_type'] == 'numeric':
-                try:
-                    is_correct = abs(float(student_answer) - float(correct_answer)) < 0.01
-                except:
-                    is_correct = False
-
-            if is_correct:
-                total_points += points
-
-            details.append({
-                'question': q_num,
-                'student_answer': student_answer,
-                'correct_answer': correct_answer,
-                'is_correct': is_correct,
-                'points_earned': points if is_correct else 0,
-                'points_possible': points
-            })
-
-        # Scale to assignment max points
-        if max_points > 0:
-            scaled_score = (total_points / max_points) * assignment['max_points']
-        else:
-            scaled_score = 0
-
-        results.append({
-            'student_name': student_name,
-            'student_id': student_id,
-            'display_name': display_name,
-            'raw_score': total_points,
-            'max_raw': max_points,
-            'scaled_score': round(scaled_score, 2),
-            'percentage': round((total_points / max_points) * 100, 1) if max_points > 0 else 0,
-            'details': details
-        })
-
-    return results
-
-
 def display_grading_results():
     """Display grading results with option to save."""
     results = st.session_state['grading_results']
@@ -431,21 +443,16 @@ def display_grading_results():
     </div>
     """, unsafe_allow_html=True)
 
-    # Summary table
-    summary_data = []
-    for r in results:
-        summary_data.append({
-            "Student": r['display_name'],
-            "Score": r['scaled_score'],
-            "Percentage": f"{r['percentage']}%",
-            "Correct": f"{sum(1 for d in r['details'] if d['is_correct'])}/{len(r['details'])}"
-        })
+    # Scores already written while grading
+    saved_while_grading = st.session_state.get('grading_saved')
+    if saved_while_grading:
+        show_save_report(saved_while_grading, results, "while grading")
 
-    summary_df = pd.DataFrame(summary_data)
-    st.dataframe(summary_df, use_container_width=True, hide_index=True)
+    # Summary table, built straight from the result columns
+    st.dataframe(results.summary_frame(), use_container_width=True, hide_index=True)
 
     # Statistics cards
-    scores = [r['scaled_score'] for r in results]
+    stats = results.summary_stats()
 
     col1, col2, col3, col4 = st.columns(4)
 
@@ -458,7 +465,7 @@ def display_grading_results():
             border-radius: 8px;
             text-align: center;
         ">
-            <div style="font-size: 1.75rem; font-weight: 700; color: white;">{sum(scores)/len(scores):.1f}</div>
+            <div style="font-size: 1.75rem; font-weight: 700; color: white;">{stats['average']:.1f}</div>
             <div style="font-size: 0.85rem; opacity: 0.9; color: white;">Average</div>
         </div>
         """, unsafe_allow_html=True)
@@ -472,7 +479,7 @@ def display_grading_results():
             border-radius: 8px;
             text-align: center;
         ">
-            <div style="font-size: 1.75rem; font-weight: 700; color: white;">{max(scores):.1f}</div>
+            <div style="font-size: 1.75rem; font-weight: 700; color: white;">{stats['highest']:.1f}</div>
             <div style="font-size: 0.85rem; opacity: 0.9; color: white;">Highest</div>
         </div>
         """, unsafe_allow_html=True)
@@ -486,13 +493,12 @@ def display_grading_results():
             border-radius: 8px;
             text-align: center;
         ">
-            <div style="font-size: 1.75rem; font-weight: 700; color: white;">{min(scores):.1f}</div>
+            <div style="font-size: 1.75rem; font-weight: 700; color: white;">{stats['lowest']:.1f}</div>
             <div style="font-size: 0.85rem; opacity: 0.9; color: white;">Lowest</div>
         </div>
         """, unsafe_allow_html=True)
 
     with col4:
-        passing = sum(1 for r in results if r['percentage'] >= 60)
         st.markdown(f"""
         <div style="
             background: #d69e2e;
@@ -501,7 +507,7 @@ def display_grading_results():
             border-radius: 8px;
             text-align: center;
         ">
-            <div style="font-size: 1.75rem; font-weight: 700; color: white;">{passing}/{len(results)}</div>
+            <div style="font-size: 1.75rem; font-weight: 700; color: white;">{stats['passing']}/{stats['count']}</div>
             <div style="font-size: 0.85rem; opacity: 0.9; color: white;">Passing (60%+)</div>
         </div>
         """, unsafe_allow_html=True)
@@ -510,58 +516,191 @@ def display_grading_results():
 
     # Save to database
     if st.button("Save Grades to Database", type="primary", use_container_width=True):
-        # Get students from class
-        students = db.get_students_by_class(class_id)
+        try:
+            report = save_results(results, get_class_roster(class_id), assignment_id,
+                                  st.session_state.get('grading_key_version'))
+        except Exception as e:
+            st.error(f"Nothing was saved: {e}")
+        else:
+            st.session_state['grading_unmatched'] = unmatched_rows(report)
+            show_save_report(report, results)
 
-        # Create lookups for both name and student_id
-        name_lookup = {s['name'].lower(): s['id'] for s in students if s.get('name')}
-        id_lookup = {str(s['student_id']).lower(): s['id'] for s in students if s.get('student_id')}
+    display_match_review(results, class_id, assignment_id)
 
-        saved_count = 0
-        not_found = []
+    # Detailed breakdown expander: only the selected student's details are built
+    with st.expander("Detailed Question Breakdown"):
+        display_names = results.display_names
+        row = st.selectbox(
+            "Student",
+            options=range(len(results)),
+            format_func=lambda i: display_names[i],
+            key="grading_detail_student"
+        )
+        r = results.student(row)
+        st.markdown(f"""
+        <div style="
+            background: #f7fafc;
+            padding: 0.75rem 1rem;
+            border-radius: 8px;
+            margin-bottom: 0.5rem;
+            border-left: 4px solid #1e3a5f;
+        ">
+            <strong>{r['display_name']}</strong> - {r['scaled_score']} pts ({r['percentage']}%)
+        </div>
+        """, unsafe_allow_html=True)
+        details_df = results.details_frame(row)
+        details_df['Result'] = details_df['is_correct'].apply(lambda x: 'Correct' if x else 'Incorrect')
+        st.dataframe(
+            details_df[['question', 'student_answer', 'correct_answer', 'Result', 'points_earned']],
+            use_container_width=True,
+            hide_index=True
+        )
 
-        for r in results:
-            db_student_id = None
+    display_item_analysis(results)
+
+
+def display_item_analysis(results):
+    """Per-question difficulty, discrimination and answer frequencies, with CSV downloads."""
+    # Computed once per grading run, not on every rerun
+    cached = st.session_state.get('grading_item_analysis')
+    if cached is None or cached[0] is not results:
+        cached = (results, analyze_items(results))
+        st.session_state['grading_item_analysis'] = cached
+    analysis = cached[1]
+
+    with st.expander("Item Analysis"):
+        reliability = analysis['kr20']
+        st.metric("Reliability (KR-20)", f"{reliability:.3f}" if reliability is not None else "n/a")
+        st.caption("Difficulty is the share of students answering correctly. "
+                   "Point-biserial compares each question with the rest of the exam; low or negative values flag questions worth reviewing.")
+        st.dataframe(analysis['items'], use_container_width=True, hide_index=True)
+
+        distractors = analysis['distractors']
+        question = st.selectbox(
+            "Answer frequencies for question",
+            options=["All"] + list(results.q_nums),
+            key="grading_item_question"
+        )
+        if question != "All":
+            distractors = distractors[distractors['Question'] == question]
+        st.dataframe(distractors, use_container_width=True, hide_index=True)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                label="Download Item Statistics",
+                data=analysis['items'].to_csv(index=False),
+                file_name="item_statistics.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
+        with col2:
+            st.download_button(
+                label="Download Answer Frequencies",
+                data=analysis['distractors'].to_csv(index=False),
+                file_name="answer_frequencies.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
 
-            # Try to match by student_id first
-            if r['student_id']:
-                db_student_id = id_lookup.get(str(r['student_id']).lower())
 
-            # If not found by ID, try by name
-            if not db_student_id and r['student_name']:
-                db_student_id = name_lookup.get(r['student_name'].lower())
+def display_match_review(results, class_id, assignment_id):
+    """Let the instructor pair rows that matched no single student with suggested roster students, in bulk."""
+    rows = st.session_state.get('grading_unmatched')
+    if not rows:
+        return
 
-            if db_student_id:
-                db.set_grade(db_student_id, assignment_id, r['scaled_score'])
-                saved_count += 1
-            else:
-                not_found.append(r['display_name'])
+    # Ranked once per save, not on every rerun
+    cached = st.session_state.get('grading_match_suggestions')
+    if cached is None or cached[0] is not results or cached[1] != rows:
+        cached = (results, list(rows), suggest_matches(results, get_class_roster(class_id), rows))
+        st.session_state['grading_match_suggestions'] = cached
+    suggestions = cached[2]
+
+    # One unambiguous label per roster student for the Match column
+    students = db.get_students_by_class(class_id)
+    labels = {s['id']: f"{s['name']} ({s['student_id']})" if s['student_id'] else s['name'] for s in students}
+    repeated = pd.Series(list(labels.values())).duplicated(keep=False).tolist()
+    labels = {id_: f"{label} #{id_}" if dup else label for (id_, label), dup in zip(labels.items(), repeated)}
+    ids_by_label = {label: id_ for id_, label in labels.items()}
+
+    display_names = results.display_names
+    best = [suggestions[row][0] if suggestions[row] else None for row in rows]
+    # A tie for the best match (e.g. two students with the same name) is never ticked for the instructor
+    tied = [len(suggestions[row]) > 1 and suggestions[row][1]['score'] == suggestions[row][0]['score'] for row in rows]
+    review_df = pd.DataFrame({
+        'Line': [int(results.source_rows[row]) + 2 for row in rows],
+        'In File': [display_names[row] for row in rows],
+        'Match': [labels.get(b['id']) if b else None for b in best],
+        'Similarity': [b['score'] if b else 0.0 for b in best],
+        'Confirm': [bool(b) and b['score'] >= AUTO_CONFIRM_SCORE and not tie for b, tie in zip(best, tied)],
+    })
 
-        if saved_count > 0:
-            st.success(f"Saved {saved_count} grades to database!")
+    st.markdown("""
+    <div style="
+        background: white;
+        padding: 1.5rem;
+        border-radius: 8px;
+        border: 1px solid #e2e8f0;
+        margin: 1.5rem 0 1rem 0;
+    ">
+        <h3 style="margin: 0; color: #1e3a5f; font-size: 1.1rem;">Review Unmatched Students</h3>
+    </div>
+    """, unsafe_allow_html=True)
+    st.caption(f"{len(rows)} rows matched no single student in this class. Each shows the closest roster name; "
+               "close matches are ticked already, except where several students share a name. "
+               "Change or untick any that are wrong, then save.")
 
-        if not_found:
-            st.warning(f"Could not find students: {', '.join(not_found)}")
+    edited_df = st.data_editor(
+        review_df,
+        use_container_width=True,
+        hide_index=True,
+        disabled=["Line", "In File", "Similarity"],
+        column_config={
+            "Line": st.column_config.NumberColumn("Line", width="small"),
+            "Match": st.column_config.SelectboxColumn("Match", options=list(ids_by_label), width="large"),
+            "Similarity": st.column_config.ProgressColumn("Similarity", min_value=0.0, max_value=1.0, format="%.2f"),
+            "Confirm": st.column_config.CheckboxColumn("Confirm", width="small"),
+        },
+        key=f"grading_match_editor_{len(rows)}"
+    )
 
-    # Detailed breakdown expander
-    with st.expander("Detailed Question Breakdown"):
-        for r in results:
-            st.markdown(f"""
-            <div style="
-                background: #f7fafc;
-                padding: 0.75rem 1rem;
-                border-radius: 8px;
-                margin-bottom: 0.5rem;
-                border-left: 4px solid #1e3a5f;
-            ">
-                <strong>{r['display_name']}</strong> - {r['scaled_score']} pts ({r['percentage']}%)
-            </div>
-            """, unsafe_allow_html=True)
-            details_df = pd.DataFrame(r['details'])
-            details_df['Result'] = details_df['is_correct'].apply(lambda x: 'Correct' if x else 'Incorrect')
-            st.dataframe(
-                details_df[['question', 'student_answer', 'correct_answer', 'Result', 'points_earned']],
-                use_container_width=True,
-                hide_index=True
-            )
-            st.markdown("---")
+    if st.button("Save Confirmed Matches", type="primary", use_container_width=True):
+        confirmed = edited_df['Confirm'].to_numpy(dtype=bool) & edited_df['Match'].notna().to_numpy()
+        matches = [(row, ids_by_label[label]) for row, label, ok in zip(rows, edited_df['Match'], confirmed) if ok]
+        if not matches:
+            st.warning("No matches confirmed.")
+            return
+        try:
+            report = save_matches(results, matches, assignment_id, st.session_state.get('grading_key_version'))
+        except Exception as e:
+            st.error(f"Nothing was saved: {e}")
+        else:
+            saved = set(report['inserted']) | set(report['updated'])
+            st.session_state['grading_unmatched'] = [row for row in rows if row not in saved]
+            show_save_report(report, results)
+
+
+def show_save_report(report, results, when=""):
+    """Summarize a save report and list the rows that were not saved.
+
+    Rows that matched no single student are only counted here; they are
+    listed for review by display_match_review().
+    """
+    saved_count = len(report['inserted']) + len(report['updated'])
+    if saved_count > 0:
+        st.success(f"Saved {saved_count} grades to database {when}".rstrip() + "!")
+    unmatched = [r for r in report['rejected'] if r['reason'] in REVIEW_REASONS]
+    rejected = [r for r in report['rejected'] if r['reason'] not in REVIEW_REASONS]
+    if unmatched:
+        st.info(f"{len(unmatched)} rows matched no single student; review the suggested matches below.")
+    if rejected:
+        st.warning(f"Could not save {len(rejected)} rows:")
+        display_names = results.display_names
+        rejected_df = pd.DataFrame({
+            # Show file line numbers (the header is line 1)
+            'Line': [int(results.source_rows[r['row']]) + 2 for r in rejected],
+            'Student': [display_names[r['row']] for r in rejected],
+            'Reason': [r['reason'] for r in rejected],
+        })
+        st.dataframe(rejected_df, use_container_width=True, hide_index=True)
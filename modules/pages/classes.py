@@ -56,8 +56,8 @@ def render():
             else:
                 st.warning("Please enter a class name.")
 
-    # Display all classes
-    classes = db.get_all_classes()
+    # Display all classes with their counts (one query for every class)
+    classes = db.get_class_overview()
 
     if classes:
         st.markdown(f"""
@@ -77,9 +77,6 @@ def render():
         # Class cards grid
         cols = st.columns(3)
         for i, c in enumerate(classes):
-            student_count = db.get_student_count_by_class(c['id'])
-            assignment_count = len(db.get_assignments_by_class(c['id']))
-
             with cols[i % 3]:
                 st.markdown(f"""
                 <div style="
@@ -91,7 +88,10 @@ def render():
                 ">
                     <h4 style="margin: 0 0 0.5rem 0; font-size: 1rem; font-weight: 600; color: white;">{c['name']}</h4>
                     <div style="font-size: 0.85rem; opacity: 0.9; color: white;">
-                        {student_count} students | {assignment_count} assignments
+                        {c['student_count']} students | {c['assignment_count']} assignments
+                    </div>
+                    <div style="margin-top: 0.25rem; font-size: 0.8rem; opacity: 0.9; color: white;">
+                        {c['completion']:.0%} graded
                     </div>
                     <div style="margin-top: 0.5rem; font-size: 0.75rem; opacity: 0.7; color: white;">
                         Created: {c['created_at'][:10] if c['created_at'] else 'N/A'}
@@ -161,9 +161,13 @@ def render():
                     })
 
             if grades_to_save:
-                db.bulk_set_grades(grades_to_save)
-                st.success(f"Saved {len(grades_to_save)} grades!")
-                st.rerun()
+                report = db.bulk_set_grades(grades_to_save)
+                if report['rejected']:
+                    reasons = ", ".join(sorted({r['reason'] for r in report['rejected']}))
+                    st.error(f"Could not save {len(report['rejected'])} grades: {reasons}")
+                else:
+                    st.success(f"Saved {len(grades_to_save)} grades!")
+                    st.rerun()
             else:
                 st.warning("No grades to save.")
 
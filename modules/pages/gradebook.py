@@ -57,9 +57,10 @@ def render():
     )
     selected_class_id = class_options[selected_class_name]
 
-    # Get students and assignments
-    students = db.get_students_by_class(selected_class_id)
-    assignments = db.get_assignments_by_class(selected_class_id)
+    # Get students, assignments and every grade in one query
+    matrix = db.get_gradebook_matrix(selected_class_id)
+    students = matrix['students']
+    assignments = matrix['assignments']
 
     if not students:
         st.markdown("""
@@ -94,38 +95,9 @@ def render():
     # Get grade scale
     grade_scale = db.get_grade_scale()
 
-    # Build gradebook matrix
-    gradebook_data = []
-
-    for student in students:
-        student_uid = student.get('student_id', '-')
-        row = {"Student": student['name'], "Student ID": student_uid, "student_id": student['id']}
-        total_weighted = 0
-        total_weight = 0
-
-        for assignment in assignments:
-            grade = db.get_grade(student['id'], assignment['id'])
-            if grade and grade['points'] is not None:
-                points = grade['points']
-                percentage = (points / assignment['max_points']) * 100
-                row[assignment['name']] = f"{points:.1f}"
-                total_weighted += percentage * assignment['weight']
-                total_weight += assignment['weight']
-            else:
-                row[assignment['name']] = "-"
-
-        # Calculate weighted average
-        if total_weight > 0:
-            weighted_avg = total_weighted / total_weight
-            row['Average'] = f"{weighted_avg:.1f}%"
-            row['Letter'] = get_letter_grade(weighted_avg, grade_scale)
-            row['_avg_value'] = weighted_avg  # For sorting
-        else:
-            row['Average'] = "-"
-            row['Letter'] = "-"
-            row['_avg_value'] = -1
-
-        gradebook_data.append(row)
+    # Build gradebook matrix (weighted averages are maintained by the database)
+    stats = db.get_student_stats_by_class(selected_class_id)
+    gradebook_data = build_gradebook_rows(matrix, stats, grade_scale)
 
     df = pd.DataFrame(gradebook_data)
 
@@ -362,6 +334,41 @@ def render():
         )
 
 
+def build_gradebook_rows(matrix, stats, grade_scale):
+    """Build one gradebook row per student from a get_gradebook_matrix() result.
+
+    stats is get_student_stats_by_class(), which supplies each weighted average.
+    """
+    assignments = matrix['assignments']
+    grades = matrix['grades']
+    gradebook_data = []
+
+    for student in matrix['students']:
+        student_uid = student.get('student_id', '-')
+        row = {"Student": student['name'], "Student ID": student_uid, "student_id": student['id']}
+
+        for assignment in assignments:
+            grade = grades.get((student['id'], assignment['id']))
+            if grade and grade['points'] is not None:
+                row[assignment['name']] = f"{grade['points']:.1f}"
+            else:
+                row[assignment['name']] = "-"
+
+        weighted_avg = stats.get(student['id'], {}).get('average')
+        if weighted_avg is not None:
+            row['Average'] = f"{weighted_avg:.1f}%"
+            row['Letter'] = get_letter_grade(weighted_avg, grade_scale)
+            row['_avg_value'] = weighted_avg  # For sorting
+        else:
+            row['Average'] = "-"
+            row['Letter'] = "-"
+            row['_avg_value'] = -1
+
+        gradebook_data.append(row)
+
+    return gradebook_data
+
+
 def get_letter_grade(percentage, scale):
     """Convert percentage to letter grade based on scale."""
     if percentage >= scale.get('A', 90):
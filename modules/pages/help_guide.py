@@ -234,7 +234,7 @@ def render_features_guide():
         - Select class and assignment
         - Enter correct answers for each question
         - Set points per question
-        - Choose question type (multiple choice, short text, numeric)
+        - Choose question type and, if needed, options such as a tolerance
 
         **Step 2: Grade Responses**
         - Upload CSV/Excel with student responses
@@ -257,9 +257,13 @@ def render_features_guide():
         ```
 
         **Question Types:**
-        - **Multiple Choice**: Exact match (A, B, C, D)
-        - **Short Text**: Case-insensitive match
-        - **Numeric**: Within 0.01 tolerance
+        - **Multiple Choice**: Exact match (A, B, C, D); `accept=D` also accepts D
+        - **Short Text**: Case- and spacing-insensitive match
+        - **Any Of**: Any listed answer, e.g. `A or C`
+        - **Numeric**: Within 0.01 by default, or a range like `2.5..3.5`; accepts `6.02e23` and `3/4`.
+          Options `tolerance=0.5` and `relative=2%` loosen the match
+        - **Regex**: The whole answer matches a regular expression
+        - **Multi Select**: The same set of options in any order (`A, C` = `C, A`)
         """)
 
     with st.expander("📊 Gradebook"):
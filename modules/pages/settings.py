@@ -1,5 +1,6 @@
 import streamlit as st
 from modules import database as db
+from modules.upload_cache import result_cache, upload_cache
 
 def render():
     # Page header
@@ -254,7 +255,15 @@ def render():
         </div>
         """, unsafe_allow_html=True)
 
-    st.caption("Database location: `data/grader.db`")
+    storage = db.get_storage_info()
+    cache = db.get_cache_stats()
+    st.caption(f"Database location: `data/grader.db` • Journal mode: `{storage['journal_mode']}`")
+    st.caption(f"Read cache: {cache['hits']} hits, {cache['misses']} misses, "
+               f"{cache['entries']}/{cache['max_entries']} entries")
+    for upload_stats in (upload_cache.stats(), result_cache.stats()):
+        st.caption(f"Upload cache ({upload_stats['name']}): {upload_stats['hits'] + upload_stats['disk_hits']} hits, "
+                   f"{upload_stats['misses']} misses, {upload_stats['entries']} entries, "
+                   f"{upload_stats['bytes'] / 1e6:.1f}/{upload_stats['max_bytes'] / 1e6:.0f} MB")
 
     st.markdown("<br>", unsafe_allow_html=True)
 
@@ -276,6 +285,28 @@ def render():
         st.success("Grade scale reset to default values!")
         st.rerun()
 
+    if st.button("Rebuild Statistics", use_container_width=False,
+                 help="Recompute stored student averages and dashboard totals from the raw data"):
+        rebuilt = db.rebuild_student_stats()
+        st.success(f"Rebuilt averages for {rebuilt} students and the dashboard totals!")
+
+    if st.button("Compact Database", use_container_width=False,
+                 help="Reclaim space left by deleted records and refresh query statistics"):
+        progress = st.progress(0.0, text="Compacting...")
+        result = db.compact_database()
+        total = result['freed_pages'] + result['free_pages']
+        freed = result['freed_pages']
+        # Small time-boxed steps keep the database available to other sessions
+        while result['incremental'] and (result['free_pages'] > 0 or not result['analyzed']):
+            result = db.compact_database()
+            freed += result['freed_pages']
+            progress.progress(min(freed / total, 1.0) if total else 1.0, text="Compacting...")
+        progress.progress(1.0, text="Done")
+        if result['incremental']:
+            st.success(f"Reclaimed {freed} pages.")
+        elif db.enable_incremental_compaction():
+            st.success("Database rebuilt with incremental compaction enabled.")
+
     st.markdown("<br>", unsafe_allow_html=True)
 
     # About section
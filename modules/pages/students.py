@@ -126,9 +126,17 @@ def render():
 
                 if st.button("Import All Students", use_container_width=True, type="primary"):
                     students = df.to_dict('records')
-                    added = db.bulk_add_students(students, selected_class_id)
-                    st.success(f"Imported {added} students!")
-                    st.rerun()
+                    report = db.bulk_add_students(students, selected_class_id)
+                    st.success(f"Imported {len(report['inserted'])} students!")
+                    if report['rejected']:
+                        st.warning(f"Skipped {len(report['rejected'])} rows:")
+                        rejected_df = pd.DataFrame(report['rejected'])
+                        # Show CSV line numbers (the header is line 1)
+                        rejected_df['row'] = rejected_df['row'] + 2
+                        rejected_df.columns = ['CSV Line', 'Reason']
+                        st.dataframe(rejected_df, use_container_width=True, hide_index=True)
+                    else:
+                        st.rerun()
             except Exception as e:
                 st.error(f"Error reading CSV: {e}")
 
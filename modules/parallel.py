@@ -0,0 +1,64 @@
+"""
+Process-pool helpers.
+Runs a function over a sequence or stream of tasks in worker processes,
+keeping results in task order and falling back to this process when a pool
+can't be used.
+"""
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+def start_pool(workers):
+    """A process pool of workers processes, or None if this host can't start one."""
+    # Forking a threaded process (the Streamlit server) can copy held locks
+    # into the child; start workers from a clean process instead
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    try:
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    except (OSError, NotImplementedError):
+        return None
+
+
+def _result(func, task, future):
+    """A submitted task's result, or the task run in-process if the pool failed."""
+    if future is not None:
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            pass
+    return func(task)
+
+
+def iter_pooled(func, tasks, workers):
+    """Yield func(task) for each task, in order, running them in a process pool.
+
+    func must be picklable (a module-level function or a partial of one).
+    At most 2 * workers tasks are in flight, so a long stream of tasks is
+    never read far ahead. With workers <= 1, or if the pool can't start or
+    breaks, the remaining tasks run in this process.
+    """
+    pool = start_pool(workers) if workers > 1 else None
+    pending = deque()
+    try:
+        for task in tasks:
+            future = None
+            if pool is not None:
+                try:
+                    future = pool.submit(func, task)
+                except (OSError, RuntimeError):
+                    # No usable process pool (e.g. a restricted host); run in-process instead
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = None
+            pending.append((task, future))
+            while len(pending) > 2 * workers or (pending and pool is None):
+                task, future = pending.popleft()
+                yield _result(func, task, future)
+        while pending:
+            task, future = pending.popleft()
+            yield _result(func, task, future)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
@@ -0,0 +1,139 @@
+"""
+Roster matching.
+Resolves the student identifiers found in uploaded response sheets to
+students in a class, exactly where possible and otherwise by ranking likely
+candidates for the instructor to confirm.
+"""
+import re
+import unicodedata
+
+import numpy as np
+
+# Ranked candidates offered per unmatched row, and the least similar one worth showing
+CANDIDATE_LIMIT = 3
+MIN_CANDIDATE_SCORE = 0.3
+
+_APOSTROPHES = re.compile(r"['’`]")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_id(value):
+    """Canonical form of a student ID for matching: stripped and case-folded."""
+    return str(value).strip().casefold()
+
+
+def normalize_name(name):
+    """Canonical form of a name: accents, punctuation and case removed, "Last, First" turned around.
+
+    'Núñez, José-Luis' and 'jose luis nunez' both become 'jose luis nunez'.
+    """
+    text = unicodedata.normalize("NFKD", str(name))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    if "," in text:
+        last, first = text.split(",", 1)
+        text = f"{first} {last}"
+    text = _NON_WORD.sub(" ", _APOSTROPHES.sub("", text))
+    return " ".join(text.split())
+
+
+def name_key(name):
+    """Order-independent matching key: the normalized name's words, sorted."""
+    return " ".join(sorted(normalize_name(name).split()))
+
+
+def _trigrams(key):
+    """Character trigrams of each word, padded so short words and word edges count."""
+    grams = set()
+    for word in key.split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class RosterIndex:
+    """Lookup tables over one class roster, built once per class.
+
+    match() tries the student ID first, then the name key; a name key shared
+    by several students (two "Ann Lee"s, or "Ann Lee" and "Lee Ann") matches
+    none of them. candidates() ranks roster students by trigram similarity,
+    touching only the students that share a trigram with the name instead of
+    scanning the whole roster.
+    """
+
+    def __init__(self, students):
+        self.by_id = {}
+        self.by_name = {}
+        self.namesakes = {}  # name key -> every student with it, for keys shared by several
+        self.student_ids = []
+        self.names = []
+        postings = {}
+        sizes = []
+        for student in students:
+            if student.get('student_id'):
+                self.by_id[normalize_id(student['student_id'])] = student['id']
+            if not student.get('name'):
+                continue
+            key = name_key(student['name'])
+            if key in self.by_name:
+                self.namesakes.setdefault(key, [self.by_name[key]]).append(student['id'])
+            else:
+                self.by_name[key] = student['id']
+            grams = _trigrams(key)
+            for gram in grams:
+                postings.setdefault(gram, []).append(len(self.names))
+            sizes.append(len(grams))
+            self.student_ids.append(student['id'])
+            self.names.append(student['name'])
+        self.postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+        self.sizes = np.array(sizes, dtype=np.float64)
+
+    def match(self, student_name=None, student_id=None):
+        """Return the database id of the matching student, or None."""
+        if student_id:
+            found = self.by_id.get(normalize_id(student_id))
+            if found is not None:
+                return found
+        if student_name:
+            key = name_key(student_name)
+            if key in self.namesakes:
+                # Guessing would give one student another's grade; leave it for review
+                return None
+            return self.by_name.get(key)
+        return None
+
+    def ambiguous(self, student_name):
+        """Database ids of the students sharing student_name's name key, if there is more than one."""
+        if not student_name:
+            return []
+        return list(self.namesakes.get(name_key(student_name), []))
+
+    def candidates(self, student_name, limit=CANDIDATE_LIMIT, min_score=MIN_CANDIDATE_SCORE):
+        """Rank the roster students whose names look like student_name.
+
+        Returns up to limit dicts with the student's database 'id', 'name' and
+        a Dice 'score' between 0 and 1 (1 is the same name), best first. Every
+        student sharing the name's key is included, even past limit.
+        """
+        limit = max(limit, len(self.ambiguous(student_name)))
+        grams = _trigrams(name_key(student_name)) if student_name else set()
+        hits = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not hits:
+            return []
+        overlap = np.bincount(np.concatenate(hits))
+        rows = np.flatnonzero(overlap)
+        scores = 2 * overlap[rows] / (len(grams) + self.sizes[rows])
+        keep = scores >= min_score
+        rows, scores = rows[keep], scores[keep]
+        best = np.argsort(-scores, kind='stable')[:limit]
+        return [
+            {'id': self.student_ids[rows[i]], 'name': self.names[rows[i]], 'score': round(float(scores[i]), 3)}
+            for i in best
+        ]
+
+    def suggest(self, student_names, limit=CANDIDATE_LIMIT, min_score=MIN_CANDIDATE_SCORE):
+        """candidates() for many names; a name repeated in the file is ranked once."""
+        ranked = {}
+        for name in student_names:
+            if name not in ranked:
+                ranked[name] = self.candidates(name, limit, min_score)
+        return [ranked[name] for name in student_names]
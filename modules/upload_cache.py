@@ -0,0 +1,168 @@
+"""
+Content-addressed caches for uploaded response files.
+Uploads are identified by the SHA-256 of their bytes, so Streamlit reruns and
+repeated "Grade" clicks on an unchanged file reuse earlier work instead of
+reading and grading it again.
+"""
+import contextlib
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+# Memory budgets, in bytes of pickled entries
+UPLOAD_CACHE_BYTES = 32 * 1024 * 1024
+RESULT_CACHE_BYTES = 256 * 1024 * 1024
+
+# Entries evicted from memory can be written to disk and read back later.
+# Opt in with GRADER_CACHE_SPILL=1; SPILL_MAX_BYTES bounds each cache's folder.
+SPILL_ENABLED = os.environ.get("GRADER_CACHE_SPILL", "").strip().lower() in ("1", "true", "yes", "on")
+SPILL_DIR = Path(__file__).parent.parent / "data" / "cache"
+SPILL_MAX_BYTES = 1024 * 1024 * 1024
+
+_HASH_BLOCK = 1 << 20
+
+
+def file_digest(file):
+    """SHA-256 hex digest of an upload's bytes; files on disk are read in 1 MB blocks and rewound."""
+    if hasattr(file, 'getbuffer'):
+        # In-memory uploads (Streamlit's UploadedFile, BytesIO) hash without copying
+        return hashlib.sha256(file.getbuffer()).hexdigest()
+    digest = hashlib.sha256()
+    file.seek(0)
+    for block in iter(lambda: file.read(_HASH_BLOCK), b""):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+class ContentCache:
+    """A thread-safe LRU cache bounded by the pickled size of its entries.
+
+    Keys are tuples of plain values (typically starting with a file digest).
+    With a spill_dir, entries evicted from memory are pickled to disk and
+    promoted back on their next hit; the oldest spilled files are deleted
+    once the folder passes max_spill_bytes.
+    """
+
+    def __init__(self, name, max_bytes, spill_dir=None, max_spill_bytes=SPILL_MAX_BYTES):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.spill_dir = Path(spill_dir) / name if spill_dir else None
+        self.max_spill_bytes = max_spill_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "spilled": 0, "disk_hits": 0}
+
+    def _spill_path(self, key):
+        return self.spill_dir / (hashlib.sha256(repr(key).encode()).hexdigest() + ".pkl")
+
+    def get(self, key):
+        """The cached value for key, or None."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return self._entries[key][0]
+        value = self._read_spilled(key)
+        with self._lock:
+            self._stats["misses" if value is None else "disk_hits"] += 1
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        """Cache value under key. Values larger than the whole budget are not kept in memory."""
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if len(data) <= self.max_bytes:
+                self._entries[key] = (value, len(data))
+                self._bytes += len(data)
+            else:
+                evicted.append((key, value))
+            while self._bytes > self.max_bytes:
+                old_key, (old_value, size) = self._entries.popitem(last=False)
+                self._bytes -= size
+                self._stats["evictions"] += 1
+                evicted.append((old_key, old_value))
+        for old_key, old_value in evicted:
+            self._spill(old_key, data if old_key == key else None, old_value)
+
+    def get_or_compute(self, key, compute):
+        """get(key), or compute(), cache and return it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def _spill(self, key, data, value):
+        if self.spill_dir is None:
+            return
+        try:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            path = self._spill_path(key)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(data if data is not None else pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+            os.replace(tmp, path)
+            with self._lock:
+                self._stats["spilled"] += 1
+            self._trim_spill()
+        except OSError:
+            pass  # Disk spill is best effort; the entry is simply recomputed later
+
+    def _read_spilled(self, key):
+        if self.spill_dir is None:
+            return None
+        path = self._spill_path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # Keep recently used files out of the trim
+            return pickle.loads(data)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _trim_spill(self):
+        files = []
+        for path in self.spill_dir.glob("*.pkl"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_spill_bytes:
+                break
+            with contextlib.suppress(OSError):
+                path.unlink()
+            total -= size
+
+    def clear(self):
+        """Drop every entry, in memory and spilled."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.spill_dir is not None and self.spill_dir.exists():
+            for path in self.spill_dir.glob("*.pkl"):
+                with contextlib.suppress(OSError):
+                    path.unlink()
+
+    def stats(self):
+        """Hit/miss/eviction counters and the current size."""
+        with self._lock:
+            return dict(self._stats, name=self.name, entries=len(self._entries),
+                        bytes=self._bytes, max_bytes=self.max_bytes)
+
+
+# Parsed upload previews and sheet lists, keyed by (kind, file digest, ...)
+upload_cache = ContentCache("uploads", UPLOAD_CACHE_BYTES, SPILL_DIR if SPILL_ENABLED else None)
+
+# Grading results, keyed by file digest, reading options and answer key fingerprint
+result_cache = ContentCache("results", RESULT_CACHE_BYTES, SPILL_DIR if SPILL_ENABLED else None)
@@ -0,0 +1,97 @@
+"""
+Micro-benchmarks for the database layer.
+Run with: python scripts/bench_database.py
+
+Uses a throwaway database in a temporary directory, so data/grader.db is not touched
+(beyond being created by the module import).
+"""
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules import database as db
+
+
+def timed(label, func, iterations):
+    """Run func iterations times and print the per-call cost."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<45} {elapsed * 1e6 / iterations:>10.1f} us/call  ({iterations} calls)")
+    return elapsed
+
+
+@contextmanager
+def unpooled_connection():
+    """The pre-pool behaviour: mkdir + connect + close on every call."""
+    db.ensure_db_dir()
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def bench_connections(iterations=2000):
+    """Per-call overhead of get_connection() with and without pooling."""
+    print("== Connection overhead ==")
+    class_id = db.add_class("Benchmark Class")
+
+    def unpooled():
+        with unpooled_connection() as conn:
+            conn.execute("SELECT * FROM classes WHERE id = ?", (class_id,)).fetchone()
+
+    def pooled():
+        with db.get_connection() as conn:
+            conn.execute("SELECT * FROM classes WHERE id = ?", (class_id,)).fetchone()
+
+    before = timed("connect per call (before)", unpooled, iterations)
+    after = timed("pooled get_connection() (after)", pooled, iterations)
+    print(f"speedup: {before / after:.1f}x")
+    timed("cached get_class_by_id()", lambda: db.get_class_by_id(class_id), iterations)
+    print()
+
+
+def bench_bulk_writes(rows=20000):
+    """Import a large roster and grade file through the bulk helpers."""
+    print("== Bulk writes ==")
+    class_id = db.add_class("Bulk Class")
+    assignment_id = db.add_assignment("Bulk Exam", class_id)
+    roster = [{"name": f"Student {i}", "student_id": str(100000 + i), "email": None} for i in range(rows)]
+
+    start = time.perf_counter()
+    report = db.bulk_add_students(roster, class_id)
+    print(f"bulk_add_students({rows}):  {time.perf_counter() - start:.3f}s  "
+          f"({len(report['inserted'])} inserted, {len(report['rejected'])} rejected)")
+
+    students = db.get_students_by_class(class_id)
+    grades = [{"student_id": s['id'], "assignment_id": assignment_id, "points": i % 100}
+              for i, s in enumerate(students)]
+    for label in ("insert", "update"):
+        start = time.perf_counter()
+        report = db.bulk_set_grades(grades)
+        print(f"bulk_set_grades({rows}) {label}:  {time.perf_counter() - start:.3f}s  "
+              f"({len(report['inserted'])} inserted, {len(report['updated'])} updated)")
+    print()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_DIR = Path(tmp)
+        db.DB_PATH = db.DB_DIR / "bench.db"
+        db.init_db()
+        bench_connections()
+        bench_bulk_writes()
+        db.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Micro-benchmarks for the auto-grading engine.
+Run with: python scripts/bench_grading.py
+"""
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.docx_ingest import extract_submissions
+from modules.grading import grade_responses
+from modules.item_analysis import analyze_items
+from modules.roster import RosterIndex
+
+
+def make_responses(students, questions, seed=0):
+    """A synthetic multiple-choice response sheet and matching answer key."""
+    rng = np.random.default_rng(seed)
+    key = [{'question_num': q, 'correct_answer': "ABCD"[q % 4], 'points': 1.0, 'question_type': 'multiple_choice'}
+           for q in range(1, questions + 1)]
+    responses = pd.DataFrame(rng.choice(list("ABCDE"), (students, questions)),
+                             columns=[f"q{q}" for q in range(1, questions + 1)])
+    responses.insert(0, "student_name", [f"Student {i}" for i in range(students)])
+    return responses, key
+
+
+def bench_grade_responses(students=10000, questions=100):
+    """Grade a full response sheet, then materialize one student's details."""
+    print("== grade_responses ==")
+    responses, key = make_responses(students, questions)
+    start = time.perf_counter()
+    results = grade_responses(responses, "student_name", None, key, {"max_points": 100})
+    print(f"grade_responses({students} x {questions}):  {time.perf_counter() - start:.3f}s")
+    start = time.perf_counter()
+    list(results[0]['details'])
+    print(f"one student's details:  {(time.perf_counter() - start) * 1e6:.1f} us")
+    print()
+
+
+def bench_parallel(students=300000, questions=100):
+    """In-process vs process-pool grading of a department-wide response sheet."""
+    print("== Parallel grading ==")
+    responses, key = make_responses(students, questions)
+    timings = {}
+    for workers in sorted({1, os.cpu_count() or 1, 4}):
+        start = time.perf_counter()
+        grade_responses(responses, "student_name", None, key, {"max_points": 100}, workers=workers)
+        timings[workers] = time.perf_counter() - start
+        print(f"grade_responses({students} x {questions}, workers={workers}):  {timings[workers]:.3f}s")
+    print()
+
+
+def bench_item_analysis(students=100000, questions=200):
+    """Item statistics, distractors and KR-20 for a large graded sheet."""
+    print("== Item analysis ==")
+    responses, key = make_responses(students, questions)
+    results = grade_responses(responses, "student_name", None, key, {"max_points": 100})
+    start = time.perf_counter()
+    analyze_items(results)
+    print(f"analyze_items({students} x {questions}):  {time.perf_counter() - start:.3f}s")
+    print()
+
+
+def bench_roster_matching(roster_size=5000, unmatched=3000, seed=0):
+    """Rank candidates for misspelled and reordered names against a large roster."""
+    print("== Roster matching ==")
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+
+    def word():
+        return "".join(rng.choice(letters, rng.integers(4, 10))).title()
+
+    students = [{'id': i, 'name': f"{word()} {word()}", 'student_id': None} for i in range(roster_size)]
+    start = time.perf_counter()
+    roster = RosterIndex(students)
+    print(f"RosterIndex({roster_size} students):  {time.perf_counter() - start:.3f}s")
+    names = []
+    for student in rng.choice(students, unmatched):
+        first, last = student['name'].split()
+        names.append(f"{last}, {first[:-1]}")
+    start = time.perf_counter()
+    roster.suggest(names)
+    elapsed = time.perf_counter() - start
+    print(f"suggest({unmatched} names):  {elapsed:.3f}s ({elapsed / unmatched * 1e6:.0f} us per name)")
+    print()
+
+
+def bench_docx_extraction(documents=500):
+    """Extract answers from a zip of copies of the sample .docx submission."""
+    print("== DOCX submissions ==")
+    sample = Path(__file__).resolve().parent.parent / "samples" / "Sample Student Solution.docx"
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = Path(tmp) / "submissions.zip"
+        with zipfile.ZipFile(archive, "w") as zf:
+            for i in range(documents):
+                zf.write(sample, f"student_{i:04d}.docx")
+        for workers in (1, os.cpu_count() or 1):
+            start = time.perf_counter()
+            responses, _ = extract_submissions(archive, workers=workers)
+            print(f"extract_submissions({len(responses)} files, workers={workers}):  "
+                  f"{time.perf_counter() - start:.3f}s")
+    print()
+
+
+def main():
+    bench_grade_responses()
+    bench_parallel()
+    bench_item_analysis()
+    bench_roster_matching()
+    bench_docx_extraction()
+
+
+if __name__ == "__main__":
+    main()
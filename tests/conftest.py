@@ -1,5 +1,5 @@
 """
-Pytest configuration and fixtures for Playwright tests.
+Pytest configuration and fixtures for the Playwright and unit tests.
 """
 import pytest
 from pathlib import Path
@@ -19,3 +19,16 @@ def browser_context_args(browser_context_args):
         "viewport": {"width": 1280, "height": 720},
         "ignore_https_errors": True,
     }
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point the database module at a fresh database file."""
+    from modules import database as db
+
+    monkeypatch.setattr(db, "DB_DIR", tmp_path)
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "test.db")
+    db.close_all_connections()
+    db.init_db()
+    yield db
+    db.close_all_connections()
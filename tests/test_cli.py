@@ -0,0 +1,71 @@
+"""
+Unit tests for the headless auto-grading command.
+Run with: pytest tests/test_cli.py -v
+"""
+import json
+import subprocess
+import sys
+import zipfile
+from pathlib import Path
+
+from modules import database as db
+from tests.test_docx_ingest import make_docx
+from tests.test_ingest import make_response_folder
+import autograde_cli
+
+
+class TestCommandLine:
+    """Tests for autograde_cli.main()."""
+
+    def test_folder_summary(self, temp_db, tmp_path):
+        assignment_id, ids, folder = make_response_folder(tmp_path)
+        (folder / "broken.csv").unlink()
+        output = tmp_path / "summary.json"
+
+        code = autograde_cli.main([str(assignment_id), str(folder), "--workers", "1", "--dry-run",
+                                   "--db", str(db.DB_PATH), "--output", str(output)])
+
+        summary = json.loads(output.read_text())
+        assert code == 0
+        assert summary['totals'] == {'files': 2, 'failed': 0, 'rows': 4, 'graded': 4,
+                                     'inserted': 0, 'updated': 0, 'rejected': 0}
+        assert [f['average_percentage'] for f in summary['files']] == [75.0, 75.0]
+        assert db.get_grade(ids["Alice"], assignment_id) is None
+
+    def test_docx_zip_detected(self, temp_db, tmp_path):
+        class_id = db.add_class("Biology")
+        assignment_id = db.add_assignment("Lab 1", class_id, max_points=10)
+        db.set_answer_key(assignment_id, [
+            {'question_num': 1, 'correct_answer': 'mitochondria', 'points': 1.0, 'question_type': 'short_text'},
+        ])
+        archive = tmp_path / "lab1.zip"
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("Alice.docx", make_docx(["Question 1", "Mitochondria"]))
+            zf.writestr("Zed.docx", make_docx(["Question 1", "Nucleus"]))
+        output = tmp_path / "summary.json"
+
+        code = autograde_cli.main([str(assignment_id), str(archive), "--dry-run",
+                                   "--db", str(db.DB_PATH), "--output", str(output)])
+
+        summary = json.loads(output.read_text())
+        assert code == 0
+        assert summary['totals']['graded'] == 2
+        assert summary['files'][0]['average_percentage'] == 50.0
+
+    def test_db_option_is_the_only_database_opened(self, tmp_path):
+        script = (
+            "import json, sqlite3, sys\n"
+            "opened = set()\n"
+            "connect = sqlite3.connect\n"
+            "sqlite3.connect = lambda path, *a, **k: opened.add(str(path)) or connect(path, *a, **k)\n"
+            "import autograde_cli\n"
+            "autograde_cli.main(sys.argv[1:])\n"
+            "print(json.dumps(sorted(opened)))\n"
+        )
+        other = tmp_path / "other.db"
+        run = subprocess.run([sys.executable, "-c", script, "1", str(tmp_path), "--db", str(other),
+                              "--output", str(tmp_path / "summary.json")],
+                             cwd=Path(__file__).parent.parent, capture_output=True, text=True, check=True)
+
+        assert json.loads(run.stdout) == [str(other)]
+        assert other.exists()
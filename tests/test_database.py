@@ -0,0 +1,552 @@
+"""
+Unit tests for the database module.
+Run with: pytest tests/test_database.py -v
+"""
+import threading
+from pathlib import Path
+
+import pytest
+
+from modules import database as db
+
+
+class TestConnectionPool:
+    """Tests for the per-thread connection pool."""
+
+    def test_connection_reused_within_thread(self, temp_db):
+        with db.get_connection() as first:
+            pass
+        with db.get_connection() as second:
+            pass
+        assert first is second
+
+    def test_threads_get_separate_connections(self, temp_db):
+        with db.get_connection() as main_conn:
+            pass
+        seen = []
+
+        def worker():
+            with db.get_connection() as conn:
+                seen.append(conn)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        assert seen[0] is not main_conn
+
+    def test_error_rolls_back(self, temp_db):
+        with pytest.raises(RuntimeError):
+            with db.get_connection() as conn:
+                conn.execute("INSERT INTO classes (name) VALUES ('Rolled Back')")
+                raise RuntimeError("boom")
+        assert db.get_all_classes() == []
+
+    def test_nested_blocks_share_transaction(self, temp_db):
+        with pytest.raises(RuntimeError):
+            with db.get_connection():
+                db.add_class("Inner")
+                raise RuntimeError("boom")
+        assert db.get_all_classes() == []
+
+    def test_closed_pool_reopens(self, temp_db):
+        db.add_class("Math 101")
+        db.close_all_connections()
+        assert [c['name'] for c in db.get_all_classes()] == ["Math 101"]
+
+
+class TestGradebookMatrix:
+    """Tests for get_gradebook_matrix()."""
+
+    def test_matrix_is_dense(self, temp_db):
+        class_id = db.add_class("Math 101")
+        other_class = db.add_class("Physics")
+        alice = db.add_student("Alice", class_id, "1")
+        bob = db.add_student("Bob", class_id, "2")
+        db.add_student("Carol", other_class, "3")
+        hw1 = db.add_assignment("HW1", class_id, max_points=10)
+        hw2 = db.add_assignment("HW2", class_id, max_points=20)
+        db.set_grade(alice, hw1, 8, "good")
+
+        matrix = db.get_gradebook_matrix(class_id)
+
+        assert [s['name'] for s in matrix['students']] == ["Alice", "Bob"]
+        assert [a['name'] for a in matrix['assignments']] == ["HW1", "HW2"]
+        assert set(matrix['grades']) == {(alice, hw1), (alice, hw2), (bob, hw1), (bob, hw2)}
+        assert matrix['grades'][(alice, hw1)]['points'] == 8
+        assert matrix['grades'][(alice, hw1)]['comments'] == "good"
+        assert matrix['grades'][(bob, hw2)] is None
+        assert matrix['grades'][(alice, hw1)] == db.get_grade(alice, hw1)
+
+
+class TestWalStorage:
+    """Tests for the opt-in WAL storage mode."""
+
+    @pytest.fixture
+    def wal_db(self, temp_db):
+        db.configure_storage("wal")
+        db.init_db()
+        yield db
+        db.configure_storage("default")
+
+    def test_wal_enabled(self, wal_db):
+        assert db.get_storage_info()['journal_mode'] == "wal"
+
+    def test_switching_back_to_default_leaves_wal(self, wal_db):
+        db.add_class("Math 101")
+        db.configure_storage("default")
+
+        info = db.get_storage_info()
+        assert (info['mode'], info['journal_mode']) == ("default", "delete")
+        assert not Path(f"{db.DB_PATH}-wal").exists()
+        assert [c['name'] for c in db.get_all_classes()] == ["Math 101"]
+
+    def test_writes_visible_to_readers(self, wal_db):
+        class_id = db.add_class("Math 101")
+        assert db.get_class_by_id(class_id)['name'] == "Math 101"
+
+    def test_nested_write_rolls_back(self, wal_db):
+        with pytest.raises(RuntimeError):
+            with db.get_write_connection():
+                db.add_class("Inner")
+                raise RuntimeError("boom")
+        assert db.get_all_classes() == []
+
+    def test_concurrent_writers_are_serialized(self, wal_db):
+        class_id = db.add_class("Math 101")
+        errors = []
+
+        def writer(n):
+            try:
+                for i in range(20):
+                    db.add_student(f"Student {n}-{i}", class_id, f"{n}-{i}")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert db.get_student_count_by_class(class_id) == 160
+
+    def test_checkpoint(self, wal_db):
+        db.add_class("Math 101")
+        result = db.checkpoint("TRUNCATE")
+        assert result['busy'] is False
+        assert db.get_storage_info()['wal_bytes'] == 0
+
+
+class TestMigrations:
+    """Tests for the versioned schema migrations."""
+
+    def test_fresh_database_is_current(self, temp_db):
+        with db.get_connection() as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"idx_students_class", "idx_assignments_class", "idx_grades_assignment"} <= indexes
+
+    def test_legacy_database_is_upgraded(self, tmp_path, monkeypatch):
+        import sqlite3
+        path = tmp_path / "legacy.db"
+        legacy = sqlite3.connect(path)
+        legacy.executescript("""
+            CREATE TABLE classes (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE,
+                                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+            CREATE TABLE students (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL,
+                                   class_id INTEGER NOT NULL, email TEXT,
+                                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+            INSERT INTO classes (name) VALUES ('Math 101');
+            INSERT INTO students (name, class_id) VALUES ('Alice', 1), ('Bob', 1);
+        """)
+        legacy.execute("ALTER TABLE students ADD COLUMN student_id TEXT")
+        legacy.execute("UPDATE students SET student_id = '42'")
+        legacy.commit()
+        legacy.close()
+
+        monkeypatch.setattr(db, "DB_DIR", tmp_path)
+        monkeypatch.setattr(db, "DB_PATH", path)
+        db.close_all_connections()
+        db.init_db()
+        db.init_db()
+
+        students = db.get_students_by_class(1)
+        assert [(s['name'], s['student_id']) for s in students] == [("Alice", "42"), ("Bob", None)]
+        with pytest.raises(sqlite3.IntegrityError):
+            db.add_student("Carol", 1, "42")
+        db.close_all_connections()
+
+
+    def test_answer_keys_gain_matcher_config(self, temp_db):
+        class_id = db.add_class("Math 101")
+        hw1 = db.add_assignment("HW1", class_id)
+        db.set_answer_key(hw1, [{"question_num": 1, "correct_answer": "A"}])
+        with db.get_write_connection() as conn:
+            conn.execute("ALTER TABLE answer_keys DROP COLUMN matcher_config")
+            conn.execute("PRAGMA user_version = 7")
+        db.close_all_connections()
+        db.init_db()
+
+        assert db.get_answer_key(hw1)[0]['matcher_config'] is None
+        with db.get_connection() as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+
+    def test_existing_answer_keys_become_version_one(self, temp_db):
+        class_id = db.add_class("Math 101")
+        alice = db.add_student("Alice", class_id)
+        hw1 = db.add_assignment("HW1", class_id)
+        db.set_answer_key(hw1, [{"question_num": 1, "correct_answer": "A"}, {"question_num": 2, "correct_answer": "B"}])
+        db.bulk_save_responses(hw1, [(alice, {1: "A"}, 1.0)])
+        with db.get_write_connection() as conn:
+            conn.execute("DROP TABLE answer_key_versions")
+            conn.execute("ALTER TABLE answer_keys DROP COLUMN version")
+            conn.execute("ALTER TABLE responses DROP COLUMN key_version")
+            conn.execute("PRAGMA user_version = 8")
+        db.close_all_connections()
+        db.init_db()
+
+        assert db.get_answer_key_version(hw1) == 1
+        assert [q['version'] for q in db.get_answer_key(hw1)] == [1, 1]
+        assert db.get_answer_key_history(hw1)[0]['added'] == [1, 2]
+        assert db.get_responses(hw1)[0]['key_version'] == 1
+
+
+class TestBulkWrites:
+    """Tests for the batched bulk write helpers and their reports."""
+
+    def test_bulk_add_students_report(self, temp_db):
+        class_id = db.add_class("Math 101")
+        db.add_student("Existing", class_id, "1")
+        report = db.bulk_add_students([
+            {"name": "Alice", "student_id": 2.0, "email": float("nan")},
+            {"name": "Bob", "student_id": "1"},
+            {"name": float("nan"), "student_id": "3"},
+            {"name": "Carol", "student_id": "2"},
+            {"name": "Dave"},
+        ], class_id)
+
+        assert report['inserted'] == [0, 4]
+        assert [r['row'] for r in report['rejected']] == [1, 2, 3]
+        students = {s['name']: s for s in db.get_students_by_class(class_id)}
+        assert students['Alice']['student_id'] == "2"
+        assert students['Alice']['email'] is None
+        assert "Dave" in students
+
+    def test_bulk_set_grades_report(self, temp_db):
+        class_id = db.add_class("Math 101")
+        other_class = db.add_class("Physics")
+        alice = db.add_student("Alice", class_id)
+        bob = db.add_student("Bob", class_id)
+        outsider = db.add_student("Carol", other_class)
+        hw1 = db.add_assignment("HW1", class_id)
+        db.set_grade(alice, hw1, 50)
+
+        report = db.bulk_set_grades([
+            {"student_id": alice, "assignment_id": hw1, "points": 90},
+            {"student_id": bob, "assignment_id": hw1, "points": 70, "comments": "late"},
+            {"student_id": outsider, "assignment_id": hw1, "points": 60},
+            {"student_id": 999, "assignment_id": hw1, "points": 60},
+            {"student_id": bob, "assignment_id": hw1, "points": 75},
+        ])
+
+        assert report['updated'] == [0]
+        assert report['inserted'] == [4]
+        assert [(r['row'], r['reason']) for r in report['rejected']] == [
+            (1, "superseded by row 4"),
+            (2, "student is not in the assignment's class"),
+            (3, "student not found"),
+        ]
+        assert db.get_grade(alice, hw1)['points'] == 90
+        assert db.get_grade(bob, hw1)['points'] == 75
+        assert db.get_grade(outsider, hw1) is None
+
+    def test_set_answer_key_report(self, temp_db):
+        class_id = db.add_class("Math 101")
+        hw1 = db.add_assignment("HW1", class_id)
+        report = db.set_answer_key(hw1, [
+            {"question_num": 1, "correct_answer": "A"},
+            {"question_num": 2, "correct_answer": "  "},
+            {"question_num": 3, "correct_answer": "C", "points": 2},
+        ])
+        assert report['inserted'] == [0, 2]
+        assert report['rejected'] == [{"row": 1, "reason": "missing correct answer"}]
+        key = db.get_answer_key(hw1)
+        assert [(q['question_num'], q['correct_answer'], q['points']) for q in key] == [(1, "A", 1.0), (3, "C", 2.0)]
+
+    def test_set_answer_key_writes_only_changes(self, temp_db):
+        class_id = db.add_class("Math 101")
+        hw1 = db.add_assignment("HW1", class_id)
+        key = [{"question_num": 1, "correct_answer": "A"}, {"question_num": 2, "correct_answer": "B"},
+               {"question_num": 3, "correct_answer": "C"}]
+        first = db.set_answer_key(hw1, key)
+        ids = {q['question_num']: q['id'] for q in db.get_answer_key(hw1)}
+
+        second = db.set_answer_key(hw1, [key[0], dict(key[1], points=2), {"question_num": 4, "correct_answer": "D"}])
+        unchanged = db.set_answer_key(hw1, [key[0], dict(key[1], points=2.0), {"question_num": 4, "correct_answer": "D"}])
+
+        assert (first['version'], second['version'], unchanged['version']) == (1, 2, 2)
+        assert (second['inserted'], second['updated']) == ([2], [1])
+        assert (unchanged['inserted'], unchanged['updated']) == ([], [])
+        assert second['diff'] == {"added": [4], "changed": [2], "removed": [3]}
+        assert unchanged['diff'] == {"added": [], "changed": [], "removed": []}
+        stored = db.get_answer_key(hw1)
+        assert [(q['question_num'], q['version']) for q in stored] == [(1, 1), (2, 2), (4, 2)]
+        # Unchanged questions keep their rows
+        assert stored[0]['id'] == ids[1] and stored[1]['id'] == ids[2]
+
+        db.delete_answer_key(hw1)
+        assert db.get_answer_key_version(hw1) == 3
+        assert [v['removed'] for v in db.get_answer_key_history(hw1)] == [[], [3], [1, 2, 4]]
+
+    def test_set_answer_key_matcher_config(self, temp_db):
+        class_id = db.add_class("Math 101")
+        hw1 = db.add_assignment("HW1", class_id)
+        report = db.set_answer_key(hw1, [
+            {"question_num": 1, "correct_answer": "9.8", "question_type": "numeric",
+             "matcher_config": {"relative": 0.05, "tolerance": 0}},
+            {"question_num": 2, "correct_answer": "B", "matcher_config": '{"accept": ["D"]}'},
+            {"question_num": 3, "correct_answer": "C", "matcher_config": "[1, 2]"},
+            {"question_num": 4, "correct_answer": "D", "matcher_config": ""},
+        ])
+        assert report['rejected'] == [{"row": 2, "reason": "invalid matcher configuration"}]
+        configs = [q['matcher_config'] for q in db.get_answer_key(hw1)]
+        assert configs == ['{"relative":0.05,"tolerance":0}', '{"accept":["D"]}', None]
+
+
+class TestReadCache:
+    """Tests for the read-through cache and its invalidation."""
+
+    def test_repeated_reads_hit_cache(self, temp_db):
+        class_id = db.add_class("Math 101")
+        db.get_students_by_class(class_id)
+        before = db.get_cache_stats()
+        db.get_students_by_class(class_id)
+        after = db.get_cache_stats()
+        assert after['hits'] == before['hits'] + 1
+        assert after['misses'] == before['misses']
+
+    def test_write_invalidates_only_its_tables(self, temp_db):
+        class_id = db.add_class("Math 101")
+        assert db.get_students_by_class(class_id) == []
+        db.get_assignments_by_class(class_id)
+        db.add_student("Alice", class_id)
+        hits = db.get_cache_stats()['hits']
+
+        assert [s['name'] for s in db.get_students_by_class(class_id)] == ["Alice"]
+        db.get_assignments_by_class(class_id)
+        assert db.get_cache_stats()['hits'] == hits + 1
+
+    def test_results_are_copies(self, temp_db):
+        db.add_class("Math 101")
+        db.get_all_classes()[0]['name'] = "Changed"
+        assert db.get_all_classes()[0]['name'] == "Math 101"
+
+    def test_nested_results_are_copies(self, temp_db):
+        class_id = db.add_class("Math 101")
+        assignment_id = db.add_assignment("Quiz", class_id, max_points=10)
+        db.set_answer_key(assignment_id, [{'question_num': 1, 'correct_answer': 'A'}])
+        db.get_answer_key_history(assignment_id)[0]['added'].append(99)
+        assert db.get_answer_key_history(assignment_id)[0]['added'] == [1]
+
+    def test_rolled_back_write_is_not_cached(self, temp_db):
+        with pytest.raises(RuntimeError):
+            with db.get_connection():
+                db.add_class("Rolled Back")
+                assert len(db.get_all_classes()) == 1
+                raise RuntimeError("boom")
+        assert db.get_all_classes() == []
+
+    def test_reads_see_own_uncommitted_writes(self, temp_db):
+        class_id = db.add_class("Math 101")
+        assert db.get_students_by_class(class_id) == []
+        with db.get_write_connection("students"):
+            db.add_student("Alice", class_id)
+            assert [s['name'] for s in db.get_students_by_class(class_id)] == ["Alice"]
+        assert [s['name'] for s in db.get_students_by_class(class_id)] == ["Alice"]
+
+    def test_lru_bound(self, temp_db, monkeypatch):
+        monkeypatch.setattr(db, "CACHE_MAX_ENTRIES", 3)
+        for class_id in range(10):
+            db.get_class_by_id(class_id)
+        stats = db.get_cache_stats()
+        assert stats['entries'] == 3
+        assert stats['evictions'] >= 7
+
+
+class TestStudentStats:
+    """Tests for the trigger-maintained student_course_stats table."""
+
+    def expected_average(self, student_id, class_id):
+        """The gradebook's weighted average, computed from raw grades."""
+        total_weighted = total_weight = 0
+        for a in db.get_assignments_by_class(class_id):
+            grade = db.get_grade(student_id, a['id'])
+            if grade and grade['points'] is not None:
+                total_weighted += grade['points'] / a['max_points'] * 100 * a['weight']
+                total_weight += a['weight']
+        return total_weighted / total_weight if total_weight else None
+
+    def test_stats_follow_writes(self, temp_db):
+        class_id = db.add_class("Math 101")
+        alice = db.add_student("Alice", class_id)
+        bob = db.add_student("Bob", class_id)
+        hw1 = db.add_assignment("HW1", class_id, max_points=10, weight=1)
+        exam = db.add_assignment("Exam", class_id, max_points=50, weight=3)
+
+        assert db.get_student_stats_by_class(class_id)[alice]['average'] is None
+
+        db.set_grade(alice, hw1, 8)
+        db.bulk_set_grades([
+            {"student_id": alice, "assignment_id": exam, "points": 40},
+            {"student_id": bob, "assignment_id": exam, "points": 25},
+        ])
+        db.update_assignment(exam, "Exam", max_points=40, weight=2)
+        db.set_grade(bob, hw1, None)
+
+        stats = db.get_student_stats_by_class(class_id)
+        assert stats[alice]['average'] == pytest.approx(self.expected_average(alice, class_id))
+        assert stats[bob]['average'] == pytest.approx(self.expected_average(bob, class_id))
+        assert stats[alice]['graded_count'] == 2
+        assert stats[bob]['graded_count'] == 1
+
+        db.delete_assignment(exam)
+        db.delete_student(bob)
+        stats = db.get_student_stats_by_class(class_id)
+        assert set(stats) == {alice}
+        assert stats[alice]['average'] == pytest.approx(80.0)
+        assert db.get_class_overview()[0]['average'] == pytest.approx(80.0)
+
+    def test_rebuild(self, temp_db):
+        class_id = db.add_class("Math 101")
+        alice = db.add_student("Alice", class_id)
+        hw1 = db.add_assignment("HW1", class_id, max_points=10)
+        db.set_grade(alice, hw1, 7)
+        with db.get_write_connection() as conn:
+            conn.execute("UPDATE student_course_stats SET weighted_sum = 0")
+        assert db.rebuild_student_stats() == 1
+        assert db.get_student_stats_by_class(class_id)[alice]['average'] == pytest.approx(70.0)
+
+
+class TestIntegrityAndCompaction:
+    """Tests for foreign key enforcement, the orphan sweep and compaction."""
+
+    def test_delete_class_cascades(self, temp_db):
+        class_id = db.add_class("Math 101")
+        alice = db.add_student("Alice", class_id)
+        hw1 = db.add_assignment("HW1", class_id)
+        db.set_grade(alice, hw1, 90)
+        db.set_answer_key(hw1, [{"question_num": 1, "correct_answer": "A"}])
+
+        db.delete_class(class_id)
+
+        with db.get_connection() as conn:
+            for table in ("students", "assignments", "grades", "answer_keys", "student_course_stats"):
+                assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0
+
+    def test_orphan_sweep_migration(self, temp_db):
+        class_id = db.add_class("Math 101")
+        alice = db.add_student("Alice", class_id)
+        hw1 = db.add_assignment("HW1", class_id)
+        db.set_grade(alice, hw1, 90)
+        with db.get_write_connection() as conn:
+            conn.execute("PRAGMA user_version = 4")
+        # Simulate a delete made while foreign keys were not enforced
+        with db._schema_connection() as conn:
+            conn.execute("DELETE FROM students")
+        db.init_db()
+        assert db.get_grade(alice, hw1) is None
+        with db.get_connection() as conn:
+            assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+
+    def test_new_database_is_incremental(self, temp_db):
+        with db.get_connection() as conn:
+            assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+    def test_compaction_reclaims_pages(self, temp_db):
+        class_id = db.add_class("Math 101")
+        db.bulk_add_students([{"name": "x" * 500, "student_id": str(i)} for i in range(2000)], class_id)
+        with db.get_write_connection("students") as conn:
+            conn.execute("DELETE FROM students")
+        with db.get_connection() as conn:
+            assert conn.execute("PRAGMA freelist_count").fetchone()[0] > 0
+
+        result = None
+        for _ in range(100):
+            result = db.compact_database()
+            if result['free_pages'] == 0 and result['analyzed']:
+                break
+        assert result['incremental']
+        assert result['free_pages'] == 0
+        assert result['analyzed']
+
+
+class TestClassOverview:
+    """Tests for get_class_overview()."""
+
+    def test_overview_counts(self, temp_db):
+        math = db.add_class("Math 101")
+        db.add_class("Art")
+        alice = db.add_student("Alice", math)
+        bob = db.add_student("Bob", math)
+        hw1 = db.add_assignment("HW1", math, max_points=10)
+        db.add_assignment("HW2", math, max_points=10)
+        db.set_grade(alice, hw1, 5)
+        db.set_grade(bob, hw1, 10)
+
+        art, math_row = db.get_class_overview()
+
+        assert (art['name'], art['student_count'], art['assignment_count'], art['completion']) == ("Art", 0, 0, 0.0)
+        assert art['average'] is None
+        assert math_row['student_count'] == 2
+        assert math_row['assignment_count'] == 2
+        assert math_row['graded_count'] == 2
+        assert math_row['completion'] == pytest.approx(0.5)
+        assert math_row['average'] == pytest.approx(75.0)
+
+
+class TestDashboardCounters:
+    """Tests for the trigger-maintained counters behind get_total_counts()."""
+
+    def raw_counts(self):
+        with db.get_connection() as conn:
+            return {
+                "classes": conn.execute("SELECT COUNT(*) FROM classes").fetchone()[0],
+                "students": conn.execute("SELECT COUNT(*) FROM students").fetchone()[0],
+                "assignments": conn.execute("SELECT COUNT(*) FROM assignments").fetchone()[0],
+                "grades": conn.execute("SELECT COUNT(*) FROM grades WHERE points IS NOT NULL").fetchone()[0],
+            }
+
+    def test_counters_follow_writes(self, temp_db):
+        assert db.get_total_counts() == {"classes": 0, "students": 0, "assignments": 0, "grades": 0}
+
+        math = db.add_class("Math 101")
+        art = db.add_class("Art")
+        alice = db.add_student("Alice", math)
+        bob = db.add_student("Bob", math)
+        db.bulk_add_students([{"name": "Cara"}, {"name": "Dan"}], art)
+        hw1 = db.add_assignment("HW1", math)
+        hw2 = db.add_assignment("HW2", math)
+        db.set_grade(alice, hw1, 90)
+        db.set_grade(bob, hw1, None)
+        db.bulk_set_grades([
+            {"student_id": bob, "assignment_id": hw1, "points": 70},
+            {"student_id": alice, "assignment_id": hw2, "points": 80},
+        ])
+        assert db.get_total_counts() == self.raw_counts()
+        assert db.get_total_counts()['grades'] == 3
+
+        db.set_grade(alice, hw2, None)
+        db.delete_student(bob)
+        db.delete_class(art)
+        assert db.get_total_counts() == self.raw_counts()
+        assert db.get_total_counts() == {"classes": 1, "students": 1, "assignments": 2, "grades": 1}
+
+    def test_rebuild_repairs_drift(self, temp_db):
+        class_id = db.add_class("Math 101")
+        db.add_student("Alice", class_id)
+        with db.get_write_connection("classes", "students") as conn:
+            conn.execute("UPDATE counters SET value = 99")
+
+        db.rebuild_student_stats()
+        assert db.get_total_counts() == self.raw_counts()
@@ -0,0 +1,83 @@
+"""
+Unit tests for extracting answers from .docx submissions.
+Run with: pytest tests/test_docx_ingest.py -v
+"""
+import io
+import zipfile
+from xml.sax.saxutils import escape
+
+import pandas as pd
+
+from modules import database as db
+from modules.docx_ingest import extract_answers, extract_submissions
+from modules.grading_service import grade_submissions
+
+
+def make_docx(paragraphs):
+    """A minimal .docx holding the given paragraphs; tabs become Word tab elements."""
+    body = "".join(
+        "<w:p><w:r>" + "<w:tab/>".join(f'<w:t xml:space="preserve">{escape(part)}</w:t>' for part in text.split("\t"))
+        + "</w:r></w:p>"
+        for text in paragraphs
+    )
+    document = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f'<w:body>{body}</w:body></w:document>')
+    upload = io.BytesIO()
+    with zipfile.ZipFile(upload, "w") as archive:
+        archive.writestr("[Content_Types].xml", "<Types/>")
+        archive.writestr("word/document.xml", document)
+    return upload.getvalue()
+
+
+class TestDocxSubmissions:
+    """Tests for extracting answers from .docx submissions."""
+
+    def test_answers_follow_question_headings(self):
+        document = make_docx(["Homework 1 - Alice", "Question 1", "Mitochondria", "Q2: b",
+                              "Problem 3", "Mean\t5.2", "Question 4 asks for the mean, which is above",
+                              "Appendix", "proc means data=hw1; run;"])
+
+        assert extract_answers(document) == {1: "Mitochondria", 2: "b",
+                                             3: "Mean\t5.2\nQuestion 4 asks for the mean, which is above"}
+
+    def test_folder_and_zip_give_the_same_table(self, tmp_path):
+        folder = tmp_path / "submissions"
+        folder.mkdir()
+        (folder / "Alice.docx").write_bytes(make_docx(["Question 1", "A", "Question 2", "9.8"]))
+        (folder / "Bob.docx").write_bytes(make_docx(["Question 2", "10"]))
+        (folder / "Cara.docx").write_bytes(b"not a zip file")
+        (folder / "~$Alice.docx").write_bytes(b"Word lock file")
+        archive = tmp_path / "submissions.zip"
+        with zipfile.ZipFile(archive, "w") as zf:
+            for path in folder.iterdir():
+                zf.write(path, f"exported/{path.name}")
+
+        from_folder, folder_errors = extract_submissions(folder, workers=2, questions=[1, 2, 3])
+        from_zip, zip_errors = extract_submissions(archive, workers=1, questions=[1, 2, 3])
+
+        pd.testing.assert_frame_equal(from_folder, from_zip)
+        assert list(from_folder.columns) == ["student_name", "file", "q1", "q2", "q3"]
+        assert from_folder.values.tolist() == [["Alice", "Alice.docx", "A", "9.8", None],
+                                               ["Bob", "Bob.docx", None, "10", None]]
+        assert [e['file'] for e in folder_errors] == [e['file'] for e in zip_errors] == ["Cara.docx"]
+
+    def test_grade_submissions_saves_scores(self, temp_db, tmp_path):
+        class_id = db.add_class("Biology")
+        alice = db.add_student("Alice", class_id)
+        assignment_id = db.add_assignment("Lab 1", class_id, max_points=10)
+        db.set_answer_key(assignment_id, [
+            {'question_num': 1, 'correct_answer': 'mitochondria', 'points': 1.0, 'question_type': 'short_text'},
+            {'question_num': 2, 'correct_answer': '9.8', 'points': 1.0, 'question_type': 'numeric'},
+        ])
+        archive = tmp_path / "lab1.zip"
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("Alice.docx", make_docx(["Question 1", "Mitochondria", "Question 2", "9.81"]))
+            zf.writestr("Zed.docx", make_docx(["Question 1", "Nucleus"]))
+
+        summary = grade_submissions(archive, assignment_id, workers=1)
+
+        assert summary['files'][0]['file'] == "lab1.zip"
+        assert summary['totals']['inserted'] == 1
+        assert [r['student'] for r in summary['files'][0]['rejected']] == ["Zed"]
+        assert db.get_grade(alice, assignment_id)['points'] == 10.0
@@ -0,0 +1,204 @@
+"""
+Unit tests for the auto-grading engine.
+Run with: pytest tests/test_grading.py -v
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules import grading, parallel
+from modules.grading import GradingResult, compile_answer_key, grade_responses
+
+
+def make_key(*questions):
+    """Answer key rows from (correct_answer, points, question_type) tuples."""
+    return [
+        {'question_num': i, 'correct_answer': answer, 'points': points, 'question_type': question_type}
+        for i, (answer, points, question_type) in enumerate(questions, start=1)
+    ]
+
+
+class TestGradeResponses:
+    """Tests for grade_responses()."""
+
+    def test_scores_by_question_type(self):
+        key = make_key(("b", 1.0, "multiple_choice"), ("Paris", 2.0, "short_text"), ("3.14", 1.0, "numeric"))
+        responses = pd.DataFrame({
+            "student_name": ["Alice", "Bob"],
+            "q1": [" B ", "c"],
+            "q2": ["paris", "London"],
+            "q3": [3.141, "3.2"],
+        })
+
+        alice, bob = grade_responses(responses, "student_name", None, key, {"max_points": 20})
+
+        assert (alice['raw_score'], alice['max_raw'], alice['scaled_score'], alice['percentage']) == (4.0, 4.0, 20.0, 100.0)
+        assert (bob['raw_score'], bob['scaled_score'], bob['percentage'], bob['correct_count']) == (0.0, 0.0, 0.0, 0)
+        assert list(alice['details'])[0] == {
+            'question': 1, 'student_answer': "B", 'correct_answer': "B",
+            'is_correct': True, 'points_earned': 1.0, 'points_possible': 1.0,
+        }
+        assert [d['student_answer'] for d in bob['details']] == ["C", "LONDON", "3.2"]
+
+    def test_column_naming_conventions_and_positional_fallback(self):
+        key = make_key(("A", 1.0, "multiple_choice"), ("B", 1.0, "multiple_choice"),
+                       ("C", 1.0, "multiple_choice"), ("D", 1.0, "multiple_choice"))
+        responses = pd.DataFrame([["Alice", "D", "A", "B", "C"]],
+                                 columns=["name", "Question 4", "Q1", "question2", "extra"])
+
+        result, = grade_responses(responses, "name", None, key, {"max_points": 4})
+
+        # q3 has no named column, so it falls back to the column at position 3
+        assert [d['student_answer'] for d in result['details']] == ["A", "B", "B", "D"]
+        assert result['correct_count'] == 3
+
+    def test_missing_answers_and_identifiers(self):
+        key = make_key(("A", 1.0, "multiple_choice"), ("1", 1.0, "numeric"))
+        responses = pd.DataFrame({
+            "student_name": ["Alice", None, "  ", None],
+            "student_id": [None, "S2", None, np.nan],
+            "q1": [np.nan, "A", "A", "A"],
+        })
+
+        results = grade_responses(responses, "student_name", "student_id", key, {"max_points": 10})
+
+        assert [(r['student_name'], r['student_id'], r['display_name']) for r in results] == [
+            ("Alice", None, "Alice"), (None, "S2", "ID: S2")]
+        assert [d['student_answer'] for d in results[0]['details']] == ["", ""]
+        assert results[1]['scaled_score'] == 5.0
+
+    def test_matches_per_cell_reference(self):
+        rng = np.random.default_rng(7)
+        key = make_key(*[(answer, float(points), "multiple_choice")
+                         for answer, points in zip(rng.choice(list("ABCD"), 30), rng.integers(1, 4, 30))])
+        answers = rng.choice(["A", "b", " c", "D", None], (200, 30))
+        responses = pd.DataFrame(answers, columns=[f"q{i}" for i in range(1, 31)])
+        responses.insert(0, "student", [f"S{i}" for i in range(200)])
+
+        results = grade_responses(responses, "student", None, key, {"max_points": 100})
+
+        for row, result in zip(answers, results):
+            expected = sum(q['points'] for q, answer in zip(key, row)
+                           if answer is not None and answer.strip().upper() == q['correct_answer'])
+            assert result['raw_score'] == pytest.approx(expected)
+
+
+class TestCompiledAnswerKey:
+    """Tests for compile_answer_key()."""
+
+    def test_reports_unmapped_and_positional_questions(self):
+        key = make_key(("A", 1.0, "multiple_choice"), ("B", 2.0, "multiple_choice"), ("C", 1.0, "multiple_choice"))
+        compiled = compile_answer_key(key, ["name", "Q1", "answer_two"])
+
+        assert compiled.positions == [1, 2, None]
+        assert compiled.unmapped == [3]
+        assert compiled.positional == [2]
+        assert compiled.mapped_columns == {1: "Q1", 2: "answer_two"}
+        assert compiled.max_points == 4.0
+
+    def test_reused_for_same_key_and_header(self):
+        key = make_key(("A", 1.0, "multiple_choice"))
+
+        assert compile_answer_key(key, ["name", "q1"]) is compile_answer_key([dict(q) for q in key], ["name", "q1"])
+        assert compile_answer_key(key, ["name", "q1"]) is not compile_answer_key(key, ["name", "Q1"])
+
+    def test_grades_with_precompiled_key(self):
+        key = make_key(("a", 1.0, "multiple_choice"), ("2.5", 1.0, "numeric"), ("x", 1.0, "essay"))
+        responses = pd.DataFrame({"name": ["Alice"], "q1": ["a"], "q2": ["2.505"], "q3": ["x"]})
+        compiled = compile_answer_key(key, responses.columns)
+
+        result, = grade_responses(responses, "name", None, compiled, {"max_points": 3})
+
+        # Unknown question types are never marked correct
+        assert [d['is_correct'] for d in result['details']] == [True, True, False]
+
+
+class TestParallelGrading:
+    """Tests for process-pool grading of large files."""
+
+    def test_parallel_matches_in_process(self, monkeypatch):
+        monkeypatch.setattr(grading, "PARALLEL_MIN_ROWS", 100)
+        monkeypatch.setattr(grading, "PARALLEL_CHUNK_ROWS", 64)
+        rng = np.random.default_rng(3)
+        key = make_key(*[(answer, 1.0, question_type) for answer, question_type in
+                         zip("ABCD1234", ["multiple_choice"] * 4 + ["numeric"] * 4)])
+        responses = pd.DataFrame(rng.choice(["A", "b", "C", "d", "1", "2.0", "3.001", None], (500, 8)),
+                                 columns=[f"q{i}" for i in range(1, 9)])
+        responses.insert(0, "student", [f"S{i}" for i in range(500)])
+
+        serial = grade_responses(responses, "student", None, key, {"max_points": 8}, workers=1)
+        parallel = grade_responses(responses, "student", None, key, {"max_points": 8}, workers=2)
+
+        assert [r['raw_score'] for r in parallel] == [r['raw_score'] for r in serial]
+        assert list(parallel[-1]['details']) == list(serial[-1]['details'])
+
+    def test_streamed_chunks_graded_in_pool(self, monkeypatch):
+        monkeypatch.setattr(grading, "PARALLEL_MIN_ROWS", 100)
+        pools = []
+        start_pool = parallel.start_pool
+        monkeypatch.setattr(parallel, "start_pool", lambda workers: pools.append(workers) or start_pool(workers))
+        key = make_key(("A", 1.0, "multiple_choice"), ("2", 1.0, "numeric"))
+        responses = pd.DataFrame({"student": [f"S{i}" for i in range(250)],
+                                  "q1": ["A", "b", None, " a ", "C"] * 50, "q2": ["2", "2.0", "3", None, "x"] * 50})
+        chunks = [responses.iloc[start:start + 40] for start in range(0, 250, 40)]
+
+        streamed = list(grading.grade_chunks(chunks, "student", None, key, {"max_points": 2}, workers=2))
+        serial = grade_responses(responses, "student", None, key, {"max_points": 2}, workers=1)
+
+        assert pools == [2]
+        assert [rows for rows, _ in streamed] == [40] * 6 + [10]
+        merged = GradingResult.concat([result for _, result in streamed])
+        assert merged.correct.tolist() == serial.correct.tolist()
+        assert merged.source_rows.tolist() == list(range(250))
+        assert merged.answer_map(3) == serial.answer_map(3) == {1: "A"}
+
+
+class TestGradingResult:
+    """Tests for the columnar GradingResult."""
+
+    def grade(self, rows, **kwargs):
+        key = make_key(("A", 1.0, "multiple_choice"), ("B", 3.0, "multiple_choice"))
+        responses = pd.DataFrame(rows, columns=["name", "q1", "q2"])
+        return grade_responses(responses, "name", None, key, {"max_points": 8}, **kwargs)
+
+    def test_compact_columns_and_summaries(self):
+        result = self.grade([["Alice", "A", "B"], ["Bob", "A", "C"], ["Cara", None, "c"]])
+
+        assert result.correct.dtype == np.int8
+        assert result.raw_scores.dtype == np.float32
+        assert result.answer_codes.dtype == np.int8
+        assert result.scaled_scores.tolist() == [8.0, 2.0, 0.0]
+        assert result.summary_stats() == {'count': 3, 'average': pytest.approx(10 / 3), 'highest': 8.0,
+                                          'lowest': 0.0, 'passing': 1}
+        assert result.summary_frame().to_dict('records')[1] == {
+            "Student": "Bob", "Score": 2.0, "Percentage": "25.0%", "Correct": "1/2"}
+        assert result.details_frame(2)['student_answer'].tolist() == ["", "C"]
+
+    def test_details_are_built_on_demand(self):
+        result = self.grade([["Alice", "A", "B"], ["Bob", "A", "C"]])
+
+        bob = result[-1]
+        assert bob['details']._rows is None
+        assert bob['details'][1]['is_correct'] is False
+        assert bob['details']._rows is not None
+
+    def test_student_dicts_scale_one_row(self, monkeypatch):
+        result = self.grade([["Alice", "A", "B"], ["Bob", "A", "C"], ["Cara", None, "c"]])
+        expected = list(zip(result.scaled_scores.tolist(), result.percentages.tolist()))
+
+        def whole_column(self):
+            raise AssertionError("built the whole column for one row")
+        monkeypatch.setattr(GradingResult, "scaled_scores", property(whole_column))
+        monkeypatch.setattr(GradingResult, "percentages", property(whole_column))
+        assert [(s['scaled_score'], s['percentage']) for s in result] == expected == [(8.0, 100.0), (2.0, 25.0), (0.0, 0.0)]
+
+    def test_concat_recodes_answers(self):
+        first = self.grade([["Alice", "A", "B"]])
+        second = self.grade([["Bob", "x", "B"], ["Cara", "A", None]])
+
+        merged = GradingResult.concat([first, second])
+
+        assert merged.student_names == ["Alice", "Bob", "Cara"]
+        assert merged.raw_scores.tolist() == [4.0, 3.0, 1.0]
+        assert [d['student_answer'] for d in merged.details(1)] == ["X", "B"]
+        assert [d['student_answer'] for d in merged.details(2)] == ["A", ""]
@@ -0,0 +1,346 @@
+"""
+Unit tests for response ingestion and saving auto-grade results.
+Run with: pytest tests/test_ingest.py -v
+"""
+import io
+import threading
+
+import pandas as pd
+import pytest
+
+from modules import database as db
+from modules.grading import compile_answer_key, grade_responses
+from modules.grading_service import grade_files, grade_stream, save_matches, save_results, update_answer_key
+from modules.ingest import count_data_rows, detect_identifier_columns, iter_response_chunks, list_sheets, read_preview
+from modules.roster import RosterIndex
+
+
+def make_csv(rows):
+    """An in-memory CSV upload with student_id, name and two answers per row."""
+    lines = ["student_id,name,q1,q2"] + [",".join(row) for row in rows]
+    return io.BytesIO(("\n".join(lines) + "\n").encode())
+
+
+def make_workbook(sheets):
+    """An in-memory .xlsx upload with one sheet per name -> list of rows (header first)."""
+    from openpyxl import Workbook
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for name, rows in sheets.items():
+        worksheet = workbook.create_sheet(name)
+        for row in rows:
+            worksheet.append(row)
+    upload = io.BytesIO()
+    workbook.save(upload)
+    upload.seek(0)
+    return upload
+
+
+def make_response_folder(tmp_path):
+    """A folder of response files for one assignment: two good CSVs, one without identifiers and a stray .txt."""
+    class_id = db.add_class("Math 101")
+    ids = {name: db.add_student(name, class_id, student_id=sid)
+           for name, sid in [("Alice", "S1"), ("Bob", "S2"), ("Cara", "S3")]}
+    assignment_id = db.add_assignment("Quiz", class_id, max_points=10)
+    db.set_answer_key(assignment_id, [
+        {'question_num': 1, 'correct_answer': 'A', 'points': 1.0, 'question_type': 'multiple_choice'},
+        {'question_num': 2, 'correct_answer': '1', 'points': 1.0, 'question_type': 'numeric'},
+    ])
+    folder = tmp_path / "responses"
+    folder.mkdir()
+    (folder / "room1.csv").write_bytes(make_csv([["S1", "Alice", "A", "1"], ["S2", "Bob", "B", "1"]]).getvalue())
+    (folder / "room2.csv").write_bytes(make_csv([["", "Carah", "A", "2"], ["S2", "Bob", "A", "1"]]).getvalue())
+    (folder / "broken.csv").write_text("q1,q2\nA,1\n")
+    (folder / "notes.txt").write_text("not a response file")
+    return assignment_id, ids, folder
+
+
+class TestIngest:
+    """Tests for chunked CSV reading."""
+
+    def test_chunks_preview_and_row_count(self):
+        upload = make_csv([[f"{i:05d}", f"Student {i}", "A", "1"] for i in range(25)])
+
+        preview = read_preview(upload, "responses.csv", rows=3)
+        chunks = list(iter_response_chunks(upload, "responses.csv", chunk_rows=10))
+
+        assert len(preview) == 3
+        assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+        assert all(list(chunk.columns) == ["student_id", "name", "q1", "q2"] for chunk in chunks)
+        # Read as text, so leading zeros survive
+        assert chunks[0]['student_id'].iloc[0] == "00000"
+        assert count_data_rows(upload) == 25
+
+    def test_workbook_streamed_in_chunks(self):
+        header = ["student_id", "name", "notes", "q1", "q2"]
+        rows = [[f"{i:05d}", f"Student {i}", "x" * 50, "A", i] for i in range(25)]
+        # A blank row in the middle is skipped without shifting the row numbers after it
+        upload = make_workbook({"Cover": [["Quiz 1"]], "Responses": [header] + rows[:5] + [[None] * 5] + rows[5:]})
+
+        preview = read_preview(upload, "responses.xlsx", rows=3, sheet="Responses")
+        chunks = list(iter_response_chunks(upload, "responses.xlsx", chunk_rows=10, sheet="Responses",
+                                           usecols=["name", "q1", "q2"]))
+
+        assert list_sheets(upload, "responses.xlsx") == ["Cover", "Responses"]
+        assert list(preview.columns) == header and len(preview) == 3
+        assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+        assert all(list(chunk.columns) == ["name", "q1", "q2"] for chunk in chunks)
+        assert chunks[0].index[5] == 6 and chunks[2].index[-1] == 25
+        assert count_data_rows(upload, "responses.xlsx", sheet="Responses") == 26
+
+    def test_workbook_grades_like_csv(self):
+        key = [{'question_num': 1, 'correct_answer': 'A', 'points': 1.0, 'question_type': 'multiple_choice'},
+               {'question_num': 2, 'correct_answer': '1.5', 'points': 1.0, 'question_type': 'numeric'}]
+        rows = [["00001", "Alice", "A", "1.5"], ["00002", "Bob", "b", "2"], ["00003", "Cy", "", "1.50"]]
+        upload = make_workbook({"Sheet1": [["student_id", "name", "extra", "q1", "q2"]]
+                                + [[sid, name, None, q1, q2] for sid, name, q1, q2 in rows]})
+        compiled = compile_answer_key(key, read_preview(upload, "responses.xlsx").columns)
+
+        streamed = grade_stream(iter_response_chunks(upload, "responses.xlsx", chunk_rows=2,
+                                                     usecols=compiled.read_columns("name", "student_id")),
+                                "name", "student_id", compiled, {"max_points": 2})
+        expected = grade_responses(pd.read_csv(make_csv(rows), dtype=str),
+                                   "name", "student_id", key, {"max_points": 2})
+
+        assert compiled.read_columns("name", "student_id") == ["name", "student_id", "q1", "q2"]
+        assert streamed['results'].correct.tolist() == expected.correct.tolist()
+        assert [r['scaled_score'] for r in streamed['results']] == [2.0, 0.0, 1.0]
+
+    def test_detect_identifier_columns(self):
+        assert detect_identifier_columns(["Student Name", "StudentID", "q1"]) == ("Student Name", "StudentID")
+        assert detect_identifier_columns(["q1", "q2"]) == (None, None)
+
+
+class TestGradeStream:
+    """Tests for grade_stream()."""
+
+    def test_saves_scores_after_grading_every_chunk(self, temp_db):
+        class_id = db.add_class("Math 101")
+        alice = db.add_student("Alice", class_id, student_id="00001")
+        bob = db.add_student("Bob", class_id)
+        assignment = db.get_assignment_by_id(db.add_assignment("Quiz", class_id, max_points=10))
+        key = [{'question_num': 1, 'correct_answer': 'A', 'points': 1.0, 'question_type': 'multiple_choice'},
+               {'question_num': 2, 'correct_answer': '1', 'points': 1.0, 'question_type': 'numeric'}]
+        upload = make_csv([["00001", "", "A", "1"], ["", "bob", "B", "1.0"], ["", "Zed", "A", "2"]])
+        progress = []
+
+        outcome = grade_stream(
+            iter_response_chunks(upload, "responses.csv", chunk_rows=2), "name", "student_id",
+            compile_answer_key(key, ["student_id", "name", "q1", "q2"]), assignment,
+            roster=RosterIndex(db.get_students_by_class(class_id)), on_chunk=progress.append)
+
+        assert progress == [2, 3]
+        assert outcome['rows'] == 3
+        assert outcome['report'] == {"inserted": [0, 1], "updated": [],
+                                     "rejected": [{"row": 2, "reason": "no matching student in this class"}]}
+        assert [r['scaled_score'] for r in outcome['results']] == [10.0, 5.0, 5.0]
+        assert db.get_grade(alice, assignment['id'])['points'] == 10.0
+        assert db.get_grade(bob, assignment['id'])['points'] == 5.0
+
+    def test_failure_part_way_saves_nothing(self, temp_db):
+        class_id = db.add_class("Math 101")
+        alice = db.add_student("Alice", class_id)
+        assignment = db.get_assignment_by_id(db.add_assignment("Quiz", class_id))
+        key = [{'question_num': 1, 'correct_answer': 'A', 'points': 1.0, 'question_type': 'multiple_choice'}]
+
+        def chunks():
+            yield from iter_response_chunks(make_csv([["", "Alice", "A", ""]]), "responses.csv")
+            raise ValueError("corrupt upload")
+
+        with pytest.raises(ValueError):
+            grade_stream(chunks(), "name", "student_id", compile_answer_key(key, ["student_id", "name", "q1", "q2"]),
+                         assignment, roster=RosterIndex(db.get_students_by_class(class_id)))
+
+        assert db.get_grade(alice, assignment['id']) is None
+
+    def test_other_writers_not_blocked_while_grading(self, temp_db, monkeypatch):
+        db.configure_storage("wal")
+        db.init_db()
+        monkeypatch.setattr(db, "WRITE_QUEUE_TIMEOUT", 0.5)
+        class_id = db.add_class("Math 101")
+        alice = db.add_student("Alice", class_id)
+        bob = db.add_student("Bob", class_id)
+        assignment = db.get_assignment_by_id(db.add_assignment("Quiz", class_id, max_points=10))
+        key = [{'question_num': 1, 'correct_answer': 'A', 'points': 1.0, 'question_type': 'multiple_choice'}]
+        errors = []
+
+        def edit_gradebook():
+            try:
+                db.set_grade(bob, assignment['id'], 7)
+            except Exception as e:
+                errors.append(e)
+
+        def chunks():
+            yield from iter_response_chunks(make_csv([["", "Alice", "A", ""]]), "responses.csv")
+            # Another session edits the gradebook while the upload is still being read
+            thread = threading.Thread(target=edit_gradebook)
+            thread.start()
+            thread.join()
+
+        try:
+            grade_stream(chunks(), "name", "student_id", compile_answer_key(key, ["student_id", "name", "q1", "q2"]),
+                         assignment, roster=RosterIndex(db.get_students_by_class(class_id)))
+        finally:
+            db.configure_storage("default")
+
+        assert errors == []
+        assert db.get_grade(alice, assignment['id'])['points'] == 10.0
+        assert db.get_grade(bob, assignment['id'])['points'] == 7.0
+
+
+class TestSaveResults:
+    """Tests for save_results()."""
+
+    def test_report_per_row(self, temp_db):
+        class_id = db.add_class("Math 101")
+        alice = db.add_student("Alice", class_id)
+        bob = db.add_student("Bob", class_id)
+        assignment_id = db.add_assignment("Quiz", class_id, max_points=10)
+        db.set_grade(bob, assignment_id, 1)
+        key = [{'question_num': 1, 'correct_answer': 'A', 'points': 1.0, 'question_type': 'multiple_choice'}]
+        responses = pd.DataFrame({"name": ["alice", "Bob", "Zed", "ALICE"], "q1": ["B", "A", "A", "A"]})
+        result = grade_responses(responses, "name", None, key, db.get_assignment_by_id(assignment_id))
+
+        report = save_results(result, RosterIndex(db.get_students_by_class(class_id)), assignment_id)
+
+        assert report == {"inserted": [3], "updated": [1], "rejected": [
+            {"row": 0, "reason": "student appears again later in the file"},
+            {"row": 2, "reason": "no matching student in this class"},
+        ]}
+        assert db.get_grade(alice, assignment_id)['points'] == 10.0
+        assert db.get_grade(bob, assignment_id)['points'] == 10.0
+
+
+class TestRegrade:
+    """Tests for stored responses and incremental re-grading."""
+
+    @pytest.fixture(params=["default", "wal"])
+    def storage_db(self, request, temp_db):
+        db.configure_storage(request.param)
+        db.init_db()
+        yield db
+        db.configure_storage("default")
+
+    def test_key_fix_regrades_changed_questions(self, storage_db):
+        class_id = db.add_class("Math 101")
+        alice = db.add_student("Alice", class_id)
+        bob = db.add_student("Bob", class_id)
+        assignment_id = db.add_assignment("Quiz", class_id, max_points=20)
+        key = [{'question_num': 1, 'correct_answer': 'A', 'points': 1.0, 'question_type': 'multiple_choice'},
+               {'question_num': 2, 'correct_answer': 'B', 'points': 1.0, 'question_type': 'multiple_choice'}]
+        db.set_answer_key(assignment_id, key)
+        responses = pd.DataFrame({"name": ["Alice", "Bob"], "q1": ["a", "C"], "q2": ["C", None]})
+        result = grade_responses(responses, "name", None, db.get_answer_key(assignment_id),
+                                 db.get_assignment_by_id(assignment_id))
+        save_results(result, RosterIndex(db.get_students_by_class(class_id)), assignment_id)
+        db.set_grade(alice, assignment_id, 10, comments="Check Q2")
+
+        assert db.get_responses(assignment_id)[0] == {'student_id': alice, 'answers': {1: "A", 2: "C"}, 'raw_score': 1.0,
+                                                      'key_version': 1}
+
+        # Q2's key was wrong, and Q3 is added
+        fixed = [dict(key[0]), dict(key[1], correct_answer='C'),
+                 {'question_num': 3, 'correct_answer': 'D', 'points': 2.0, 'question_type': 'multiple_choice'}]
+        report, regrade = update_answer_key(assignment_id, fixed)
+
+        assert (report['inserted'], report['updated']) == ([2], [1])
+        assert (report['version'], report['diff']) == (2, {'added': [3], 'changed': [2], 'removed': []})
+        # Bob's scaled score doesn't change, so he is left alone
+        assert regrade == {'changed': [2, 3], 'regraded': 1}
+        assert db.get_grade(alice, assignment_id)['points'] == 10.0
+        assert db.get_grade(alice, assignment_id)['comments'] == "Check Q2"
+        assert db.get_grade(bob, assignment_id)['points'] == 0.0
+        assert [(r['raw_score'], r['key_version']) for r in db.get_responses(assignment_id)] == [(2.0, 2), (0.0, 2)]
+
+    def test_manual_adjustment_survives_regrade(self, temp_db):
+        class_id = db.add_class("Math 101")
+        alice = db.add_student("Alice", class_id)
+        assignment_id = db.add_assignment("Quiz", class_id, max_points=10)
+        key = [{'question_num': 1, 'correct_answer': 'A', 'points': 1.0, 'question_type': 'multiple_choice'},
+               {'question_num': 2, 'correct_answer': 'B', 'points': 1.0, 'question_type': 'multiple_choice'}]
+        db.set_answer_key(assignment_id, key)
+        responses = pd.DataFrame({"name": ["Alice"], "q1": ["A"], "q2": ["B"]})
+        result = grade_responses(responses, "name", None, key, db.get_assignment_by_id(assignment_id))
+        save_matches(result, [(0, alice)], assignment_id)
+        # Late penalty
+        db.set_grade(alice, assignment_id, 9.0)
+
+        update_answer_key(assignment_id, [key[0], dict(key[1], correct_answer='C')])
+        assert db.get_grade(alice, assignment_id)['points'] == 4.0
+
+    def test_responses_graded_with_older_key_are_scored_in_full(self, temp_db):
+        class_id = db.add_class("Math 101")
+        alice = db.add_student("Alice", class_id)
+        bob = db.add_student("Bob", class_id)
+        assignment_id = db.add_assignment("Quiz", class_id, max_points=10)
+        key = [{'question_num': 1, 'correct_answer': 'A', 'points': 1.0, 'question_type': 'multiple_choice'},
+               {'question_num': 2, 'correct_answer': 'B', 'points': 1.0, 'question_type': 'multiple_choice'}]
+        db.set_answer_key(assignment_id, key)
+        assignment = db.get_assignment_by_id(assignment_id)
+        responses = pd.DataFrame({"name": ["Alice", "Bob"], "q1": ["A", "A"], "q2": ["C", "C"]})
+        graded_v1 = grade_responses(responses, "name", None, db.get_answer_key(assignment_id), assignment)
+
+        # The key is fixed in one tab, then another tab saves results graded with version 1
+        update_answer_key(assignment_id, [key[0], dict(key[1], correct_answer='C')])
+        save_matches(graded_v1, [(0, alice)], assignment_id, key_version=1)
+        graded_v2 = grade_responses(responses, "name", None, db.get_answer_key(assignment_id), assignment)
+        save_matches(graded_v2, [(1, bob)], assignment_id)
+        report, regrade = update_answer_key(assignment_id, [dict(key[0], correct_answer='D'),
+                                                            dict(key[1], correct_answer='C')])
+
+        assert report['version'] == 3 and regrade == {'changed': [1], 'regraded': 2}
+        # Alice's version 1 score is redone on the whole key, Bob's version 2 score only on Q1
+        assert db.get_grade(alice, assignment_id)['points'] == 5.0
+        assert db.get_grade(bob, assignment_id)['points'] == 5.0
+        assert [(r['raw_score'], r['key_version']) for r in db.get_responses(assignment_id)] == [(1.0, 3), (1.0, 3)]
+
+    def test_cleared_key_keeps_grades_until_the_next_key(self, temp_db):
+        class_id = db.add_class("Math 101")
+        alice = db.add_student("Alice", class_id)
+        assignment_id = db.add_assignment("Quiz", class_id, max_points=10)
+        key = [{'question_num': 1, 'correct_answer': 'A', 'points': 1.0, 'question_type': 'multiple_choice'},
+               {'question_num': 2, 'correct_answer': 'B', 'points': 1.0, 'question_type': 'multiple_choice'}]
+        db.set_answer_key(assignment_id, key)
+        responses = pd.DataFrame({"name": ["Alice"], "q1": ["A"], "q2": ["C"]})
+        result = grade_responses(responses, "name", None, key, db.get_assignment_by_id(assignment_id))
+        save_matches(result, [(0, alice)], assignment_id)
+
+        db.delete_answer_key(assignment_id)
+        assert db.get_grade(alice, assignment_id)['points'] == 5.0
+        assert [(r['raw_score'], r['key_version']) for r in db.get_responses(assignment_id)] == [(1.0, 1)]
+
+        report, regrade = update_answer_key(assignment_id, [dict(key[0], correct_answer='D'), dict(key[1], correct_answer='C')])
+        assert report['version'] == 3 and regrade == {'changed': [1, 2], 'regraded': 1}
+        assert db.get_grade(alice, assignment_id)['points'] == 5.0
+        assert [(r['raw_score'], r['key_version']) for r in db.get_responses(assignment_id)] == [(1.0, 3)]
+
+    def test_unchanged_key_leaves_grades_alone(self, temp_db):
+        class_id = db.add_class("Math 101")
+        assignment_id = db.add_assignment("Quiz", class_id)
+        key = [{'question_num': 1, 'correct_answer': 'A', 'points': 1.0, 'question_type': 'multiple_choice'}]
+        db.set_answer_key(assignment_id, key)
+
+        assert update_answer_key(assignment_id, [dict(key[0], correct_answer='a')])[1] == {'changed': [], 'regraded': 0}
+
+
+class TestGradeFiles:
+    """Tests for grading a folder of response files."""
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_grades_and_saves_each_file(self, temp_db, tmp_path, workers):
+        assignment_id, ids, folder = make_response_folder(tmp_path)
+
+        summary = grade_files(sorted(folder.iterdir()), assignment_id, workers=workers)
+
+        files = {f['file']: f for f in summary['files']}
+        assert "notes.txt" in files and files["notes.txt"]['error']
+        assert files["broken.csv"]['error'] == "no student name or ID column found"
+        assert (files["room1.csv"]['inserted'], files["room2.csv"]['updated']) == (2, 1)
+        assert files["room2.csv"]['rejected'] == [{
+            'line': 2, 'student': "Carah", 'reason': "no matching student in this class",
+            'suggestion': {'id': ids["Cara"], 'name': "Cara", 'score': 0.667},
+        }]
+        # Bob's later file wins
+        assert db.get_grade(ids["Bob"], assignment_id)['points'] == 10.0
+        assert db.get_grade(ids["Alice"], assignment_id)['points'] == 10.0
+
@@ -0,0 +1,74 @@
+"""
+Unit tests for item analysis.
+Run with: pytest tests/test_item_analysis.py -v
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.grading import grade_responses
+from modules.item_analysis import analyze_items, distractor_frequencies, item_statistics, kr20
+
+
+def grade(answers, key_answers, points=None):
+    """Grade a multiple-choice sheet given as a list of answer rows."""
+    points = points or [1.0] * len(key_answers)
+    key = [{'question_num': q, 'correct_answer': a, 'points': p, 'question_type': 'multiple_choice'}
+           for q, (a, p) in enumerate(zip(key_answers, points), start=1)]
+    responses = pd.DataFrame(answers, columns=[f"q{q}" for q in range(1, len(key_answers) + 1)])
+    responses.insert(0, "student_name", [f"Student {i}" for i in range(len(answers))])
+    return grade_responses(responses, "student_name", None, key, {"max_points": 100})
+
+
+class TestItemStatistics:
+    """Tests for item_statistics() and kr20()."""
+
+    def test_matches_reference_formulas(self):
+        rng = np.random.default_rng(3)
+        answers = rng.choice(list("AB"), (60, 5), p=[0.6, 0.4]).tolist()
+        result = grade(answers, list("AAAAB"), points=[1.0, 2.0, 1.0, 1.0, 3.0])
+
+        items = item_statistics(result)
+        correct = result.correct.astype(float)
+        earned = correct * result.points
+        for j in range(5):
+            rest = earned.sum(axis=1) - earned[:, j]
+            assert items['Difficulty (p)'][j] == pytest.approx(correct[:, j].mean(), abs=1e-3)
+            assert items['Point-Biserial'][j] == pytest.approx(np.corrcoef(correct[:, j], rest)[0, 1], abs=1e-3)
+
+        k = correct.shape[1]
+        p = correct.mean(axis=0)
+        expected = k / (k - 1) * (1 - (p * (1 - p)).sum() / correct.sum(axis=1).var())
+        assert kr20(result) == pytest.approx(expected)
+
+    def test_undefined_statistics(self):
+        result = grade([["A", "B"], ["A", "C"]], list("AB"))
+
+        items = item_statistics(result)
+
+        # Everyone got question 1 right, so it cannot discriminate
+        assert items['Difficulty (p)'][0] == 1.0
+        assert np.isnan(items['Point-Biserial'][0])
+        assert kr20(grade([["A", "B"]], list("AB"))) is None
+
+
+class TestDistractors:
+    """Tests for distractor_frequencies()."""
+
+    def test_counts_answers_and_blanks(self):
+        result = grade([["A", "C"], ["B", None], ["B", "C"], ["A", ""]], list("AC"))
+
+        table = distractor_frequencies(result)
+        q2 = table[table['Question'] == 2]
+
+        assert dict(zip(q2['Answer'], q2['Count'])) == {"C": 2, "(blank)": 2}
+        assert q2[q2['Key']]['Answer'].tolist() == ["C"]
+        assert table[table['Question'] == 1]['Share'].tolist() == [0.5, 0.5]
+        assert analyze_items(result)['items']['Answered'].tolist() == [4, 2]
+
+    def test_limit_keeps_most_frequent(self):
+        result = grade([["A"], ["A"], ["A"], ["B"], ["B"], ["C"]], ["A"])
+
+        table = distractor_frequencies(result, limit=2)
+
+        assert table['Answer'].tolist() == ["A", "B"]
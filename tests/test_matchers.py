@@ -0,0 +1,129 @@
+"""
+Unit tests for the answer matcher registry.
+Run with: pytest tests/test_matchers.py -v
+"""
+import functools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules import grading, matchers
+from modules.grading import compile_answer_key, grade_responses
+from modules.matchers import AnswerLookup, compile_matcher, format_options, parse_number, parse_options
+
+
+def accepts(question_type, correct_answer, answers, config=None):
+    """Which of the given (already normalized) answers the matcher accepts."""
+    predicate = compile_matcher(question_type, correct_answer, config)
+    return predicate(AnswerLookup(answers)).tolist()
+
+
+class TestBuiltInMatchers:
+    """Tests for each built-in question type."""
+
+    def test_choice_and_text(self):
+        assert accepts('multiple_choice', "b", ["B", "D", "A"], {'accept': ["D"]}) == [True, True, False]
+        assert accepts('short_text', "New  York", ["NEW YORK", "NEWYORK"]) == [True, False]
+        assert accepts('any_of', "A or C | Paris", ["A", "C", "PARIS", "B"]) == [True, True, True, False]
+        assert accepts('multi_select', "A, C", ["C;A", "AC", "A", "A,B,C"]) == [True, True, False, False]
+        assert accepts('multi_select', "red, blue", ["BLUE, RED", "REDBLUE"]) == [True, False]
+
+    def test_numeric_forms_and_tolerances(self):
+        assert parse_number("6.02 x 10^23") == pytest.approx(6.02e23)
+        assert parse_number("-1 1/2") == -1.5
+        assert parse_number("1,000.5") == 1000.5
+        assert np.isnan(parse_number("12 apples"))
+
+        answers = ["3/4", "0.76", "7.5E-1", "0.8", "ABC"]
+        assert accepts('numeric', "0.75", answers) == [True, False, True, False, False]
+        assert accepts('numeric', "0.75", answers, {'tolerance': 0}) == [True, False, True, False, False]
+        assert accepts('numeric', "0.75", answers, {'tolerance': 0, 'relative': 0.1}) == [True, True, True, True, False]
+        assert accepts('numeric', "0.7..0.76", answers) == [True, True, True, False, False]
+
+    def test_numeric_tolerance_boundary_is_excluded(self):
+        assert accepts('numeric', "1", ["1.01", "0.99", "1.009", "0.991", "1"]) == [False, False, True, True, True]
+        assert accepts('numeric', "1", ["1.5", "0.5", "1.4"], {'tolerance': 0.5}) == [False, False, True]
+        assert accepts('numeric', "1..2", ["2.5", "0.5", "2.4", "2"], {'tolerance': 0.5}) == [False, False, True, True]
+
+    def test_regex(self):
+        assert accepts('regex', r"mitochondri(a|on)", ["MITOCHONDRIA", "MITOCHONDRIAL"]) == [True, False]
+
+    @pytest.mark.parametrize("question_type, answer, config, message", [
+        ('numeric', "fast", None, "not a number"),
+        ('numeric', "5..1", None, "range start is above range end"),
+        ('numeric', "1", '{"tolerance": -1}', "can't be negative"),
+        ('regex', "(", None, "invalid regular expression"),
+        ('multiple_choice', "A", "[1]", "must be a JSON object"),
+        ('essay', "x", None, "unknown question type"),
+    ])
+    def test_unusable_keys_are_rejected(self, question_type, answer, config, message):
+        with pytest.raises(ValueError, match=message):
+            compile_matcher(question_type, answer, config)
+
+    def test_editor_options_round_trip(self):
+        config = parse_options("tolerance=0.5, relative=2%, accept=B;D")
+
+        assert config == {'tolerance': 0.5, 'relative': 0.02, 'accept': ["B", "D"]}
+        assert parse_options(format_options(config)) == config
+        assert parse_options(" ") is None
+        with pytest.raises(ValueError):
+            parse_options("tolerance")
+
+
+class TestMatcherGrading:
+    """Tests for matchers inside grade_responses()."""
+
+    def test_each_unique_answer_checked_once(self, monkeypatch):
+        calls = []
+
+        def compile_counting(correct_answer, config):
+            return functools.partial(counting, correct_answer)
+
+        def counting(correct_answer, view):
+            calls.append(len(view))
+            return view.values == correct_answer
+
+        monkeypatch.setitem(matchers.MATCHERS, 'counting', compile_counting)
+        key = [{'question_num': q, 'correct_answer': "A", 'points': 1.0, 'question_type': 'counting'}
+               for q in (1, 2, 3)]
+        responses = pd.DataFrame({"name": [f"S{i}" for i in range(1000)],
+                                  "q1": ["A", "B"] * 500, "q2": ["A"] * 1000, "q3": [None, "C"] * 500})
+
+        result = grade_responses(responses, "name", None, key, {"max_points": 3}, workers=1)
+
+        # Identical questions share one call over the unique answers (A, B, C and blank)
+        assert calls == [4]
+        assert result.correct_counts[:2].tolist() == [2, 1]
+
+    def test_invalid_questions_score_zero(self):
+        key = [{'question_num': 1, 'correct_answer': "(", 'points': 1.0, 'question_type': 'regex'},
+               {'question_num': 2, 'correct_answer': "1e3", 'points': 1.0, 'question_type': 'numeric',
+                'matcher_config': '{"relative": 0.01}'}]
+        responses = pd.DataFrame({"name": ["Alice"], "q1": ["("], "q2": ["1 005"]})
+        compiled = compile_answer_key(key, responses.columns)
+
+        result = grade_responses(responses, "name", None, compiled, {"max_points": 2})
+
+        assert list(compiled.invalid) == [1]
+        assert result.correct.tolist() == [[0, 0]]
+        assert grade_responses(responses.assign(q2=["1,005"]), "name", None, key, {"max_points": 2}).raw_scores[0] == 1.0
+
+    def test_parallel_grading_with_compiled_matchers(self, monkeypatch):
+        monkeypatch.setattr(grading, "PARALLEL_MIN_ROWS", 100)
+        monkeypatch.setattr(grading, "PARALLEL_CHUNK_ROWS", 64)
+        key = [{'question_num': 1, 'correct_answer': r"\d+ cm", 'points': 1.0, 'question_type': 'regex'},
+               {'question_num': 2, 'correct_answer': "A, C", 'points': 1.0, 'question_type': 'multi_select'},
+               {'question_num': 3, 'correct_answer': "1/3", 'points': 1.0, 'question_type': 'numeric',
+                'matcher_config': '{"relative": 0.01}'}]
+        rng = np.random.default_rng(7)
+        responses = pd.DataFrame({"name": [f"S{i}" for i in range(300)],
+                                  "q1": rng.choice(["12 cm", "cm", "4cm"], 300),
+                                  "q2": rng.choice(["CA", "A", "a;c"], 300),
+                                  "q3": rng.choice(["0.333", "0.3", "1/3"], 300)})
+
+        serial = grade_responses(responses, "name", None, key, {"max_points": 3}, workers=1)
+        parallel = grade_responses(responses, "name", None, key, {"max_points": 3}, workers=2)
+
+        assert parallel.correct.tolist() == serial.correct.tolist()
+        assert serial.correct_counts.sum() > 0
@@ -0,0 +1,40 @@
+"""
+Unit tests for the process-pool helpers.
+Run with: pytest tests/test_parallel.py -v
+"""
+import math
+
+from modules import parallel
+from modules.parallel import iter_pooled
+
+
+class TestIterPooled:
+    """Tests for iter_pooled()."""
+
+    def test_results_in_task_order(self):
+        assert list(iter_pooled(math.factorial, range(12), workers=2)) == [math.factorial(n) for n in range(12)]
+
+    def test_stream_read_a_bounded_way_ahead(self, monkeypatch):
+        monkeypatch.setattr(parallel, "start_pool", lambda workers: None)
+        read = []
+
+        def tasks():
+            for n in range(100):
+                read.append(n)
+                yield n
+
+        results = iter_pooled(abs, tasks(), workers=4)
+        assert next(results) == 0
+        assert len(read) <= 2 * 4 + 1
+        assert list(results) == list(range(1, 100))
+
+    def test_runs_in_process_when_pool_breaks(self, monkeypatch):
+        class BrokenPool:
+            def submit(self, func, task):
+                raise parallel.BrokenProcessPool("worker died")
+
+            def shutdown(self, **kwargs):
+                pass
+
+        monkeypatch.setattr(parallel, "start_pool", lambda workers: BrokenPool())
+        assert list(iter_pooled(math.factorial, [3, 4, 5], workers=2)) == [6, 24, 120]
@@ -0,0 +1,86 @@
+"""
+Unit tests for roster matching.
+Run with: pytest tests/test_roster.py -v
+"""
+import pandas as pd
+
+from modules import database as db
+from modules.grading import grade_responses
+from modules.grading_service import get_class_roster, save_matches, save_results, suggest_matches, unmatched_rows
+from modules.roster import RosterIndex, normalize_name
+
+
+class TestRosterMatching:
+    """Tests for name normalization, exact matches and ranked roster candidates."""
+
+    def test_roster_matches_id_then_normalized_name(self):
+        roster = RosterIndex([{'id': 1, 'name': "Alice  Smith", 'student_id': "A-01"},
+                              {'id': 2, 'name': "Bob", 'student_id': None}])
+
+        assert roster.match("Someone Else", " a-01 ") == 1
+        assert roster.match(" alice smith ", "unknown") == 1
+        assert roster.match("BOB") == 2
+        assert roster.match("Cara") is None
+
+    def test_shared_name_keys_go_to_review(self, temp_db):
+        class_id = db.add_class("Math 101")
+        ann = db.add_student("Ann Lee", class_id, student_id="S1")
+        other_ann = db.add_student("Ann Lee", class_id)
+        lee_ann = db.add_student("Lee Ann", class_id)
+        assignment_id = db.add_assignment("Quiz", class_id, max_points=10)
+        key = [{'question_num': 1, 'correct_answer': 'A', 'points': 1.0, 'question_type': 'multiple_choice'}]
+        responses = pd.DataFrame({"name": ["ann lee", "Ann Lee"], "sid": [None, "S1"], "q1": ["A", "B"]})
+        result = grade_responses(responses, "name", "sid", key, db.get_assignment_by_id(assignment_id))
+        roster = get_class_roster(class_id)
+
+        report = save_results(result, roster, assignment_id)
+        rows = unmatched_rows(report)
+        suggestions = suggest_matches(result, roster, rows)
+
+        assert report['rejected'] == [{"row": 0, "reason": "ambiguous name: several students in this class match"}]
+        assert roster.ambiguous("Lee, Ann") == [ann, other_ann, lee_ann]
+        # The student ID still settles it
+        assert roster.match("Ann Lee", "s1") == ann
+        assert rows == [0]
+        assert [c['id'] for c in roster.candidates("ann lee", limit=1)] == [ann, other_ann, lee_ann]
+        assert [(c['id'], c['score']) for c in suggestions[0]] == [(ann, 1.0), (other_ann, 1.0), (lee_ann, 1.0)]
+        assert db.get_grade(other_ann, assignment_id) is None and db.get_grade(lee_ann, assignment_id) is None
+
+    def test_normalizes_accents_order_and_punctuation(self):
+        roster = RosterIndex([{'id': 1, 'name': "José-Luis Núñez", 'student_id': None},
+                              {'id': 2, 'name': "Siobhan O'Brien", 'student_id': None}])
+
+        assert normalize_name("Núñez,  José-Luis") == "jose luis nunez"
+        assert roster.match("NUNEZ, Jose Luis") == 1
+        assert roster.match("obrien siobhan") == 2
+
+    def test_candidates_ranked_by_similarity(self):
+        roster = RosterIndex([{'id': 1, 'name': "Katherine Johnson", 'student_id': None},
+                              {'id': 2, 'name': "Catherine Jonson", 'student_id': None},
+                              {'id': 3, 'name': "Mark Twain", 'student_id': None}])
+
+        ranked = roster.candidates("Johnson, Katharine")
+
+        assert [c['id'] for c in ranked] == [1, 2]
+        assert 0.3 <= ranked[1]['score'] < ranked[0]['score'] < 1
+        assert roster.candidates("Zzz") == []
+        assert roster.suggest(["Mark Twian", "Zzz", "Mark Twian"])[2][0]['id'] == 3
+
+    def test_confirmed_suggestions_are_saved(self, temp_db):
+        class_id = db.add_class("Math 101")
+        katherine = db.add_student("Katherine Johnson", class_id)
+        assignment_id = db.add_assignment("Quiz", class_id, max_points=10)
+        key = [{'question_num': 1, 'correct_answer': 'A', 'points': 1.0, 'question_type': 'multiple_choice'}]
+        responses = pd.DataFrame({"name": ["Kathrine Jonson", "Nobody"], "q1": ["A", "B"]})
+        result = grade_responses(responses, "name", None, key, db.get_assignment_by_id(assignment_id))
+        roster = get_class_roster(class_id)
+
+        rows = unmatched_rows(save_results(result, roster, assignment_id))
+        suggestions = suggest_matches(result, roster, rows)
+        report = save_matches(result, [(0, suggestions[0][0]['id'])], assignment_id)
+
+        assert rows == [0, 1]
+        assert suggestions[1] == []
+        assert report == {"inserted": [0], "updated": [], "rejected": []}
+        assert db.get_grade(katherine, assignment_id)['points'] == 10.0
+        assert db.get_responses(assignment_id)[0]['student_id'] == katherine
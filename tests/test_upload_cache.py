@@ -0,0 +1,85 @@
+"""
+Unit tests for the content-addressed upload and result caches.
+Run with: pytest tests/test_upload_cache.py -v
+"""
+import io
+import pickle
+
+from modules import database as db
+from modules import grading_service
+from modules.grading import compile_answer_key
+from modules.grading_service import get_class_roster, grade_upload
+from modules.upload_cache import ContentCache, file_digest
+
+
+def entry_size(value):
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class TestContentCache:
+    """Tests for ContentCache."""
+
+    def test_least_recently_used_evicted_by_size(self):
+        value = "x" * 1000
+        cache = ContentCache("test", max_bytes=3 * entry_size(value))
+        for key in ("a", "b", "c"):
+            cache.put((key,), value)
+
+        cache.get(("a",))
+        cache.put(("d",), value)
+
+        assert cache.get(("b",)) is None
+        assert cache.get(("a",)) == value
+        assert cache.stats()["entries"] == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_evicted_entries_spill_to_disk(self, tmp_path):
+        value = list(range(500))
+        cache = ContentCache("test", max_bytes=entry_size(value), spill_dir=tmp_path)
+        cache.put(("a",), value)
+        cache.put(("b",), value)
+
+        assert len(list((tmp_path / "test").glob("*.pkl"))) == 1
+        assert cache.get(("a",)) == value
+        assert cache.stats()["disk_hits"] == 1
+
+        cache.clear()
+        assert cache.get(("a",)) is None and cache.get(("b",)) is None
+
+    def test_digest_depends_only_on_content(self, tmp_path):
+        path = tmp_path / "responses.csv"
+        path.write_bytes(b"name,q1\nAlice,A\n")
+
+        with open(path, 'rb') as file:
+            assert file_digest(file) == file_digest(io.BytesIO(b"name,q1\nAlice,A\n"))
+            assert file.tell() == 0
+        assert file_digest(io.BytesIO(b"name,q1\nAlice,B\n")) != file_digest(io.BytesIO(b"name,q1\nAlice,A\n"))
+
+
+class TestGradeUpload:
+    """Tests for grade_upload()."""
+
+    def test_regrading_same_file_uses_cache(self, temp_db, monkeypatch):
+        monkeypatch.setattr(grading_service, "result_cache", ContentCache("test", max_bytes=1 << 20))
+        class_id = db.add_class("Math 101")
+        alice = db.add_student("Alice", class_id)
+        assignment = db.get_assignment_by_id(db.add_assignment("Quiz", class_id, max_points=10))
+        key = [{'question_num': 1, 'correct_answer': 'A', 'points': 1.0, 'question_type': 'multiple_choice'}]
+        upload = io.BytesIO(b"name,q1\nAlice,A\nZed,B\n")
+        compiled = compile_answer_key(key, ["name", "q1"])
+
+        first = grade_upload(upload, "responses.csv", "name", None, compiled, assignment,
+                             roster=get_class_roster(class_id))
+        db.set_grade(alice, assignment['id'], 0)
+        second = grade_upload(upload, "responses.csv", "name", None, compiled, assignment,
+                              roster=get_class_roster(class_id))
+        key[0]['correct_answer'] = 'B'
+        changed = grade_upload(upload, "responses.csv", "name", None, compile_answer_key(key, ["name", "q1"]),
+                               assignment)
+
+        assert (first['cached'], second['cached'], changed['cached']) == (False, True, False)
+        assert second['results'] is first['results']
+        assert first['report']['inserted'] == second['report']['updated'] == [0]
+        # A cache hit still saves the scores
+        assert db.get_grade(alice, assignment['id'])['points'] == 10.0
+        assert [r['scaled_score'] for r in changed['results']] == [0.0, 10.0]